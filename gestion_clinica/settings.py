@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -48,6 +49,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'gestor_app.replicas.PrimarioTrasEscrituraMiddleware',
 ]
 
 ROOT_URLCONF = 'gestion_clinica.urls'
@@ -73,14 +75,32 @@ WSGI_APPLICATION = 'gestion_clinica.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Credenciales de MySQL por variables de entorno (DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT).
+# Conexiones persistentes: cada hilo de cada proceso reutiliza su conexión hasta
+# DB_CONN_MAX_AGE segundos en lugar de abrir una por petición (0 vuelve a una por
+# petición). Con CONN_HEALTH_CHECKS la conexión se verifica al empezar cada petición
+# que la reutiliza, así una conexión cortada por MySQL (wait_timeout, reinicio) se
+# reemplaza en vez de fallar. Tamaño: ver "Conexiones a la base de datos" en README.md.
+#
+# DB_MOTOR=sqlite usa un archivo SQLite local (DB_NAME, por defecto db.sqlite3) para
+# desarrollar, correr las pruebas y medir sin un servidor MySQL. WAL permite leer
+# mientras otro proceso escribe; synchronous=NORMAL solo sincroniza el disco en los
+# checkpoints (basta con WAL: un corte de luz puede perder las últimas transacciones,
+# pero no corrompe la base); el timeout espera a que se libere el bloqueo en vez de
+# fallar con "database is locked", y IMMEDIATE toma el bloqueo de escritura al abrir la
+# transacción, así dos escrituras simultáneas esperan en vez de fallar a medio camino.
+DB_MOTOR = os.environ.get('DB_MOTOR', 'mysql')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.mysql',
-        'NAME': 'gestion_db',
-        'USER': 'root',
-        'PASSWORD': 'Naranj4***',
-        'HOST': '127.0.0.1',
-        'PORT': '3307',
+        'NAME': os.environ.get('DB_NAME', 'gestion_db'),
+        'USER': os.environ.get('DB_USER', 'root'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+        'HOST': os.environ.get('DB_HOST', '127.0.0.1'),
+        'PORT': os.environ.get('DB_PORT', '3307'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 300)),
+        'CONN_HEALTH_CHECKS': os.environ.get('DB_CONN_HEALTH_CHECKS', '1') == '1',
         'OPTIONS': {
             'charset': 'utf8mb4',
             'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
@@ -88,6 +108,77 @@ DATABASES = {
     }
 }
 
+if DB_MOTOR == 'sqlite':
+    primario = Path(os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'))
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': primario,
+        # Las pruebas usan un archivo aparte (db_test.sqlite3) y no la memoria: en memoria
+        # los hilos no comparten la base y StockConcurrenteTests se saltaría
+        'TEST': {'NAME': primario.with_name(f'{primario.stem}_test{primario.suffix}')},
+        'CONN_MAX_AGE': DATABASES['default']['CONN_MAX_AGE'],
+        'CONN_HEALTH_CHECKS': DATABASES['default']['CONN_HEALTH_CHECKS'],
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA temp_store=MEMORY;'
+                'PRAGMA cache_size=-65536;'  # 64 MB
+                'PRAGMA mmap_size=268435456;'  # 256 MB
+            ),
+        },
+    }
+    if os.environ.get('DB_REPLICA_NAME'):
+        # Segundo archivo para ReplicaTests; el router no lo usa (DB_REPLICA sigue en None)
+        replica = Path(os.environ['DB_REPLICA_NAME'])
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'NAME': replica,
+            'TEST': {'NAME': replica.with_name(f'{replica.stem}_test{replica.suffix}')},
+        }
+
+# Réplica de lectura para listados, dashboards y exportaciones (ver gestor_app/replicas.py).
+# Se activa con DB_REPLICA_HOST; usuario y contraseña son los del primario salvo que se
+# definan DB_REPLICA_USER y DB_REPLICA_PASSWORD. En las pruebas apunta al primario.
+DB_REPLICA = None
+# Segundos que un navegador lee del primario después de escribir (atraso tolerado de la réplica)
+DB_REPLICA_RETRASO = int(os.environ.get('DB_REPLICA_RETRASO', 5))
+
+if os.environ.get('DB_REPLICA_HOST'):
+    DB_REPLICA = 'replica'
+    DATABASES[DB_REPLICA] = {
+        **DATABASES['default'],
+        'HOST': os.environ['DB_REPLICA_HOST'],
+        'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'USER': os.environ.get('DB_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.environ.get('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['gestor_app.replicas.RouterReplica']
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Con varios procesos (gunicorn/uwsgi) se necesita una caché compartida para que
+# la invalidación del resumen de pacientes llegue a todos: definir REDIS_URL.
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -139,3 +230,10 @@ AUTH_USER_MODEL = 'gestor_app.CustomUser'
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'dashboard'
 LOGOUT_REDIRECT_URL = 'login'
+
+# Caché en disco de los PDF de recetas (ver gestor_app/pdf.py)
+PDF_CACHE_DIR = Path(os.environ.get('PDF_CACHE_DIR', BASE_DIR / 'cache' / 'pdf'))
+# Dibujar el PDF en segundo plano al emitir la receta
+PDF_PRERENDERIZAR = os.environ.get('PDF_PRERENDERIZAR', '1') == '1'
+# Procesos para dibujar PDF en las exportaciones masivas
+PDF_WORKERS = int(os.environ.get('PDF_WORKERS', os.cpu_count() or 1))
@@ -1,6 +1,16 @@
-from django.contrib import admin
+import io
+import tempfile
+
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser, Medico, Enfermera, Recepcionista, Paciente, Cita, RecetaMedica, HistoriaClinica, SignosVitales, Medicamento, RecetaMedicamento
+from django.http import FileResponse, StreamingHttpResponse
+from django.shortcuts import redirect, render
+from django.urls import path
+from django.utils import timezone
+from .models import CustomUser, Medico, Enfermera, Recepcionista, Paciente, Cita, RecetaMedica, HistoriaClinica, SignosVitales, Medicamento, RecetaMedicamento, MovimientoStock, CierreStock, LoteMedicamento, DispositivoMonitor
+from .agendas import zip_agendas
+from .forms import ImportarPacientesForm
+from .importacion import importar_pacientes
 
 # Admin personalizado para el modelo de usuario
 @admin.register(CustomUser)
@@ -33,6 +43,7 @@ class MedicoAdmin(admin.ModelAdmin):
     list_filter = ['especialidad']
     search_fields = ['usuario__nombre', 'usuario__rut', 'especialidad', 'numero_registro']
     ordering = ['usuario__nombre']
+    actions = ['descargar_agendas_hoy']
     
     def get_nombre(self, obj):
         return obj.usuario.nombre
@@ -41,6 +52,13 @@ class MedicoAdmin(admin.ModelAdmin):
     def get_rut(self, obj):
         return obj.usuario.rut
     get_rut.short_description = 'RUT'
+    
+    def descargar_agendas_hoy(self, request, queryset):
+        hoy = timezone.localdate()
+        response = StreamingHttpResponse(zip_agendas(hoy, queryset), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="agendas_{hoy.strftime("%Y%m%d")}.zip"'
+        return response
+    descargar_agendas_hoy.short_description = 'Descargar agenda de hoy (ZIP)'
 
 
 @admin.register(Enfermera)
@@ -81,6 +99,47 @@ class PacienteAdmin(admin.ModelAdmin):
     search_fields = ['rut', 'nombre', 'telefono']
     ordering = ['nombre']
     readonly_fields = ['fecha_registro']
+    change_list_template = 'admin/gestor_app/paciente/change_list.html'
+    
+    def get_urls(self):
+        urls = [
+            path('importar/', self.admin_site.admin_view(self.importar_csv), name='gestor_app_paciente_importar'),
+        ]
+        return urls + super().get_urls()
+    
+    def importar_csv(self, request):
+        """Carga masiva de pacientes; si hay filas rechazadas se descargan como CSV"""
+        if request.method == 'POST':
+            form = ImportarPacientesForm(request.POST, request.FILES)
+            if form.is_valid():
+                archivo = io.TextIOWrapper(form.cleaned_data['archivo'].file, encoding='utf-8-sig', newline='')
+                rechazos = tempfile.TemporaryFile()
+                rechazos_texto = io.TextIOWrapper(rechazos, encoding='utf-8', newline='')
+                try:
+                    resultado = importar_pacientes(archivo, rechazos=rechazos_texto, usuario=request.user)
+                except (ValueError, UnicodeDecodeError) as e:
+                    rechazos_texto.close()
+                    messages.error(request, f'No se pudo importar el archivo: {e}')
+                    return redirect('admin:gestor_app_paciente_importar')
+                rechazos_texto.detach()
+                
+                if resultado.rechazadas:
+                    messages.warning(request, str(resultado))
+                    rechazos.seek(0)
+                    return FileResponse(rechazos, as_attachment=True, filename='pacientes_rechazados.csv')
+                rechazos.close()
+                messages.success(request, str(resultado))
+                return redirect('admin:gestor_app_paciente_changelist')
+        else:
+            form = ImportarPacientesForm()
+        
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Importar pacientes desde CSV',
+            'form': form,
+        }
+        return render(request, 'admin/gestor_app/paciente/importar.html', context)
 
 
 @admin.register(HistoriaClinica)
@@ -118,6 +177,29 @@ class SignosVitalesAdmin(admin.ModelAdmin):
     readonly_fields = ['fecha_hora']
 
 
+@admin.register(DispositivoMonitor)
+class DispositivoMonitorAdmin(admin.ModelAdmin):
+    list_display = ['nombre', 'activo', 'ultimo_envio', 'fecha_creacion']
+    list_filter = ['activo']
+    search_fields = ['nombre']
+    readonly_fields = ['ultimo_envio', 'fecha_creacion']
+    actions = ['regenerar_token']
+    
+    def save_model(self, request, obj, form, change):
+        # El token solo se muestra ahora: en la base queda su hash
+        token = obj.generar_token() if not change else None
+        super().save_model(request, obj, form, change)
+        if token:
+            messages.warning(request, f'Token de {obj.nombre}: {token} (cópielo ahora, no se vuelve a mostrar)')
+    
+    def regenerar_token(self, request, queryset):
+        for dispositivo in queryset:
+            token = dispositivo.generar_token()
+            dispositivo.save(update_fields=['token_hash'])
+            messages.warning(request, f'Nuevo token de {dispositivo.nombre}: {token}')
+    regenerar_token.short_description = 'Regenerar token'
+
+
 @admin.register(Medicamento)
 class MedicamentoAdmin(admin.ModelAdmin):
     list_display = ['nombre', 'gramos', 'cantidad', 'fecha_actualizacion']
@@ -134,3 +216,61 @@ class RecetaMedicamentoAdmin(admin.ModelAdmin):
     search_fields = ['medicamento__nombre', 'receta__paciente__nombre']
     ordering = ['-fecha_agregado']
     readonly_fields = ['fecha_agregado']
+
+
+# El registro de movimientos es de solo lectura: el stock se modifica desde el inventario
+@admin.register(MovimientoStock)
+class MovimientoStockAdmin(admin.ModelAdmin):
+    list_display = ['medicamento', 'tipo', 'cantidad', 'usuario', 'fecha']
+    list_filter = ['tipo', 'fecha']
+    search_fields = ['medicamento__nombre', 'motivo']
+    ordering = ['-fecha']
+    list_select_related = ['medicamento', 'usuario']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(CierreStock)
+class CierreStockAdmin(admin.ModelAdmin):
+    list_display = ['medicamento', 'fecha', 'saldo']
+    list_filter = ['fecha']
+    search_fields = ['medicamento__nombre']
+    ordering = ['-fecha']
+    list_select_related = ['medicamento']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+# Los lotes se ingresan aquí; luego solo cambian por recetas y por el barrido de vencidos
+@admin.register(LoteMedicamento)
+class LoteMedicamentoAdmin(admin.ModelAdmin):
+    list_display = ['medicamento', 'codigo', 'fecha_vencimiento', 'cantidad_inicial', 'cantidad_disponible', 'vencido']
+    list_filter = ['vencido', 'fecha_vencimiento']
+    search_fields = ['medicamento__nombre', 'codigo']
+    ordering = ['fecha_vencimiento']
+    list_select_related = ['medicamento']
+    fields = ['medicamento', 'codigo', 'fecha_vencimiento', 'cantidad_inicial']
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+    
+    def save_model(self, request, obj, form, change):
+        # Crea el lote y registra el ingreso de su cantidad en el stock
+        lote = obj.medicamento.ingresar_lote(
+            obj.codigo, obj.fecha_vencimiento, obj.cantidad_inicial, usuario=request.user
+        )
+        obj.pk = lote.pk
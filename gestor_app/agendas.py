@@ -0,0 +1,60 @@
+"""
+Agenda diaria en PDF de cada médico, para imprimir en recepción.
+
+Las citas del día se cargan con sus pacientes en una sola consulta (más una para
+los médicos) y se agrupan por médico en Python. Los documentos se dibujan en el
+pool de procesos de pdf.py y se entregan como (nombre de archivo, bytes), para
+escribirlos en un directorio o en un ZIP.
+"""
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .fechas import filtro_dias
+from .models import Cita, Medico
+from .pdf import generar_zip, renderizar_en_paralelo
+from .renderizado import renderizar_agenda_bytes
+
+
+def datos_agendas(fecha, medicos=None):
+    """Datos de la agenda de `fecha` de cada médico (todos, o los del queryset `medicos`)"""
+    medicos = (medicos if medicos is not None else Medico.objects.all()).select_related('usuario').order_by('usuario__nombre', 'id')
+    citas = (
+        Cita.objects.filter(medico__in=medicos.values('id'), **filtro_dias('fecha_hora', fecha, fecha))
+        .exclude(estado='cancelada')
+        .order_by('fecha_hora')
+        .values_list('medico_id', 'fecha_hora', 'paciente__nombre', 'paciente__rut', 'paciente__telefono', 'motivo', 'estado')
+    )
+    estados = dict(Cita.ESTADO_CHOICES)
+    por_medico = {}
+    for medico_id, fecha_hora, nombre, rut, telefono, motivo, estado in citas:
+        por_medico.setdefault(medico_id, []).append([
+            timezone.localtime(fecha_hora).strftime('%H:%M'), nombre, rut, telefono, motivo, estados.get(estado, estado),
+        ])
+
+    for medico in medicos:
+        yield {
+            'id': medico.id,
+            'medico': {
+                'nombre': medico.usuario.nombre,
+                'especialidad': medico.especialidad,
+                'numero_registro': medico.numero_registro,
+            },
+            'fecha': fecha.strftime('%d/%m/%Y'),
+            'fecha_archivo': fecha.strftime('%Y%m%d'),
+            'citas': por_medico.get(medico.id, []),
+        }
+
+
+def nombre_agenda(datos):
+    return f"agenda_{datos['fecha_archivo']}_{datos['id']}_{slugify(datos['medico']['nombre'])}.pdf"
+
+
+def generar_agendas(fecha, medicos=None):
+    """(nombre de archivo, pdf en bytes) de cada agenda, en el orden en que se terminan"""
+    for datos, contenido in renderizar_en_paralelo(datos_agendas(fecha, medicos), funcion=renderizar_agenda_bytes):
+        yield nombre_agenda(datos), contenido
+
+
+def zip_agendas(fecha, medicos=None):
+    """ZIP en partes con las agendas del día"""
+    return generar_zip(generar_agendas(fecha, medicos))
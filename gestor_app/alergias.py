@@ -0,0 +1,126 @@
+"""
+Índice de alergias del paciente para revisarlas al emitir una receta.
+
+HistoriaClinica.alergias es texto libre. Al guardar la historia se convierte en
+tokens normalizados (AlergenoPaciente) con las mismas reglas que se aplican a los
+nombres de los medicamentos: principios activos y grupos conocidos desde
+data/grupos_alergia.csv ("amoxicilina" también es "penicilina") y el resto de las
+palabras significativas. Revisar una receta es una sola consulta por (paciente, token).
+"""
+import csv
+import re
+from pathlib import Path
+
+from django.db import transaction
+
+from .busqueda import normalizar
+from .models import AlergenoPaciente, HistoriaClinica
+
+DIRECTORIO_DATOS = Path(__file__).resolve().parent / 'data'
+LARGO_MINIMO = 4
+TAMANO_LOTE = 1000
+
+# Palabras que no identifican un alérgeno (ya normalizadas y en singular)
+PALABRAS_IGNORADAS = {
+    'alergia', 'alergico', 'alergica', 'reaccion', 'intolerancia', 'hipersensibilidad', 'leve', 'severa',
+    'severo', 'grave', 'medicamento', 'farmaco', 'ninguna', 'ninguno', 'niega', 'conocida', 'conocido',
+    'refiere', 'presenta', 'tipo', 'otro', 'otra', 'desconocida', 'contra', 'durante', 'desde',
+    'acido', 'sodico', 'potasico', 'clorhidrato', 'comprimido', 'tableta', 'capsula', 'jarabe', 'gota',
+    'solucion', 'inyectable', 'ampolla', 'crema', 'forte', 'retard', 'oral', 'suspension', 'para',
+}
+
+
+def _singular(palabra):
+    return palabra[:-1] if len(palabra) > LARGO_MINIMO and palabra.endswith('s') else palabra
+
+
+def _clave(texto):
+    return ' '.join(_singular(palabra) for palabra in normalizar(texto).split())
+
+
+def _cargar_grupos():
+    """{término normalizado: {tokens que representa}} desde data/grupos_alergia.csv"""
+    grupos = {}
+    with open(DIRECTORIO_DATOS / 'grupos_alergia.csv', newline='', encoding='utf-8') as archivo:
+        for fila in csv.DictReader(archivo):
+            termino, grupo = _clave(fila['termino']), _clave(fila['grupo'])
+            grupos.setdefault(termino, {termino}).add(grupo)
+            grupos.setdefault(grupo, {grupo})
+    return grupos
+
+
+GRUPOS = _cargar_grupos()
+MAX_PALABRAS = max(len(termino.split()) for termino in GRUPOS)
+
+
+def tokenizar(texto):
+    """Tokens de alérgeno de un texto libre (una alergia o el nombre de un medicamento)"""
+    palabras = _clave(texto or '').split()
+    tokens = set()
+    i = 0
+    while i < len(palabras):
+        # Primero los términos conocidos, del más largo al más corto
+        for largo in range(min(MAX_PALABRAS, len(palabras) - i), 0, -1):
+            conocidos = GRUPOS.get(' '.join(palabras[i:i + largo]))
+            if conocidos is not None:
+                tokens |= conocidos
+                i += largo
+                break
+        else:
+            palabra = palabras[i]
+            if len(palabra) >= LARGO_MINIMO and palabra not in PALABRAS_IGNORADAS and not re.search(r'\d', palabra):
+                tokens.add(palabra)
+            i += 1
+    return tokens
+
+
+def sincronizar_alergenos(paciente_id, alergias):
+    """Reemplaza los tokens guardados del paciente por los de su texto de alergias"""
+    tokens = tokenizar(alergias)
+    with transaction.atomic():
+        AlergenoPaciente.objects.filter(paciente_id=paciente_id).exclude(token__in=tokens).delete()
+        AlergenoPaciente.objects.bulk_create(
+            [AlergenoPaciente(paciente_id=paciente_id, token=token) for token in tokens],
+            ignore_conflicts=True,
+        )
+
+
+def indexar_historias(tamano_lote=TAMANO_LOTE):
+    """Regenera los tokens de todas las historias por lotes. Retorna la cantidad de historias"""
+    total = 0
+    ultimo_id = 0
+    while True:
+        lote = list(
+            HistoriaClinica.objects.filter(id__gt=ultimo_id).order_by('id')
+            .values_list('id', 'paciente_id', 'alergias')[:tamano_lote]
+        )
+        if not lote:
+            return total
+        with transaction.atomic():
+            AlergenoPaciente.objects.filter(paciente_id__in=[paciente_id for _, paciente_id, _ in lote]).delete()
+            AlergenoPaciente.objects.bulk_create([
+                AlergenoPaciente(paciente_id=paciente_id, token=token)
+                for _, paciente_id, alergias in lote
+                for token in tokenizar(alergias)
+            ])
+        total += len(lote)
+        ultimo_id = lote[-1][0]
+
+
+def revisar_alergias(paciente_id, medicamentos):
+    """
+    Medicamentos que coinciden con alguna alergia registrada del paciente.
+    `medicamentos` es una lista de nombres; retorna [(nombre, [tokens])] con una sola consulta.
+    """
+    tokens_por_medicamento = {nombre: tokenizar(nombre) for nombre in medicamentos}
+    todos = set().union(*tokens_por_medicamento.values()) if tokens_por_medicamento else set()
+    if not todos:
+        return []
+    alergenos = set(
+        AlergenoPaciente.objects.filter(paciente_id=paciente_id, token__in=todos).values_list('token', flat=True)
+    )
+    return [
+        (nombre, sorted(tokens & alergenos))
+        for nombre, tokens in tokens_por_medicamento.items()
+        if tokens & alergenos
+    ]
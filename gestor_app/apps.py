@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class GestorAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'gestor_app'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .interacciones import obtener_matriz
+        
+        # La matriz de interacciones se compila al iniciar, no en la primera receta
+        obtener_matriz()
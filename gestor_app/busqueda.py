@@ -0,0 +1,116 @@
+"""
+Índice en memoria para el autocompletado de medicamentos (buscar_medicamentos).
+
+El índice contiene los medicamentos con stock y se construye la primera vez que se
+usa. Cada cambio en Medicamento (o en su stock) renueva un sello de versión en la
+caché compartida; cuando el sello no coincide con el del índice, éste se vuelve a
+construir con una sola consulta. Entre cambios las búsquedas no tocan la base de datos.
+"""
+import bisect
+import re
+import threading
+import time
+import unicodedata
+
+from django.core.cache import cache
+
+from .models import Medicamento
+
+CLAVE_VERSION = 'medicamentos:indice:version'
+LIMITE_RESULTADOS = 10
+
+
+def normalizar(texto):
+    """Minúsculas, sin tildes y con la puntuación convertida en espacios ("Ácido Fólico" -> "acido folico")"""
+    descompuesto = unicodedata.normalize('NFKD', texto.lower())
+    sin_tildes = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(re.findall(r'[a-z0-9]+', sin_tildes))
+
+
+def marcar_cambio():
+    """Invalida los índices de todos los procesos"""
+    cache.set(CLAVE_VERSION, time.time_ns(), None)
+
+
+def version_actual():
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        # Sin sello (caché reiniciada): se crea uno nuevo para forzar la reconstrucción
+        version = time.time_ns()
+        cache.add(CLAVE_VERSION, version, None)
+        version = cache.get(CLAVE_VERSION, version)
+    return version
+
+
+class IndiceMedicamentos:
+    """Tokens ordenados para búsqueda por prefijo, más los nombres normalizados para subcadenas"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        # (medicamentos, nombres normalizados, tokens ordenados, posición de cada token)
+        self._datos = ([], [], [], [])
+
+    def _construir(self):
+        medicamentos = list(
+            Medicamento.objects.filter(cantidad__gt=0)
+            .order_by('nombre')
+            .values('id', 'nombre', 'gramos', 'cantidad', 'descripcion')
+        )
+        nombres = [normalizar(m['nombre']) for m in medicamentos]
+        pares = sorted(
+            (token, posicion)
+            for posicion, nombre in enumerate(nombres)
+            for token in set(nombre.split())
+        )
+        self._datos = (medicamentos, nombres, [t for t, _ in pares], [p for _, p in pares])
+
+    def _asegurar_vigente(self):
+        version = version_actual()
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._construir()
+                    self._version = version
+
+    def buscar(self, texto, limite=LIMITE_RESULTADOS):
+        """
+        Busca medicamentos con stock. Primero los que empiezan con el texto, luego los
+        que tienen una palabra que empieza con él y al final los que lo contienen.
+        """
+        self._asegurar_vigente()
+        medicamentos, nombres, tokens, posiciones = self._datos
+
+        consulta = normalizar(texto)
+        if not consulta:
+            return []
+
+        # Candidatos por prefijo de palabra, usando la primera palabra de la consulta
+        primera = consulta.split()[0]
+        candidatos = set()
+        i = bisect.bisect_left(tokens, primera)
+        while i < len(tokens) and tokens[i].startswith(primera):
+            candidatos.add(posiciones[i])
+            i += 1
+
+        inicio_nombre, inicio_palabra = [], []
+        for posicion in candidatos:
+            nombre = nombres[posicion]
+            if nombre.startswith(consulta):
+                inicio_nombre.append(posicion)
+            elif f' {consulta}' in f' {nombre}':
+                inicio_palabra.append(posicion)
+
+        resultado = sorted(inicio_nombre) + sorted(inicio_palabra)
+        if len(resultado) < limite:
+            encontrados = set(resultado)
+            for posicion, nombre in enumerate(nombres):
+                if posicion not in encontrados and consulta in nombre:
+                    resultado.append(posicion)
+                    if len(resultado) >= limite:
+                        break
+
+        return [medicamentos[posicion] for posicion in resultado[:limite]]
+
+
+indice_medicamentos = IndiceMedicamentos()
@@ -0,0 +1,75 @@
+"""
+Caché del resumen de paciente mostrado en ver_paciente.
+
+El resumen (paciente, historia clínica, últimas citas, recetas y signos vitales)
+se guarda como un solo objeto en caché por paciente. Las señales de signals.py lo
+invalidan cada vez que cambia alguna de esas filas, o el nombre o la especialidad de
+un médico que aparece en sus citas o recetas.
+"""
+from django.core.cache import cache
+
+from .models import Paciente, Cita, RecetaMedica, SignosVitales, HistoriaClinica
+
+# Respaldo por si algún cambio no pasa por las señales (p. ej. QuerySet.update)
+DURACION_CACHE = 60 * 15
+
+
+def clave_resumen(paciente_id):
+    return f'paciente:{paciente_id}:resumen'
+
+
+def construir_resumen(paciente_id):
+    """Carga todo lo que muestra la ficha del paciente, con sus relaciones ya resueltas"""
+    paciente = Paciente.objects.select_related('historia').filter(id=paciente_id).first()
+    if paciente is None:
+        return None
+
+    try:
+        historia = paciente.historia
+    except HistoriaClinica.DoesNotExist:
+        historia = None
+
+    return {
+        'paciente': paciente,
+        'historia': historia,
+        'citas': list(
+            Cita.objects.filter(paciente_id=paciente_id)
+            .select_related('medico__usuario')
+            .order_by('-fecha_hora')[:10]
+        ),
+        'recetas': list(
+            RecetaMedica.objects.filter(paciente_id=paciente_id)
+            .select_related('medico__usuario')
+            .order_by('-fecha_emision')[:5]
+        ),
+        'signos': list(
+            SignosVitales.objects.filter(paciente_id=paciente_id)
+            .select_related('enfermera__usuario')
+            .order_by('-fecha_hora')[:5]
+        ),
+    }
+
+
+def obtener_resumen(paciente_id):
+    """Retorna el resumen desde la caché, construyéndolo si no existe (None si el paciente no existe)"""
+    clave = clave_resumen(paciente_id)
+    resumen = cache.get(clave)
+    if resumen is None:
+        resumen = construir_resumen(paciente_id)
+        if resumen is not None:
+            cache.set(clave, resumen, DURACION_CACHE)
+    return resumen
+
+
+def pacientes_de_medico(medico_id):
+    """Pacientes cuyo resumen puede mostrar al médico (tiene citas o recetas con él)"""
+    return (
+        set(Cita.objects.filter(medico_id=medico_id).values_list('paciente_id', flat=True).distinct())
+        | set(RecetaMedica.objects.filter(medico_id=medico_id).values_list('paciente_id', flat=True).distinct())
+    )
+
+
+def invalidar_resumen(*pacientes_ids):
+    claves = [clave_resumen(pid) for pid in set(pacientes_ids) if pid is not None]
+    if claves:
+        cache.delete_many(claves)
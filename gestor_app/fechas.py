@@ -0,0 +1,42 @@
+"""
+Días locales (America/Santiago, TIME_ZONE) como rangos de fecha y hora con zona horaria.
+
+Un día es el rango semiabierto [inicio del día, inicio del día siguiente). Así un filtro
+por fecha es una comparación directa sobre la columna, que usa su índice (en lugar de
+fecha_hora__date, que aplica una función a cada fila), y los días con cambio de hora
+quedan completos: el día en que se atrasa la hora dura 25 horas y el día en que se
+adelanta, 23. En Chile el cambio ocurre a medianoche, así que el día en que se adelanta
+la hora no tiene 00:00 local; combine() con fold=0 usa el desfase anterior al cambio,
+que da el instante correcto (la 01:00 con el desfase nuevo).
+"""
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.utils import timezone
+
+
+def zona_local():
+    return timezone.get_default_timezone()
+
+
+def inicio_dia(fecha):
+    """Primer instante del día local `fecha`"""
+    # Se pasa por UTC para normalizar el desfase (astimezone a la misma zona no convierte)
+    return datetime.combine(fecha, time.min, tzinfo=zona_local()).astimezone(dt_timezone.utc).astimezone(zona_local())
+
+
+def rango_dias(desde, hasta=None):
+    """(inicio, fin) semiabierto que cubre los días locales de `desde` a `hasta` inclusive"""
+    return inicio_dia(desde), inicio_dia((hasta or desde) + timedelta(days=1))
+
+
+def filtro_dias(campo, desde=None, hasta=None):
+    """
+    Argumentos de filter() para los registros de `campo` entre los días `desde` y `hasta`
+    (inclusive); cualquiera de los dos puede faltar.
+    """
+    filtro = {}
+    if desde:
+        filtro[f'{campo}__gte'] = inicio_dia(desde)
+    if hasta:
+        filtro[f'{campo}__lt'] = inicio_dia(hasta + timedelta(days=1))
+    return filtro
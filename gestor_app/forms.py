@@ -1,6 +1,7 @@
 from django import forms
 from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
-from .models import CustomUser, Medico, Enfermera, Recepcionista, Paciente, Cita, RecetaMedica, HistoriaClinica, SignosVitales, Medicamento, RecetaMedicamento
+from .fechas import filtro_dias
+from .models import CustomUser, Medico, Enfermera, Recepcionista, Paciente, Cita, RecetaMedica, HistoriaClinica, SignosVitales, Medicamento, RecetaMedicamento, MovimientoStock, parsear_presion
 from datetime import date
 
 # Formulario de Login con RUT
@@ -134,6 +135,45 @@ class PacienteForm(forms.ModelForm):
         }
 
 
+# Formulario de Paciente para importación masiva
+class PacienteImportacionForm(PacienteForm):
+    """Mismas reglas que PacienteForm; la unicidad del RUT se verifica por lote en la importación"""
+    def validate_unique(self):
+        pass
+
+
+# Formulario de antecedentes para importación masiva (el paciente se asigna al insertar)
+class HistoriaClinicaImportacionForm(forms.ModelForm):
+    class Meta:
+        model = HistoriaClinica
+        fields = [
+            'grupo_sanguineo', 'alergias', 'enfermedades_cronicas',
+            'medicamentos_actuales', 'observaciones'
+        ]
+
+
+# Formulario para subir el CSV de pacientes desde el panel de administración
+class ImportarPacientesForm(forms.Form):
+    archivo = forms.FileField(
+        label='Archivo CSV',
+        help_text='Columnas: rut, nombre, fecha_nacimiento, genero, direccion, telefono, email, '
+                  'contacto_emergencia, telefono_emergencia y opcionalmente los antecedentes clínicos'
+    )
+
+
+# Formulario para subir el CSV de inventario desde la lista de medicamentos
+class ImportarMedicamentosForm(forms.Form):
+    archivo = forms.FileField(
+        label='Archivo CSV',
+        help_text='Columnas: nombre, gramos, cantidad y opcionalmente descripcion',
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv'})
+    )
+    simular = forms.BooleanField(
+        label='Solo simular (mostrar los cambios sin guardarlos)', required=False, initial=True,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
+
+
 # Formulario de Historia Clínica
 class HistoriaClinicaForm(forms.ModelForm):
     class Meta:
@@ -262,6 +302,41 @@ class CitaMedicoForm(forms.ModelForm):
         }
 
 
+# Filtros del listado de citas
+class FiltroCitasForm(forms.Form):
+    estado = forms.ChoiceField(
+        choices=[('', 'Todos')] + list(Cita.ESTADO_CHOICES), required=False, label='Estado',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    desde = forms.DateField(
+        required=False, label='Desde',
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    hasta = forms.DateField(
+        required=False, label='Hasta',
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    # Un solo día (?fecha=), como en los enlaces anteriores al rango
+    fecha = forms.DateField(required=False, widget=forms.HiddenInput)
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('fecha') and not (cleaned_data.get('desde') or cleaned_data.get('hasta')):
+            cleaned_data['desde'] = cleaned_data['hasta'] = cleaned_data['fecha']
+        desde = cleaned_data.get('desde')
+        hasta = cleaned_data.get('hasta')
+        if desde and hasta and desde > hasta:
+            raise forms.ValidationError('La fecha inicial no puede ser posterior a la final.')
+        return cleaned_data
+    
+    def filtrar(self, citas):
+        """Aplica los filtros válidos; las fechas son rangos sobre fecha_hora, que usan sus índices"""
+        filtros = self.cleaned_data
+        if filtros.get('estado'):
+            citas = citas.filter(estado=filtros['estado'])
+        return citas.filter(**filtro_dias('fecha_hora', filtros.get('desde'), filtros.get('hasta')))
+
+
 # Formulario de Receta Médica
 class RecetaMedicaForm(forms.ModelForm):
     vigencia = forms.DateField(
@@ -289,6 +364,31 @@ class RecetaMedicaForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
 
 
+# Filtros para exportar recetas en un ZIP (auditoría)
+class ExportarRecetasForm(forms.Form):
+    medico = forms.ModelChoiceField(
+        queryset=Medico.objects.select_related('usuario').order_by('usuario__nombre'),
+        required=False, label='Médico', empty_label='Todos los médicos',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    desde = forms.DateField(
+        required=False, label='Emitidas desde',
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    hasta = forms.DateField(
+        required=False, label='Emitidas hasta',
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        desde = cleaned_data.get('desde')
+        hasta = cleaned_data.get('hasta')
+        if desde and hasta and desde > hasta:
+            raise forms.ValidationError('La fecha inicial no puede ser posterior a la final.')
+        return cleaned_data
+
+
 # Formulario de Signos Vitales
 class SignosVitalesForm(forms.ModelForm):
     class Meta:
@@ -310,6 +410,55 @@ class SignosVitalesForm(forms.ModelForm):
             'altura': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01', 'placeholder': '170'}),
             'observaciones': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
         }
+    
+    def clean_presion_arterial(self):
+        presion = parsear_presion(self.cleaned_data['presion_arterial'])
+        if presion is None:
+            raise forms.ValidationError('Ingrese la presión como sistólica/diastólica, por ejemplo 120/80.')
+        sistolica, diastolica = presion
+        return f'{sistolica}/{diastolica}'
+
+
+# Filtros del listado de signos vitales
+class FiltroSignosForm(forms.Form):
+    paciente = forms.IntegerField(required=False, widget=forms.HiddenInput)
+    enfermera = forms.ModelChoiceField(
+        queryset=Enfermera.objects.select_related('usuario').order_by('usuario__nombre'),
+        required=False, label='Enfermera', empty_label='Todas',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    desde = forms.DateField(
+        required=False, label='Desde',
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    hasta = forms.DateField(
+        required=False, label='Hasta',
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    anormales = forms.BooleanField(
+        required=False, label='Solo valores anormales',
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        desde = cleaned_data.get('desde')
+        hasta = cleaned_data.get('hasta')
+        if desde and hasta and desde > hasta:
+            raise forms.ValidationError('La fecha inicial no puede ser posterior a la final.')
+        return cleaned_data
+    
+    def filtrar(self, signos):
+        """Aplica los filtros válidos; cada combinación usa un índice que empieza por el filtro de igualdad y sigue con fecha_hora"""
+        filtros = self.cleaned_data
+        if filtros.get('paciente'):
+            signos = signos.filter(paciente_id=filtros['paciente'])
+        if filtros.get('enfermera'):
+            signos = signos.filter(enfermera=filtros['enfermera'])
+        signos = signos.filter(**filtro_dias('fecha_hora', filtros.get('desde'), filtros.get('hasta')))
+        if filtros.get('anormales'):
+            signos = signos.anormales()
+        return signos
 
 
 # Formulario de Medicamento
@@ -325,6 +474,63 @@ class MedicamentoForm(forms.ModelForm):
         }
 
 
+# Edición: guarda la cantidad que se mostró para aplicar el cambio como ajuste sobre ella
+class EditarMedicamentoForm(MedicamentoForm):
+    cantidad_original = forms.IntegerField(widget=forms.HiddenInput)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.fields['cantidad_original'].initial = self.instance.cantidad
+
+    def clean_cantidad(self):
+        cantidad = self.cleaned_data['cantidad']
+        if cantidad < 0:
+            raise forms.ValidationError('La cantidad no puede ser negativa.')
+        return cantidad
+
+
+# Validación de cada fila del CSV de inventario (el stock se aplica como ajuste, no con save)
+class MedicamentoImportacionForm(forms.ModelForm):
+    class Meta:
+        model = Medicamento
+        fields = ['nombre', 'gramos', 'cantidad', 'descripcion']
+    
+    def clean_cantidad(self):
+        cantidad = self.cleaned_data['cantidad']
+        if cantidad < 0:
+            raise forms.ValidationError('La cantidad no puede ser negativa.')
+        return cantidad
+
+
+# Formulario para registrar movimientos manuales de stock (las dispensaciones las registra la receta)
+class MovimientoStockForm(forms.ModelForm):
+    class Meta:
+        model = MovimientoStock
+        fields = ['tipo', 'cantidad', 'motivo']
+        widgets = {
+            'tipo': forms.Select(attrs={'class': 'form-select'}),
+            'cantidad': forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Ej: 50 o -3 para ajustes'}),
+            'motivo': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Ej: Factura 1234, devolución de paciente'}),
+        }
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['tipo'].choices = [c for c in MovimientoStock.TIPO_CHOICES if c[0] != 'dispensacion']
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        tipo = cleaned_data.get('tipo')
+        cantidad = cleaned_data.get('cantidad')
+        
+        if cantidad == 0:
+            self.add_error('cantidad', 'La cantidad no puede ser cero.')
+        elif tipo in ('ingreso', 'devolucion') and cantidad is not None and cantidad < 0:
+            self.add_error('cantidad', 'Los ingresos y devoluciones deben ser positivos.')
+        
+        return cleaned_data
+
+
 # Formulario para agregar medicamentos a una receta
 class RecetaMedicamentoForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,359 @@
+"""
+Importación masiva de pacientes e inventario de medicamentos desde archivos CSV.
+
+El archivo se lee fila a fila y se procesa por lotes: cada lote se valida con las
+reglas del formulario correspondiente, se buscan las filas existentes con una sola
+consulta y se escribe con bulk_create / bulk_update. La memoria usada depende del
+tamaño del lote, no del tamaño del archivo.
+"""
+import csv
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .alergias import tokenizar
+from .busqueda import marcar_cambio
+from .forms import PacienteImportacionForm, HistoriaClinicaImportacionForm, MedicamentoImportacionForm
+from .models import Paciente, HistoriaClinica, AlergenoPaciente, Medicamento, MovimientoStock
+
+TAMANO_LOTE = 1000
+
+CAMPOS_PACIENTE = PacienteImportacionForm._meta.fields
+CAMPOS_HISTORIA = HistoriaClinicaImportacionForm._meta.fields
+CAMPOS_OBLIGATORIOS = [
+    nombre for nombre, campo in PacienteImportacionForm.base_fields.items() if campo.required
+]
+
+
+class ResultadoImportacion:
+    """Contadores de una importación"""
+
+    def __init__(self):
+        self.filas = 0
+        self.pacientes_creados = 0
+        self.historias_creadas = 0
+        self.rechazadas = 0
+
+    def __str__(self):
+        return (
+            f'{self.filas} filas leídas: {self.pacientes_creados} pacientes creados, '
+            f'{self.historias_creadas} historias clínicas creadas, {self.rechazadas} filas rechazadas'
+        )
+
+
+def _formatear_errores(errores):
+    return '; '.join(f"{campo}: {' '.join(mensajes)}" for campo, mensajes in errores.items())
+
+
+def importar_pacientes(archivo, rechazos=None, usuario=None, tamano_lote=TAMANO_LOTE):
+    """
+    Importa pacientes (y opcionalmente su historia clínica) desde un CSV de texto.
+
+    `archivo` es cualquier iterable de líneas de texto. Si se entrega `rechazos`
+    (un archivo de texto abierto para escritura), las filas inválidas se copian ahí
+    con su número de fila y el detalle de los errores.
+    """
+    lector = csv.DictReader(archivo)
+    columnas = lector.fieldnames or []
+    faltantes = [campo for campo in CAMPOS_OBLIGATORIOS if campo not in columnas]
+    if faltantes:
+        raise ValueError(f"Faltan columnas obligatorias en el CSV: {', '.join(faltantes)}")
+
+    escritor = None
+    if rechazos is not None:
+        escritor = csv.DictWriter(rechazos, fieldnames=['fila', 'errores'] + columnas, extrasaction='ignore')
+        escritor.writeheader()
+
+    resultado = ResultadoImportacion()
+    lote = []
+    for numero_fila, fila in enumerate(lector, start=2):
+        lote.append((numero_fila, fila))
+        if len(lote) >= tamano_lote:
+            _procesar_lote(lote, escritor, usuario, resultado)
+            lote = []
+    if lote:
+        _procesar_lote(lote, escritor, usuario, resultado)
+
+    return resultado
+
+
+def _procesar_lote(lote, escritor, usuario, resultado):
+    """Valida, descarta colisiones de RUT e inserta un lote de filas"""
+    validas = []
+    rechazadas = []
+
+    for numero_fila, fila in lote:
+        datos = {campo: (valor or '').strip() for campo, valor in fila.items() if campo}
+        errores = {}
+
+        form = PacienteImportacionForm(datos)
+        if not form.is_valid():
+            errores.update(form.errors)
+
+        historia_form = None
+        if any(datos.get(campo) for campo in CAMPOS_HISTORIA):
+            historia_form = HistoriaClinicaImportacionForm(datos)
+            if not historia_form.is_valid():
+                errores.update(historia_form.errors)
+
+        if errores:
+            rechazadas.append((numero_fila, fila, _formatear_errores(errores)))
+        else:
+            validas.append((numero_fila, fila, form, historia_form))
+
+    # Una sola consulta por lote para detectar RUT ya registrados
+    ruts = [form.cleaned_data['rut'] for _, _, form, _ in validas]
+    existentes = set(Paciente.objects.filter(rut__in=ruts).values_list('rut', flat=True))
+
+    pacientes = []
+    historias = {}
+    vistos = set()
+    for numero_fila, fila, form, historia_form in validas:
+        rut = form.cleaned_data['rut']
+        if rut in existentes:
+            rechazadas.append((numero_fila, fila, 'rut: Ya existe un paciente con este RUT.'))
+            continue
+        if rut in vistos:
+            rechazadas.append((numero_fila, fila, 'rut: RUT repetido dentro del archivo.'))
+            continue
+        vistos.add(rut)
+        pacientes.append(form.save(commit=False))
+        if historia_form is not None:
+            historias[rut] = historia_form.save(commit=False)
+
+    if pacientes:
+        with transaction.atomic():
+            Paciente.objects.bulk_create(pacientes)
+            if historias:
+                # bulk_create no devuelve ids en MySQL: se recuperan por RUT
+                ids = dict(Paciente.objects.filter(rut__in=list(historias)).values_list('rut', 'id'))
+                for rut, historia in historias.items():
+                    historia.paciente_id = ids[rut]
+                    historia.actualizado_por = usuario
+                HistoriaClinica.objects.bulk_create(historias.values())
+                # bulk_create no emite señales: los alérgenos se indexan aquí
+                AlergenoPaciente.objects.bulk_create([
+                    AlergenoPaciente(paciente_id=historia.paciente_id, token=token)
+                    for historia in historias.values()
+                    for token in tokenizar(historia.alergias)
+                ])
+
+    if escritor is not None:
+        for numero_fila, fila, errores in sorted(rechazadas, key=lambda r: r[0]):
+            escritor.writerow({**fila, 'fila': numero_fila, 'errores': errores})
+
+    resultado.filas += len(lote)
+    resultado.pacientes_creados += len(pacientes)
+    resultado.historias_creadas += len(historias)
+    resultado.rechazadas += len(rechazadas)
+
+
+# ============= INVENTARIO DE MEDICAMENTOS =============
+
+COLUMNAS_MEDICAMENTOS = ['nombre', 'gramos', 'cantidad', 'descripcion']
+COLUMNAS_DIFERENCIAS = ['fila', 'accion', 'nombre', 'gramos', 'detalle']
+# Cambios que se guardan en el resultado para mostrarlos en pantalla
+LIMITE_CAMBIOS_RESUMEN = 200
+
+
+class ResultadoImportacionMedicamentos:
+    """Contadores de una importación de inventario y los primeros cambios para mostrar"""
+
+    def __init__(self, simulacion=False):
+        self.simulacion = simulacion
+        self.filas = 0
+        self.creados = 0
+        self.actualizados = 0
+        self.sin_cambios = 0
+        self.rechazadas = 0
+        self.cambios = []
+
+    def __str__(self):
+        prefijo = 'Simulación: ' if self.simulacion else ''
+        return (
+            f'{prefijo}{self.filas} filas leídas: {self.creados} medicamentos creados, '
+            f'{self.actualizados} actualizados, {self.sin_cambios} sin cambios, {self.rechazadas} filas rechazadas'
+        )
+
+
+def clave_medicamento(nombre, gramos):
+    """Un medicamento se identifica por su nombre y concentración"""
+    return nombre.strip(), Decimal(gramos).quantize(Decimal('0.01'))
+
+
+def importar_medicamentos(archivo, diferencias=None, usuario=None, simular=False, tamano_lote=TAMANO_LOTE):
+    """
+    Crea o actualiza medicamentos desde un CSV (nombre, gramos, cantidad y opcionalmente
+    descripcion). Las filas se emparejan por nombre y concentración; los cambios de
+    stock quedan en el registro de movimientos como ajustes.
+
+    Con `simular=True` no se escribe nada. Si se entrega `diferencias` (un archivo de
+    texto abierto para escritura) se escribe ahí cada fila creada, actualizada o
+    rechazada con el detalle del cambio.
+    """
+    lector = csv.DictReader(archivo)
+    columnas = lector.fieldnames or []
+    faltantes = [campo for campo in COLUMNAS_MEDICAMENTOS[:3] if campo not in columnas]
+    if faltantes:
+        raise ValueError(f"Faltan columnas obligatorias en el CSV: {', '.join(faltantes)}")
+
+    escritor = None
+    if diferencias is not None:
+        escritor = csv.DictWriter(diferencias, fieldnames=COLUMNAS_DIFERENCIAS)
+        escritor.writeheader()
+
+    resultado = ResultadoImportacionMedicamentos(simulacion=simular)
+    opciones = {
+        'usuario': usuario,
+        'simular': simular,
+        'actualiza_descripcion': 'descripcion' in columnas,
+        # Claves ya vistas en lotes anteriores, para rechazar repetidos en todo el archivo
+        'vistos': set(),
+    }
+    lote = []
+    for numero_fila, fila in enumerate(lector, start=2):
+        lote.append((numero_fila, fila))
+        if len(lote) >= tamano_lote:
+            _anotar_cambios(_procesar_lote_medicamentos(lote, resultado, **opciones), escritor, resultado)
+            lote = []
+    if lote:
+        _anotar_cambios(_procesar_lote_medicamentos(lote, resultado, **opciones), escritor, resultado)
+
+    if not simular and (resultado.creados or resultado.actualizados):
+        # bulk_create / bulk_update no emiten señales: se avisa una vez al índice de búsqueda
+        transaction.on_commit(marcar_cambio)
+    return resultado
+
+
+def _cambio(numero_fila, accion, nombre, gramos, detalle):
+    return {'fila': numero_fila, 'accion': accion, 'nombre': nombre, 'gramos': gramos, 'detalle': detalle}
+
+
+def _anotar_cambios(cambios, escritor, resultado):
+    """Escribe los cambios de un lote en orden de fila y guarda los primeros en el resultado"""
+    cambios.sort(key=lambda c: c['fila'])
+    if escritor is not None:
+        escritor.writerows(cambios)
+    resultado.cambios.extend(cambios[:LIMITE_CAMBIOS_RESUMEN - len(resultado.cambios)])
+
+
+def _procesar_lote_medicamentos(lote, resultado, usuario, simular, actualiza_descripcion, vistos):
+    """Valida un lote, lo empareja con los medicamentos existentes y aplica los cambios. Retorna los cambios"""
+    resultado.filas += len(lote)
+    cambios = []
+    validas = {}
+    for numero_fila, fila in lote:
+        datos = {campo: (valor or '').strip() for campo, valor in fila.items() if campo}
+        form = MedicamentoImportacionForm(datos)
+        if not form.is_valid():
+            resultado.rechazadas += 1
+            cambios.append(_cambio(numero_fila, 'rechazada', datos.get('nombre', ''),
+                                   datos.get('gramos', ''), _formatear_errores(form.errors)))
+            continue
+        clave = clave_medicamento(form.cleaned_data['nombre'], form.cleaned_data['gramos'])
+        if clave in validas or clave in vistos:
+            resultado.rechazadas += 1
+            cambios.append(_cambio(numero_fila, 'rechazada', *clave, 'Medicamento repetido dentro del archivo.'))
+            continue
+        validas[clave] = (numero_fila, form.cleaned_data)
+    vistos.update(validas)
+
+    with transaction.atomic():
+        # Una consulta por lote; las filas quedan bloqueadas para que una receta
+        # concurrente no se pierda entre la lectura del stock y el bulk_update
+        existentes = {}
+        consulta = Medicamento.objects.filter(nombre__in={nombre for nombre, _ in validas}).order_by('id')
+        if not simular:
+            consulta = consulta.select_for_update()
+        for medicamento in consulta:
+            existentes.setdefault(clave_medicamento(medicamento.nombre, medicamento.gramos), medicamento)
+
+        ahora = timezone.now()
+        nuevos, modificados, movimientos = [], [], []
+        for clave, (numero_fila, datos) in validas.items():
+            medicamento = existentes.get(clave)
+            if medicamento is None:
+                nuevos.append(Medicamento(
+                    nombre=clave[0], gramos=clave[1], cantidad=datos['cantidad'],
+                    descripcion=datos['descripcion'] or None,
+                ))
+                cambios.append(_cambio(numero_fila, 'crear', *clave, f"cantidad: {datos['cantidad']}"))
+                continue
+
+            detalle = []
+            diferencia = datos['cantidad'] - medicamento.cantidad
+            if diferencia:
+                detalle.append(f"cantidad: {medicamento.cantidad} -> {datos['cantidad']}")
+            descripcion = datos['descripcion'] or None
+            if actualiza_descripcion and descripcion != medicamento.descripcion:
+                detalle.append('descripcion')
+                medicamento.descripcion = descripcion
+            if not detalle:
+                resultado.sin_cambios += 1
+                continue
+
+            cambios.append(_cambio(numero_fila, 'actualizar', *clave, '; '.join(detalle)))
+            medicamento.cantidad = datos['cantidad']
+            medicamento.fecha_actualizacion = ahora
+            modificados.append(medicamento)
+            if diferencia:
+                movimientos.append(MovimientoStock(
+                    medicamento=medicamento, tipo='ajuste', cantidad=diferencia, fecha=ahora,
+                    usuario=usuario, motivo='Importación de inventario',
+                ))
+
+        resultado.creados += len(nuevos)
+        resultado.actualizados += len(modificados)
+        if simular:
+            return cambios
+
+        if modificados:
+            Medicamento.objects.bulk_update(modificados, ['cantidad', 'descripcion', 'fecha_actualizacion'])
+            # Las bajas de stock se descuentan también de los lotes (ver Medicamento.conciliar_lotes)
+            for movimiento in movimientos:
+                if movimiento.cantidad < 0:
+                    movimiento.medicamento.conciliar_lotes()
+        if nuevos:
+            Medicamento.objects.bulk_create(nuevos)
+            # bulk_create no devuelve ids en MySQL: se recuperan por nombre y concentración
+            creados = {}
+            for medicamento in Medicamento.objects.filter(nombre__in={m.nombre for m in nuevos}).order_by('id'):
+                creados[clave_medicamento(medicamento.nombre, medicamento.gramos)] = medicamento
+            movimientos.extend(
+                MovimientoStock(
+                    medicamento=creados[clave_medicamento(m.nombre, m.gramos)], tipo='ingreso',
+                    cantidad=m.cantidad, fecha=ahora, usuario=usuario, motivo='Importación de inventario',
+                )
+                for m in nuevos if m.cantidad
+            )
+        MovimientoStock.objects.bulk_create(movimientos)
+    return cambios
+
+
+class _Eco:
+    """Archivo mínimo para csv.writer: retorna la línea en vez de guardarla"""
+
+    def write(self, valor):
+        return valor
+
+
+def exportar_medicamentos(tamano_lote=TAMANO_LOTE):
+    """
+    Genera el inventario completo como líneas CSV (mismas columnas que la importación).
+    Se lee por bloques de `tamano_lote` ordenados por id: el driver de MySQL carga todo
+    el resultado de una consulta en memoria, así que no basta con QuerySet.iterator().
+    """
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow(COLUMNAS_MEDICAMENTOS)
+    ultimo_id = 0
+    while True:
+        bloque = list(
+            Medicamento.objects.filter(id__gt=ultimo_id).order_by('id')
+            .values_list('id', *COLUMNAS_MEDICAMENTOS)[:tamano_lote]
+        )
+        for id, nombre, gramos, cantidad, descripcion in bloque:
+            yield escritor.writerow([nombre, gramos, cantidad, descripcion or ''])
+        if len(bloque) < tamano_lote:
+            return
+        ultimo_id = bloque[-1][0]
@@ -0,0 +1,168 @@
+"""
+Ingesta masiva de signos vitales enviados por monitores de cabecera.
+
+Cada petición trae lecturas en JSON, una por línea (JSON Lines), con el RUT del
+paciente. Los pacientes del lote se resuelven con una sola consulta, cada lectura
+se valida con los mismos rangos del modelo que usa el formulario, y las válidas se
+insertan con bulk_create. Como bulk_create no llama a save() ni emite señales, los
+campos derivados se calculan aquí (la presión por lectura y NEWS2 para todo el lote
+con NumPy) y la caché del resumen de cada paciente se invalida al final.
+
+generar_lecturas() produce lecturas plausibles para el simulador de monitores
+(comando simular_monitores) y para las pruebas.
+"""
+import json
+import random
+from datetime import timedelta
+
+import numpy as np
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .cache_pacientes import invalidar_resumen
+from .models import Paciente, SignosVitales, parsear_presion
+from .news import CAMPOS as CAMPOS_NEWS, calcular_puntajes
+
+MAX_LECTURAS = 5000
+TAMANO_LOTE = 1000
+# Tolerancia para relojes de monitores adelantados
+MARGEN_FUTURO = timedelta(minutes=5)
+
+CAMPOS_LECTURA = (
+    'fecha_hora', 'presion_arterial', 'frecuencia_cardiaca', 'temperatura', 'frecuencia_respiratoria',
+    'saturacion_oxigeno', 'peso', 'altura', 'observaciones',
+)
+# Sin validar en clean_fields: las relaciones (cada una sería una consulta por lectura)
+# y los campos derivados, que se calculan después
+EXCLUIDOS = ['paciente', 'cita', 'enfermera', 'dispositivo', 'presion_sistolica', 'presion_diastolica', 'puntaje_news']
+
+
+class ResultadoIngesta:
+    def __init__(self):
+        self.recibidas = 0
+        self.insertadas = 0
+        self.rechazadas = []
+
+    def agregar_rechazo(self, linea, errores):
+        self.rechazadas.append({'linea': linea, 'errores': errores})
+
+    def como_dict(self):
+        return {'recibidas': self.recibidas, 'insertadas': self.insertadas, 'rechazadas': self.rechazadas}
+
+
+def _leer_lineas(lineas, resultado):
+    """(número de línea, dict) de cada línea con un objeto JSON; las demás se rechazan"""
+    for numero, linea in enumerate(lineas, 1):
+        if not linea.strip():
+            continue
+        resultado.recibidas += 1
+        try:
+            dato = json.loads(linea)
+        except ValueError:
+            dato = None
+        if isinstance(dato, dict):
+            yield numero, dato
+        else:
+            resultado.agregar_rechazo(numero, {'__all__': ['La línea no es un objeto JSON.']})
+
+
+def _presion(dato):
+    """Texto de presión desde "presion_arterial" o desde sistólica y diastólica por separado"""
+    if dato.get('presion_arterial') is not None:
+        return str(dato['presion_arterial'])
+    if dato.get('presion_sistolica') is not None and dato.get('presion_diastolica') is not None:
+        return f"{dato['presion_sistolica']}/{dato['presion_diastolica']}"
+    return ''
+
+
+def _construir(dato, paciente_id, dispositivo, ahora):
+    """(lectura validada lista para insertar, None) o (None, errores)"""
+    # Como texto: clean_fields lo convierte y rechaza listas u objetos con un error normal
+    valores = {campo: str(dato[campo]) for campo in CAMPOS_LECTURA if dato.get(campo) is not None}
+    valores['presion_arterial'] = _presion(dato)
+    lectura = SignosVitales(paciente_id=paciente_id, dispositivo=dispositivo, **valores)
+
+    errores = {}
+    if paciente_id is None:
+        errores['rut'] = ['No existe un paciente con ese RUT.']
+    try:
+        lectura.clean_fields(exclude=EXCLUIDOS)
+    except ValidationError as e:
+        errores.update(e.message_dict)
+
+    if 'fecha_hora' not in errores:
+        if timezone.is_naive(lectura.fecha_hora):
+            lectura.fecha_hora = timezone.make_aware(lectura.fecha_hora)
+        if lectura.fecha_hora > ahora + MARGEN_FUTURO:
+            errores['fecha_hora'] = ['La lectura tiene fecha futura.']
+    if errores:
+        return None, errores
+
+    presion = parsear_presion(lectura.presion_arterial)
+    if presion is None:
+        return None, {'presion_arterial': ['Presión no reconocida (use sistólica/diastólica, por ejemplo 120/80).']}
+    lectura.presion_sistolica, lectura.presion_diastolica = presion
+    lectura.presion_arterial = f'{presion[0]}/{presion[1]}'
+    return lectura, None
+
+
+def ingerir_lecturas(lineas, dispositivo=None, tamano_lote=TAMANO_LOTE):
+    """
+    Valida e inserta las lecturas de `lineas` (iterable de str en JSON Lines).
+    Las lecturas inválidas se informan por número de línea; las demás se insertan.
+    """
+    resultado = ResultadoIngesta()
+    datos = list(_leer_lineas(lineas, resultado))
+
+    ruts = {dato.get('rut') for _, dato in datos if isinstance(dato.get('rut'), str)}
+    pacientes = dict(Paciente.objects.filter(rut__in=ruts).order_by().values_list('rut', 'id'))
+
+    ahora = timezone.now()
+    lecturas = []
+    for numero, dato in datos:
+        # Un RUT que no es texto (lista, objeto) no se puede buscar: se rechaza como RUT inexistente
+        rut = dato.get('rut')
+        paciente_id = pacientes.get(rut) if isinstance(rut, str) else None
+        lectura, errores = _construir(dato, paciente_id, dispositivo, ahora)
+        if errores:
+            resultado.agregar_rechazo(numero, errores)
+        else:
+            lecturas.append(lectura)
+
+    # NEWS2 de todo el lote en una sola pasada de NumPy (los valores ya vienen convertidos)
+    if lecturas:
+        matriz = np.array([[getattr(lectura, campo) for campo in CAMPOS_NEWS] for lectura in lecturas], dtype=np.float64)
+        for lectura, puntaje in zip(lecturas, calcular_puntajes(matriz).tolist()):
+            lectura.puntaje_news = puntaje
+
+    with transaction.atomic():
+        SignosVitales.objects.bulk_create(lecturas, batch_size=tamano_lote)
+    resultado.insertadas = len(lecturas)
+    resultado.rechazadas.sort(key=lambda rechazo: rechazo['linea'])
+    invalidar_resumen(*{lectura.paciente_id for lectura in lecturas})
+    return resultado
+
+
+# ============= SIMULADOR DE MONITORES =============
+
+def generar_lecturas(ruts, cantidad, inicio=None, intervalo=timedelta(seconds=30), semilla=None):
+    """`cantidad` lecturas plausibles repartidas entre los `ruts`, como dicts listos para JSON"""
+    azar = random.Random(semilla)
+    inicio = inicio or timezone.now() - intervalo * cantidad
+    for i in range(cantidad):
+        sistolica = azar.randint(90, 170)
+        yield {
+            'rut': ruts[i % len(ruts)],
+            'fecha_hora': (inicio + intervalo * i).isoformat(),
+            'presion_sistolica': sistolica,
+            'presion_diastolica': sistolica - azar.randint(30, 60),
+            'frecuencia_cardiaca': azar.randint(50, 130),
+            'temperatura': round(azar.uniform(35.5, 39.5), 1),
+            'frecuencia_respiratoria': azar.randint(10, 28),
+            'saturacion_oxigeno': azar.randint(88, 100),
+        }
+
+
+def a_json_lines(lecturas):
+    return ''.join(json.dumps(lectura) + '\n' for lectura in lecturas)
@@ -0,0 +1,140 @@
+"""
+Revisión de interacciones entre medicamentos al emitir una receta.
+
+Las interacciones vienen de data/interacciones.csv (pares de principios activos con
+su severidad) y data/sinonimos.csv (nombres comerciales y variantes). Al iniciar el
+proceso se compilan en una matriz cuadrada de enteros indexada por principio activo:
+revisar una receta es reconocer los principios activos en los nombres (búsqueda en
+un dict por n-gramas de palabras) y leer una submatriz con NumPy, sin tocar la base
+de datos.
+"""
+import csv
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from .busqueda import normalizar
+
+DIRECTORIO_DATOS = Path(__file__).resolve().parent / 'data'
+
+# Severidades de menor a mayor (la posición es el valor guardado en la matriz)
+SEVERIDADES = ('leve', 'moderada', 'grave')
+
+
+class MatrizInteracciones:
+    """Principios activos numerados y matriz de interacciones entre ellos"""
+
+    def __init__(self, archivo_interacciones, archivo_sinonimos=None):
+        self.nombres = []
+        # Nombre o sinónimo normalizado -> índice del principio activo
+        self.indices = {}
+
+        with open(archivo_interacciones, newline='', encoding='utf-8') as archivo:
+            filas = list(csv.DictReader(archivo))
+        for fila in filas:
+            for campo in ('farmaco_a', 'farmaco_b'):
+                self._registrar(fila[campo])
+
+        if archivo_sinonimos is not None:
+            with open(archivo_sinonimos, newline='', encoding='utf-8') as archivo:
+                for fila in csv.DictReader(archivo):
+                    indice = self.indices.get(normalizar(fila['farmaco']))
+                    if indice is not None:
+                        self.indices.setdefault(normalizar(fila['sinonimo']), indice)
+
+        # Celda (i, j): 0 si no hay interacción, si no la posición + 1 en self.detalles
+        total = len(self.nombres)
+        self.matriz = np.zeros((total, total), dtype=np.int16)
+        self.detalles = []
+        for fila in filas:
+            a = self.indices[normalizar(fila['farmaco_a'])]
+            b = self.indices[normalizar(fila['farmaco_b'])]
+            self.detalles.append((SEVERIDADES.index(fila['severidad']), fila['descripcion']))
+            self.matriz[a, b] = self.matriz[b, a] = len(self.detalles)
+
+        self.max_palabras = max((len(nombre.split()) for nombre in self.indices), default=1)
+
+    def _registrar(self, nombre):
+        clave = normalizar(nombre)
+        if clave not in self.indices:
+            self.indices[clave] = len(self.nombres)
+            self.nombres.append(nombre)
+
+    def identificar(self, texto):
+        """Índices de los principios activos mencionados en un texto libre, en orden de aparición"""
+        palabras = normalizar(texto).split()
+        encontrados = []
+        i = 0
+        while i < len(palabras):
+            # Primero la frase más larga: "acido acetilsalicilico" antes que "acido"
+            for largo in range(min(self.max_palabras, len(palabras) - i), 0, -1):
+                indice = self.indices.get(' '.join(palabras[i:i + largo]))
+                if indice is not None:
+                    encontrados.append(indice)
+                    i += largo
+                    break
+            else:
+                i += 1
+        return encontrados
+
+    def revisar(self, medicamentos, medicamentos_actuales=''):
+        """
+        Interacciones entre los medicamentos de la receta y de éstos con los que el
+        paciente ya toma (texto libre de la historia clínica).
+
+        `medicamentos` es una lista de nombres. Retorna una lista de dicts ordenada de
+        mayor a menor severidad.
+        """
+        # (índice del principio activo, nombre mostrado) de cada fuente
+        receta = [(indice, nombre) for nombre in medicamentos for indice in self.identificar(nombre)]
+        actuales = [(indice, 'tratamiento actual') for indice in self.identificar(medicamentos_actuales)]
+        todos = receta + actuales
+        if not receta or len(todos) < 2:
+            return []
+
+        filas = np.fromiter((indice for indice, _ in receta), dtype=np.intp, count=len(receta))
+        columnas = np.fromiter((indice for indice, _ in todos), dtype=np.intp, count=len(todos))
+        # Solo cada par una vez: receta × receta por encima de la diagonal y receta × actuales
+        submatriz = np.triu(self.matriz[np.ix_(filas, columnas)], k=1)
+
+        resultado = []
+        vistos = set()
+        for i, j in zip(*np.nonzero(submatriz)):
+            detalle = int(submatriz[i, j]) - 1
+            par = (detalle, receta[i][1], todos[j][1])
+            if par in vistos:
+                continue
+            vistos.add(par)
+            severidad, descripcion = self.detalles[detalle]
+            resultado.append({
+                'medicamento_a': receta[i][1],
+                'farmaco_a': self.nombres[filas[i]],
+                'medicamento_b': todos[j][1],
+                'farmaco_b': self.nombres[columnas[j]],
+                'severidad': SEVERIDADES[severidad],
+                'descripcion': descripcion,
+                'con_tratamiento_actual': bool(j >= len(receta)),
+            })
+        resultado.sort(key=lambda r: SEVERIDADES.index(r['severidad']), reverse=True)
+        return resultado
+
+
+_lock = threading.Lock()
+_matriz = None
+
+
+def obtener_matriz():
+    """Matriz compilada del proceso (se construye una sola vez)"""
+    global _matriz
+    if _matriz is None:
+        with _lock:
+            if _matriz is None:
+                _matriz = MatrizInteracciones(
+                    DIRECTORIO_DATOS / 'interacciones.csv', DIRECTORIO_DATOS / 'sinonimos.csv'
+                )
+    return _matriz
+
+
+def revisar_interacciones(medicamentos, medicamentos_actuales=''):
+    return obtener_matriz().revisar(medicamentos, medicamentos_actuales)
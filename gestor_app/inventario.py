@@ -0,0 +1,120 @@
+"""
+Tareas periódicas del inventario: cierres del registro de movimientos y baja de lotes vencidos.
+
+Cada cierre guarda el saldo de un medicamento hasta cierto movimiento, de modo que
+el stock a cualquier fecha se obtiene sumando solo los movimientos posteriores al
+último cierre (ver Medicamento.stock_en_fecha).
+
+El registro solo recibe inserciones, pero Medicamento.cantidad se sigue actualizando
+en cada movimiento: el UPDATE condicional es lo que impide que el stock quede negativo
+con recetas simultáneas, y para eso las escrituras de un mismo medicamento tienen que
+turnarse en su fila. Cada movimiento se inserta en la misma transacción que ese UPDATE,
+con la fila bloqueada hasta el commit.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Max, OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from .models import Medicamento, MovimientoStock, CierreStock, LoteMedicamento
+
+
+def _saldos_cierre():
+    """{medicamento_id: (saldo, ultimo_movimiento_id)} del último cierre de cada medicamento"""
+    ultimo = CierreStock.objects.filter(medicamento=OuterRef('pk')).order_by('-fecha', '-id')
+    filas = Medicamento.objects.annotate(
+        saldo_cierre=Subquery(ultimo.values('saldo')[:1]),
+        desde_id=Subquery(ultimo.values('ultimo_movimiento_id')[:1]),
+    ).values_list('id', 'saldo_cierre', 'desde_id')
+    return {med_id: (saldo or 0, desde_id or 0) for med_id, saldo, desde_id in filas}
+
+
+def _sumar_movimientos(saldos):
+    """Suma a cada saldo los movimientos posteriores a su cierre"""
+    # Los medicamentos se agrupan por cierre: normalmente todos comparten el mismo
+    por_desde = defaultdict(list)
+    for med_id, (_, desde_id) in saldos.items():
+        por_desde[desde_id].append(med_id)
+
+    totales = {med_id: saldo for med_id, (saldo, _) in saldos.items()}
+    for desde_id, medicamentos_ids in por_desde.items():
+        movimientos = MovimientoStock.objects.filter(id__gt=desde_id, medicamento_id__in=medicamentos_ids)
+        for med_id, total in movimientos.values('medicamento_id').annotate(total=Sum('cantidad')).values_list('medicamento_id', 'total'):
+            totales[med_id] += total
+    return totales
+
+
+def cerrar_stock():
+    """
+    Crea un cierre por cada medicamento con movimientos nuevos. Retorna la cantidad de cierres.
+
+    Los ids se asignan al insertar, no al confirmar: un movimiento con id menor podría
+    confirmarse después de leer el máximo y quedar fuera de este cierre y de los
+    siguientes. Por eso cada cierre bloquea antes la fila del medicamento, que todo
+    movimiento mantiene bloqueada hasta su commit: al obtener el bloqueo, los
+    movimientos en curso ya están confirmados y los siguientes esperan al cierre.
+    """
+    saldos = _saldos_cierre()
+    # Medicamentos con movimientos después de su último cierre (lectura sin bloqueo: un
+    # movimiento que aún no se confirma entra en el cierre siguiente)
+    desde_minimo = min((desde_id for _, desde_id in saldos.values()), default=0)
+    ultimos = dict(
+        MovimientoStock.objects.filter(id__gt=desde_minimo)
+        .values('medicamento_id').annotate(ultimo=Max('id')).order_by()
+        .values_list('medicamento_id', 'ultimo')
+    )
+    pendientes = [med_id for med_id, ultimo in ultimos.items() if ultimo > saldos.get(med_id, (0, 0))[1]]
+
+    for med_id in pendientes:
+        with transaction.atomic():
+            list(Medicamento.objects.select_for_update().filter(pk=med_id).values_list('pk', flat=True))
+            anterior = CierreStock.objects.filter(medicamento_id=med_id).order_by('-fecha', '-id').first()
+            saldo, desde_id = (anterior.saldo, anterior.ultimo_movimiento_id) if anterior else (0, 0)
+            nuevos = MovimientoStock.objects.filter(medicamento_id=med_id, id__gt=desde_id).aggregate(
+                total=Sum('cantidad'), ultimo=Max('id')
+            )
+            CierreStock.objects.create(
+                medicamento_id=med_id, fecha=timezone.now(), saldo=saldo + nuevos['total'],
+                ultimo_movimiento_id=nuevos['ultimo'],
+            )
+    return len(pendientes)
+
+
+def conciliar_stock():
+    """Lista los medicamentos cuyo stock no coincide con el registro: [(medicamento, saldo_registro)]"""
+    totales = _sumar_movimientos(_saldos_cierre())
+    diferencias = []
+    for medicamento in Medicamento.objects.order_by('nombre'):
+        if totales.get(medicamento.id, 0) != medicamento.cantidad:
+            diferencias.append((medicamento, totales.get(medicamento.id, 0)))
+    return diferencias
+
+
+def vencer_lotes(hoy=None):
+    """
+    Marca como vencidos los lotes con fecha de vencimiento hasta hoy y da de baja su
+    stock restante. Retorna (lotes vencidos, unidades dadas de baja).
+    """
+    hoy = hoy or timezone.localdate()
+    with transaction.atomic():
+        por_vencer = LoteMedicamento.objects.filter(vencido=False, fecha_vencimiento__lte=hoy)
+        # La asignación FEFO no toma lotes con vencimiento hasta hoy: estas cantidades ya no cambian
+        bajas = list(
+            por_vencer.filter(cantidad_disponible__gt=0)
+            .values('medicamento_id')
+            .annotate(total=Sum('cantidad_disponible'))
+            .order_by()
+            .values_list('medicamento_id', 'total')
+        )
+        vencidos = por_vencer.update(vencido=True)
+
+        medicamentos = Medicamento.objects.in_bulk([med_id for med_id, _ in bajas])
+        unidades = 0
+        for med_id, total in bajas:
+            medicamento = medicamentos[med_id]
+            # Si el stock ya es menor (ajustes manuales), se da de baja lo que queda
+            total = min(total, medicamento.cantidad)
+            if total and medicamento.ajustar_stock(-total, 'vencimiento', motivo='Lotes vencidos'):
+                unidades += total
+    return vencidos, unidades
@@ -0,0 +1,139 @@
+"""
+Línea de tiempo del paciente: citas, recetas, signos vitales e historia clínica en
+un solo flujo ordenado del más reciente al más antiguo.
+
+Cada página lee a lo más `limite + 1` filas de cada fuente con una consulta que usa
+el índice (paciente, fecha) y las combina con heapq.merge. La paginación es por
+cursor (fecha, tipo, id), así que el costo de una página no depende de cuántas
+páginas haya antes. El cursor va firmado: uno alterado se rechaza.
+"""
+import heapq
+from datetime import datetime, timedelta
+
+from django.core import signing
+from django.db.models import Q
+
+from .models import Cita, RecetaMedica, SignosVitales, HistoriaClinica
+
+ELEMENTOS_POR_PAGINA = 20
+
+# Orden de desempate entre fuentes con la misma fecha (mayor primero)
+ORDEN_CITA = 4
+ORDEN_RECETA = 3
+ORDEN_SIGNOS = 2
+ORDEN_HISTORIA = 1
+
+
+class Evento:
+    """Elemento de la línea de tiempo"""
+
+    def __init__(self, fecha, orden, id, tipo, objeto, titulo):
+        self.fecha = fecha
+        self.orden = orden
+        self.id = id
+        self.tipo = tipo
+        self.objeto = objeto
+        self.titulo = titulo
+
+    @property
+    def clave(self):
+        return (self.fecha, self.orden, self.id)
+
+
+SAL_CURSOR = 'gestor_app.linea_tiempo'
+
+
+def codificar_cursor(evento):
+    return signing.dumps([evento.fecha.isoformat(), evento.orden, evento.id], salt=SAL_CURSOR, compress=True)
+
+
+def decodificar_cursor(cursor):
+    """Retorna (fecha, orden, id) o None si el cursor no es válido o fue alterado"""
+    try:
+        fecha, orden, id = signing.loads(cursor, salt=SAL_CURSOR)
+        fecha = datetime.fromisoformat(fecha)
+        if fecha.tzinfo is None:
+            return None
+        return fecha, int(orden), int(id)
+    except (signing.BadSignature, ValueError, TypeError):
+        return None
+
+
+def _filtro_cursor(campo, orden, cursor):
+    """Filas estrictamente posteriores al cursor en orden descendente (fecha, orden, id)"""
+    if cursor is None:
+        return Q()
+    fecha, orden_cursor, id_cursor = cursor
+    if orden < orden_cursor:
+        return Q(**{f'{campo}__lte': fecha})
+    if orden > orden_cursor:
+        return Q(**{f'{campo}__lt': fecha})
+    return Q(**{f'{campo}__lt': fecha}) | Q(**{campo: fecha, 'id__lt': id_cursor})
+
+
+def _eventos_citas(paciente_id, cursor, limite):
+    citas = (
+        Cita.objects.filter(_filtro_cursor('fecha_hora', ORDEN_CITA, cursor), paciente_id=paciente_id)
+        .select_related('medico__usuario')
+        .order_by('-fecha_hora', '-id')[:limite]
+    )
+    for cita in citas:
+        yield Evento(cita.fecha_hora, ORDEN_CITA, cita.id, 'cita', cita,
+                     f'Cita con Dr(a). {cita.medico.usuario.nombre}: {cita.motivo}')
+
+
+def _eventos_recetas(paciente_id, cursor, limite):
+    recetas = (
+        RecetaMedica.objects.filter(_filtro_cursor('fecha_emision', ORDEN_RECETA, cursor), paciente_id=paciente_id)
+        .select_related('medico__usuario')
+        .order_by('-fecha_emision', '-id')[:limite]
+    )
+    for receta in recetas:
+        yield Evento(receta.fecha_emision, ORDEN_RECETA, receta.id, 'receta', receta,
+                     f'Receta emitida por Dr(a). {receta.medico.usuario.nombre}')
+
+
+def _eventos_signos(paciente_id, cursor, limite):
+    signos = (
+        SignosVitales.objects.filter(_filtro_cursor('fecha_hora', ORDEN_SIGNOS, cursor), paciente_id=paciente_id)
+        .order_by('-fecha_hora', '-id')[:limite]
+    )
+    for registro in signos:
+        yield Evento(registro.fecha_hora, ORDEN_SIGNOS, registro.id, 'signos', registro,
+                     f'Signos vitales: PA {registro.presion_arterial}, FC {registro.frecuencia_cardiaca} lpm, '
+                     f'T° {registro.temperatura} °C, SatO2 {registro.saturacion_oxigeno}%')
+
+
+def _eventos_historia(paciente_id, cursor, limite):
+    # La historia es una sola fila: genera su creación y su última actualización
+    historia = HistoriaClinica.objects.filter(paciente_id=paciente_id).first()
+    if historia is None:
+        return []
+    eventos = [Evento(historia.fecha_creacion, ORDEN_HISTORIA, 0, 'historia', historia,
+                      'Historia clínica creada')]
+    # auto_now_add y auto_now difieren en microsegundos al crear: no es una actualización
+    if historia.fecha_actualizacion - historia.fecha_creacion > timedelta(seconds=1):
+        eventos.append(Evento(historia.fecha_actualizacion, ORDEN_HISTORIA, 1, 'historia', historia,
+                              'Historia clínica actualizada'))
+    eventos.sort(key=lambda e: e.clave, reverse=True)
+    return [e for e in eventos if cursor is None or e.clave < cursor]
+
+
+FUENTES = (_eventos_citas, _eventos_recetas, _eventos_signos, _eventos_historia)
+
+
+def obtener_pagina(paciente_id, cursor=None, limite=ELEMENTOS_POR_PAGINA):
+    """
+    Retorna (eventos, siguiente_cursor). `cursor` es el valor decodificado
+    (fecha, orden, id) del último evento de la página anterior.
+    """
+    # Cada fuente entrega limite + 1 filas: basta para saber si hay otra página
+    fuentes = [fuente(paciente_id, cursor, limite + 1) for fuente in FUENTES]
+    combinados = heapq.merge(*fuentes, key=lambda e: e.clave, reverse=True)
+
+    eventos = []
+    for evento in combinados:
+        if len(eventos) == limite:
+            return eventos, codificar_cursor(eventos[-1])
+        eventos.append(evento)
+    return eventos, None
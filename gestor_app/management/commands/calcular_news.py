@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from gestor_app.news import recalcular_puntajes, TAMANO_LOTE
+
+
+class Command(BaseCommand):
+    help = 'Calcula el puntaje NEWS2 de las lecturas de signos vitales que no lo tienen'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todos', action='store_true', help='Recalcular también las lecturas que ya tienen puntaje')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help='Lecturas por lote')
+
+    def handle(self, *args, **options):
+        total = recalcular_puntajes(todos=options['todos'], tamano_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'{total} lecturas puntuadas'))
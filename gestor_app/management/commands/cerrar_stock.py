@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from gestor_app.inventario import cerrar_stock, conciliar_stock
+
+
+class Command(BaseCommand):
+    help = 'Registra el cierre de stock de cada medicamento (ejecutar periódicamente, p. ej. cada noche)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--conciliar', action='store_true',
+            help='Compara además el stock actual con el saldo calculado desde el registro de movimientos'
+        )
+
+    def handle(self, *args, **options):
+        creados = cerrar_stock()
+        self.stdout.write(self.style.SUCCESS(f'{creados} cierres de stock registrados'))
+
+        if options['conciliar']:
+            diferencias = conciliar_stock()
+            for medicamento, saldo in diferencias:
+                self.stdout.write(self.style.WARNING(
+                    f'{medicamento.nombre} ({medicamento.gramos}g): stock {medicamento.cantidad}, registro {saldo}'
+                ))
+            if not diferencias:
+                self.stdout.write('El stock coincide con el registro de movimientos')
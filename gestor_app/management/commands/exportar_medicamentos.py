@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from gestor_app.importacion import exportar_medicamentos
+
+
+class Command(BaseCommand):
+    help = 'Exporta el inventario completo de medicamentos como CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--salida', help='Ruta del CSV a escribir (por defecto, la salida estándar)')
+
+    def handle(self, *args, **options):
+        if options['salida']:
+            with open(options['salida'], 'w', newline='', encoding='utf-8') as salida:
+                salida.writelines(exportar_medicamentos())
+            self.stdout.write(self.style.SUCCESS(f"Inventario exportado a {options['salida']}"))
+        else:
+            for linea in exportar_medicamentos():
+                self.stdout.write(linea, ending='')
@@ -0,0 +1,47 @@
+import time
+from datetime import date
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from gestor_app.agendas import generar_agendas
+from gestor_app.pdf import generar_zip
+
+
+class Command(BaseCommand):
+    help = 'Genera la agenda en PDF de cada médico para un día, en un directorio o en un ZIP'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', type=date.fromisoformat, help='Día de las agendas, AAAA-MM-DD (por defecto, hoy)')
+        destino = parser.add_mutually_exclusive_group(required=True)
+        destino.add_argument('--directorio', help='Directorio donde escribir un PDF por médico')
+        destino.add_argument('--zip', help='Ruta del ZIP con todas las agendas')
+
+    def handle(self, *args, **options):
+        fecha = options['fecha'] or timezone.localdate()
+        inicio = time.monotonic()
+        total = 0
+
+        def agendas():
+            nonlocal total
+            for documento in generar_agendas(fecha):
+                total += 1
+                yield documento
+
+        try:
+            if options['directorio']:
+                destino = Path(options['directorio'])
+                destino.mkdir(parents=True, exist_ok=True)
+                for nombre, contenido in agendas():
+                    (destino / nombre).write_bytes(contenido)
+            else:
+                destino = options['zip']
+                with open(destino, 'wb') as archivo:
+                    archivo.writelines(generar_zip(agendas()))
+        except OSError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} agendas del {fecha.strftime("%d/%m/%Y")} escritas en {destino} ({time.monotonic() - inicio:.1f} s)'
+        ))
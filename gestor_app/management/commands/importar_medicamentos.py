@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from gestor_app.importacion import importar_medicamentos, TAMANO_LOTE
+
+
+class Command(BaseCommand):
+    help = 'Crea o actualiza medicamentos desde un CSV del inventario (nombre, gramos, cantidad, descripcion)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del CSV a importar (UTF-8)')
+        parser.add_argument('--simular', action='store_true', help='Muestra los cambios sin guardarlos')
+        parser.add_argument('--diferencias', help='Ruta donde escribir el detalle de cada fila creada, actualizada o rechazada')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help='Filas por lote')
+
+    def handle(self, *args, **options):
+        # Sin --diferencias, la simulación escribe el detalle en la salida estándar
+        if options['diferencias']:
+            diferencias = open(options['diferencias'], 'w', newline='', encoding='utf-8')
+        elif options['simular']:
+            diferencias = self.stdout
+        else:
+            diferencias = None
+        try:
+            with open(options['archivo'], newline='', encoding='utf-8-sig') as archivo:
+                resultado = importar_medicamentos(
+                    archivo, diferencias=diferencias, simular=options['simular'], tamano_lote=options['lote']
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        finally:
+            if options['diferencias']:
+                diferencias.close()
+
+        self.stdout.write(self.style.SUCCESS(str(resultado)))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from gestor_app.importacion import importar_pacientes, TAMANO_LOTE
+
+
+class Command(BaseCommand):
+    help = 'Importa pacientes (y opcionalmente su historia clínica) desde un archivo CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del CSV a importar (UTF-8)')
+        parser.add_argument('--rechazos', help='Ruta donde escribir las filas rechazadas')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help='Filas por lote')
+
+    def handle(self, *args, **options):
+        rechazos = open(options['rechazos'], 'w', newline='', encoding='utf-8') if options['rechazos'] else None
+        try:
+            with open(options['archivo'], newline='', encoding='utf-8-sig') as archivo:
+                resultado = importar_pacientes(archivo, rechazos=rechazos, tamano_lote=options['lote'])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        finally:
+            if rechazos is not None:
+                rechazos.close()
+
+        self.stdout.write(self.style.SUCCESS(str(resultado)))
+        if resultado.rechazadas and options['rechazos']:
+            self.stdout.write(f"Filas rechazadas escritas en {options['rechazos']}")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from gestor_app.alergias import indexar_historias, TAMANO_LOTE
+
+
+class Command(BaseCommand):
+    help = 'Regenera el índice de alergias de todas las historias clínicas (p. ej. tras cambiar grupos_alergia.csv)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help='Historias por lote')
+
+    def handle(self, *args, **options):
+        total = indexar_historias(tamano_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'{total} historias clínicas indexadas'))
@@ -0,0 +1,87 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.urls import reverse
+
+from gestor_app.models import CustomUser
+
+MODOS = (
+    ('una por petición', 0),
+    ('persistente', None),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide la latencia por petición de login y dashboard abriendo una conexión por petición '
+        'y con conexiones persistentes (CONN_MAX_AGE)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--peticiones', type=int, default=200, help='Peticiones por ruta y modo')
+        parser.add_argument('--rut', help='Usuario con el que se navega (por defecto, el primer administrador activo)')
+
+    def handle(self, *args, **options):
+        usuarios = CustomUser.objects.filter(is_active=True)
+        usuario = usuarios.filter(rut=options['rut']).first() if options['rut'] else usuarios.filter(rol='administrador').first()
+        if usuario is None:
+            raise CommandError('No se encontró el usuario')
+
+        host = next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*'), 'localhost')
+        cliente = Client(HTTP_HOST=host)
+        cliente.force_login(usuario)
+        rutas = {
+            'login (con sesión)': reverse('login'),
+            'dashboard': reverse('dashboard'),
+            f'dashboard_{usuario.rol}': reverse(f'dashboard_{usuario.rol}'),
+        }
+
+        original = connection.settings_dict['CONN_MAX_AGE']
+        conexiones = []
+
+        def contar(sender, **kwargs):
+            conexiones.append(sender)
+
+        connection_created.connect(contar)
+        resultados = {}
+        try:
+            for modo, edad in MODOS:
+                connection.settings_dict['CONN_MAX_AGE'] = edad if edad is not None else (original or 300)
+                connection.close()
+                conexiones.clear()
+                resultados[modo] = {nombre: self._medir(cliente, ruta, options['peticiones']) for nombre, ruta in rutas.items()}
+                resultados[modo]['conexiones'] = len(conexiones)
+        finally:
+            connection_created.disconnect(contar)
+            connection.settings_dict['CONN_MAX_AGE'] = original
+            connection.close()
+
+        nueva, persistente = (resultados[modo] for modo, _ in MODOS)
+        self.stdout.write(f'{connection.vendor}, {options["peticiones"]} peticiones por ruta (mediana)')
+        self.stdout.write(f"{'Ruta':<28} {'una por petición':>17} {'persistente':>12} {'ahorro':>10}")
+        for nombre in rutas:
+            self.stdout.write(
+                f'{nombre:<28} {nueva[nombre]:>14.2f} ms {persistente[nombre]:>9.2f} ms {nueva[nombre] - persistente[nombre]:>7.2f} ms'
+            )
+        self.stdout.write(f"{'Conexiones abiertas':<28} {nueva['conexiones']:>17} {persistente['conexiones']:>12}")
+
+    def _medir(self, cliente, ruta, peticiones):
+        """Mediana en ms de `peticiones` GET a `ruta`, después de una para calentar"""
+        tiempos = []
+        for i in range(peticiones + 1):
+            inicio = time.perf_counter()
+            # El cliente de pruebas no cierra conexiones al terminar la petición; se hace
+            # como el handler WSGI, al empezar y al terminar
+            close_old_connections()
+            respuesta = cliente.get(ruta)
+            close_old_connections()
+            if i:
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            if respuesta.status_code >= 400:
+                raise CommandError(f'{ruta} respondió {respuesta.status_code}')
+        return statistics.median(tiempos)
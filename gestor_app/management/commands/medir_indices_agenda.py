@@ -0,0 +1,183 @@
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from gestor_app.fechas import filtro_dias, rango_dias
+from gestor_app.models import Cita, CustomUser, Medico, Paciente, RecetaMedica
+
+# Índices de las consultas de agenda que se miden (agregados en 0018_indices_agenda)
+INDICES = (
+    (Cita, 'cita_medico_fecha_idx'),
+    (Cita, 'cita_estado_fecha_idx'),
+    (Cita, 'cita_fecha_idx'),
+    (RecetaMedica, 'receta_medico_fecha_idx'),
+)
+PREFIJO_RUT = '9'
+ESTADOS = [estado for estado, _ in Cita.ESTADO_CHOICES]
+LOTE = 10000
+
+
+class Command(BaseCommand):
+    help = (
+        'Siembra citas y recetas de prueba y mide las consultas de agenda con y sin los índices compuestos. '
+        'Borra y vuelve a crear índices: úselo solo en una base de pruebas'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--citas', type=int, default=10_000_000, help='Citas a sembrar')
+        parser.add_argument('--medicos', type=int, default=200, help='Médicos a sembrar')
+        parser.add_argument('--pacientes', type=int, default=100_000, help='Pacientes a sembrar')
+        parser.add_argument('--repeticiones', type=int, default=5, help='Ejecuciones por consulta (se informa la mediana)')
+        parser.add_argument('--sin-sembrar', action='store_true', help='Medir sobre los datos sembrados en una ejecución anterior')
+        parser.add_argument('--confirmar', action='store_true', help='Confirma que la base configurada es de pruebas')
+
+    def handle(self, *args, **options):
+        if not options['confirmar']:
+            raise CommandError(f'Este comando modifica la base {connection.settings_dict["NAME"]}; agregue --confirmar')
+
+        if not options['sin_sembrar']:
+            self._sembrar(options['citas'], options['medicos'], options['pacientes'])
+        medico = Medico.objects.filter(usuario__rut__startswith=PREFIJO_RUT).order_by('id').first()
+        paciente = Paciente.objects.filter(rut__startswith=PREFIJO_RUT).order_by('id').first()
+        if medico is None or paciente is None:
+            raise CommandError('No hay datos sembrados; ejecute sin --sin-sembrar')
+
+        consultas = self._consultas(medico, paciente)
+        self._analizar()
+        con_indices = self._medir(consultas, options['repeticiones'])
+        self._cambiar_indices(agregar=False)
+        try:
+            sin_indices = self._medir(consultas, options['repeticiones'])
+        finally:
+            self._cambiar_indices(agregar=True)
+
+        self.stdout.write(f"{'Consulta':<40} {'sin índices':>12} {'con índices':>12} {'mejora':>8}")
+        for nombre in consultas:
+            antes, despues = sin_indices[nombre], con_indices[nombre]
+            self.stdout.write(f'{nombre:<40} {antes:>9.2f} ms {despues:>9.2f} ms {antes / despues:>7.1f}x')
+
+    def _sembrar(self, total_citas, total_medicos, total_pacientes):
+        """Citas repartidas entre los médicos cada 15 minutos (sin choques de horario) y una receta cada cuatro citas"""
+        azar = random.Random(0)
+        inicio = time.monotonic()
+        clave = make_password(None)
+        with transaction.atomic():
+            CustomUser.objects.bulk_create(
+                CustomUser(rut=f'{PREFIJO_RUT}{i:07d}-M', nombre=f'Médico {i}', rol='medico', password=clave)
+                for i in range(total_medicos)
+            )
+            # bulk_create no devuelve ids en MySQL: se recuperan por RUT
+            usuarios = CustomUser.objects.filter(rut__startswith=PREFIJO_RUT, rol='medico').values_list('id', 'rut')
+            Medico.objects.bulk_create(
+                Medico(usuario_id=usuario_id, especialidad='Medicina General', numero_registro=f'MED-{rut}')
+                for usuario_id, rut in usuarios
+            )
+            Paciente.objects.bulk_create((
+                Paciente(
+                    rut=f'{PREFIJO_RUT}{i:07d}-P', nombre=f'Paciente {i}', fecha_nacimiento=date(1980, 1, 1),
+                    genero='O', direccion='Sin dirección', telefono='+56900000000',
+                    contacto_emergencia='Contacto', telefono_emergencia='+56900000000',
+                )
+                for i in range(total_pacientes)
+            ), batch_size=LOTE)
+        medico_ids = list(Medico.objects.filter(usuario__rut__startswith=PREFIJO_RUT).order_by('id').values_list('id', flat=True))
+        paciente_ids = list(Paciente.objects.filter(rut__startswith=PREFIJO_RUT).values_list('id', flat=True))
+
+        # Las citas terminan hoy: la mitad de la agenda queda en el pasado y la otra mitad en adelante
+        cupos = -(-total_citas // len(medico_ids))
+        desde = timezone.now().replace(second=0, microsecond=0) - timedelta(minutes=15 * cupos // 2)
+        for lote_inicio in range(0, total_citas, LOTE):
+            Cita.objects.bulk_create([
+                Cita(
+                    paciente_id=azar.choice(paciente_ids), medico_id=medico_ids[i % len(medico_ids)],
+                    fecha_hora=desde + timedelta(minutes=15 * (i // len(medico_ids))),
+                    motivo='Control', estado=azar.choice(ESTADOS),
+                )
+                for i in range(lote_inicio, min(lote_inicio + LOTE, total_citas))
+            ])
+            self.stdout.write(f'\r{min(lote_inicio + LOTE, total_citas)} citas', ending='')
+        self.stdout.write('')
+
+        # fecha_emision es auto_now_add: se copia desde la cita después de insertar
+        ultimo_id = 0
+        while True:
+            citas = list(Cita.objects.filter(id__gt=ultimo_id, medico_id__in=medico_ids).order_by('id').values_list('id', 'paciente_id', 'medico_id')[:LOTE * 4])
+            if not citas:
+                break
+            RecetaMedica.objects.bulk_create(
+                RecetaMedica(cita_id=cita_id, paciente_id=paciente_id, medico_id=medico_id, indicaciones='Reposo', vigencia=date.today())
+                for cita_id, paciente_id, medico_id in citas[::4]
+            )
+            ultimo_id = citas[-1][0]
+        RecetaMedica.objects.filter(medico_id__in=medico_ids).update(
+            fecha_emision=Subquery(Cita.objects.filter(id=OuterRef('cita_id')).values('fecha_hora')[:1])
+        )
+        self.stdout.write(self.style.SUCCESS(f'Datos sembrados en {time.monotonic() - inicio:.0f} s'))
+
+    def _consultas(self, medico, paciente):
+        """Las consultas de las vistas, cada una evaluada por completo"""
+        ahora = timezone.now()
+        # Día local, como en las vistas de agenda (filtro_dias)
+        hoy = timezone.localdate(ahora)
+        inicio_dia, fin_dia = rango_dias(hoy)
+        citas_medico = Cita.objects.filter(medico=medico)
+        return {
+            'Agenda del día de un médico': lambda: list(
+                citas_medico.filter(fecha_hora__gte=inicio_dia, fecha_hora__lt=fin_dia).order_by('fecha_hora')
+            ),
+            'Próximas citas de un médico': lambda: list(
+                citas_medico.filter(
+                    **filtro_dias('fecha_hora', hoy + timedelta(days=1), hoy + timedelta(days=5)),
+                    estado__in=['pendiente', 'confirmada'],
+                ).order_by('fecha_hora')
+            ),
+            'Citas de un médico (1ra página)': lambda: list(citas_medico.order_by('-fecha_hora')[:10]),
+            'Citas del día': lambda: list(
+                Cita.objects.filter(fecha_hora__gte=inicio_dia, fecha_hora__lt=fin_dia).order_by('fecha_hora')
+            ),
+            'Citas pendientes futuras (conteo)': lambda: Cita.objects.filter(estado='pendiente', fecha_hora__gte=ahora).count(),
+            # Control: usa cita_paciente_fecha_idx, que no se quita
+            'Historial de un paciente': lambda: list(Cita.objects.filter(paciente=paciente).order_by('-fecha_hora')[:20]),
+            'Recetas de un médico (1ra página)': lambda: list(
+                RecetaMedica.objects.filter(medico=medico).order_by('-fecha_emision')[:10]
+            ),
+            'Recetas de un médico en un mes': lambda: list(
+                RecetaMedica.objects.filter(medico=medico, fecha_emision__gte=ahora - timedelta(days=30), fecha_emision__lt=ahora)
+            ),
+        }
+
+    def _medir(self, consultas, repeticiones):
+        """Mediana en ms de cada consulta, después de una ejecución para calentar la caché"""
+        resultados = {}
+        for nombre, consulta in consultas.items():
+            consulta()
+            tiempos = []
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                consulta()
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            resultados[nombre] = statistics.median(tiempos)
+        return resultados
+
+    def _cambiar_indices(self, agregar):
+        with connection.schema_editor() as editor:
+            for modelo, nombre in INDICES:
+                indice = next(indice for indice in modelo._meta.indexes if indice.name == nombre)
+                if agregar:
+                    editor.add_index(modelo, indice)
+                else:
+                    editor.remove_index(modelo, indice)
+        self._analizar()
+
+    def _analizar(self):
+        """Estadísticas al día para el planificador en las dos mediciones"""
+        if connection.vendor in ('sqlite', 'postgresql'):
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
@@ -0,0 +1,42 @@
+import csv
+
+from django.core.management.base import BaseCommand
+
+from gestor_app.pronostico import calcular_reposicion, DIAS_REPOSICION, DIAS_HISTORIA
+
+COLUMNAS = ['id', 'nombre', 'gramos', 'stock', 'consumo_diario', 'dias_restantes', 'en_riesgo', 'cantidad_sugerida']
+
+
+class Command(BaseCommand):
+    help = 'Calcula el consumo diario de cada medicamento y los que se agotan antes del plazo de reposición'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias-reposicion', type=int, default=DIAS_REPOSICION, help='Plazo de reposición en días')
+        parser.add_argument('--dias-historia', type=int, default=DIAS_HISTORIA, help='Días de consumo a considerar')
+        parser.add_argument('--todos', action='store_true', help='Incluir también los medicamentos sin riesgo')
+        parser.add_argument('--csv', help='Escribir el reporte en este archivo CSV')
+
+    def handle(self, *args, **options):
+        reporte = calcular_reposicion(
+            dias_reposicion=options['dias_reposicion'], dias_historia=options['dias_historia']
+        )
+        if not options['todos']:
+            reporte = [m for m in reporte if m['en_riesgo']]
+
+        if options['csv']:
+            with open(options['csv'], 'w', newline='', encoding='utf-8') as archivo:
+                escritor = csv.DictWriter(archivo, fieldnames=COLUMNAS)
+                escritor.writeheader()
+                escritor.writerows(reporte)
+            self.stdout.write(self.style.SUCCESS(f"{len(reporte)} medicamentos escritos en {options['csv']}"))
+            return
+
+        for med in reporte:
+            dias = med['dias_restantes'] if med['dias_restantes'] is not None else '-'
+            linea = (
+                f"{med['nombre']} {med['gramos']}g: stock {med['stock']}, consumo diario {med['consumo_diario']}, "
+                f"días restantes {dias}, reponer {med['cantidad_sugerida']}"
+            )
+            self.stdout.write(self.style.WARNING(linea) if med['en_riesgo'] else linea)
+        if not reporte:
+            self.stdout.write('No hay medicamentos en riesgo de agotarse')
@@ -0,0 +1,58 @@
+import json
+import time
+import urllib.error
+import urllib.request
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gestor_app.ingesta import MAX_LECTURAS, a_json_lines, generar_lecturas, ingerir_lecturas
+from gestor_app.models import Paciente
+
+
+class Command(BaseCommand):
+    help = 'Simula monitores de cabecera que envían lecturas de signos vitales por lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lecturas', type=int, default=10000, help='Total de lecturas a enviar')
+        parser.add_argument('--lote', type=int, default=1000, help=f'Lecturas por petición (máximo {MAX_LECTURAS})')
+        parser.add_argument('--pacientes', type=int, default=50, help='Cantidad de pacientes existentes a usar')
+        parser.add_argument('--url', help='URL de la API de ingesta; sin ella se ingiere en el mismo proceso')
+        parser.add_argument('--token', help='Token del dispositivo (requerido con --url)')
+
+    def handle(self, *args, **options):
+        if options['url'] and not options['token']:
+            raise CommandError('--token es requerido junto con --url')
+        if not 0 < options['lote'] <= MAX_LECTURAS:
+            raise CommandError(f'--lote debe estar entre 1 y {MAX_LECTURAS}')
+        ruts = list(Paciente.objects.order_by('id').values_list('rut', flat=True)[:options['pacientes']])
+        if not ruts:
+            raise CommandError('No hay pacientes registrados')
+
+        lecturas = generar_lecturas(ruts, options['lecturas'])
+        insertadas = rechazadas = 0
+        inicio = time.monotonic()
+        while True:
+            lote = [lectura for _, lectura in zip(range(options['lote']), lecturas)]
+            if not lote:
+                break
+            cuerpo = a_json_lines(lote)
+            resultado = self._enviar(cuerpo, options) if options['url'] else ingerir_lecturas(cuerpo.splitlines()).como_dict()
+            insertadas += resultado['insertadas']
+            rechazadas += len(resultado['rechazadas'])
+        duracion = time.monotonic() - inicio
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{insertadas} lecturas insertadas, {rechazadas} rechazadas en {duracion:.1f} s '
+            f'({insertadas / duracion if duracion else 0:.0f} lecturas/s)'
+        ))
+
+    def _enviar(self, cuerpo, options):
+        peticion = urllib.request.Request(
+            options['url'], data=cuerpo.encode(), method='POST',
+            headers={'Content-Type': 'application/x-ndjson', 'Authorization': f"Token {options['token']}"},
+        )
+        try:
+            with urllib.request.urlopen(peticion) as respuesta:
+                return json.load(respuesta)
+        except urllib.error.URLError as e:
+            raise CommandError(f'No se pudo enviar el lote: {e}')
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from gestor_app.inventario import vencer_lotes
+
+
+class Command(BaseCommand):
+    help = 'Marca los lotes vencidos y da de baja su stock (ejecutar cada noche)'
+
+    def handle(self, *args, **options):
+        vencidos, unidades = vencer_lotes()
+        self.stdout.write(self.style.SUCCESS(
+            f'{vencidos} lotes vencidos, {unidades} unidades dadas de baja'
+        ))
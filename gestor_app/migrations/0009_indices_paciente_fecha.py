@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestor_app', '0008_remove_recetamedica_medicamentos'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['paciente', 'fecha_hora'], name='cita_paciente_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recetamedica',
+            index=models.Index(fields=['paciente', 'fecha_emision'], name='receta_paciente_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='signosvitales',
+            index=models.Index(fields=['paciente', 'fecha_hora'], name='signos_paciente_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:44
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def registrar_saldo_inicial(apps, schema_editor):
+    """El stock existente entra al registro como un ajuste de saldo inicial"""
+    Medicamento = apps.get_model('gestor_app', 'Medicamento')
+    MovimientoStock = apps.get_model('gestor_app', 'MovimientoStock')
+    ahora = django.utils.timezone.now()
+    movimientos = [
+        MovimientoStock(medicamento_id=med_id, tipo='ajuste', cantidad=cantidad, fecha=ahora, motivo='Saldo inicial')
+        for med_id, cantidad in Medicamento.objects.exclude(cantidad=0).values_list('id', 'cantidad').iterator()
+    ]
+    MovimientoStock.objects.bulk_create(movimientos, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestor_app', '0009_indices_paciente_fecha'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CierreStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(verbose_name='Fecha de Cierre')),
+                ('saldo', models.IntegerField(verbose_name='Saldo')),
+                ('ultimo_movimiento_id', models.BigIntegerField(default=0)),
+                ('medicamento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cierres_stock', to='gestor_app.medicamento')),
+            ],
+            options={
+                'verbose_name': 'Cierre de Stock',
+                'verbose_name_plural': 'Cierres de Stock',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['medicamento', 'fecha'], name='cierre_med_fecha_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MovimientoStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('dispensacion', 'Dispensación'), ('ajuste', 'Ajuste Manual'), ('ingreso', 'Ingreso'), ('devolucion', 'Devolución')], max_length=20)),
+                ('cantidad', models.IntegerField(help_text='Positiva si entra stock, negativa si sale', verbose_name='Cantidad')),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Fecha')),
+                ('motivo', models.CharField(blank=True, default='', max_length=200)),
+                ('medicamento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos', to='gestor_app.medicamento')),
+                ('receta_medicamento', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos', to='gestor_app.recetamedicamento')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos_stock', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Movimiento de Stock',
+                'verbose_name_plural': 'Movimientos de Stock',
+                'ordering': ['-fecha', '-id'],
+                'indexes': [models.Index(fields=['medicamento', 'fecha'], name='movimiento_med_fecha_idx')],
+            },
+        ),
+        migrations.RunPython(registrar_saldo_inicial, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestor_app', '0010_registro_movimientos_stock'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recetamedicamento',
+            index=models.Index(fields=['fecha_agregado', 'medicamento', 'cantidad_recetada'], name='recetamed_consumo_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestor_app', '0011_indice_consumo_medicamentos'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='movimientostock',
+            name='tipo',
+            field=models.CharField(choices=[('dispensacion', 'Dispensación'), ('ajuste', 'Ajuste Manual'), ('ingreso', 'Ingreso'), ('devolucion', 'Devolución'), ('vencimiento', 'Baja por Vencimiento')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='LoteMedicamento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.CharField(max_length=50, verbose_name='Código de Lote')),
+                ('fecha_vencimiento', models.DateField(verbose_name='Fecha de Vencimiento')),
+                ('cantidad_inicial', models.PositiveIntegerField(verbose_name='Cantidad Inicial')),
+                ('cantidad_disponible', models.PositiveIntegerField(verbose_name='Cantidad Disponible')),
+                ('vencido', models.BooleanField(default=False, verbose_name='Vencido')),
+                ('fecha_ingreso', models.DateTimeField(auto_now_add=True)),
+                ('medicamento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lotes', to='gestor_app.medicamento')),
+            ],
+            options={
+                'verbose_name': 'Lote de Medicamento',
+                'verbose_name_plural': 'Lotes de Medicamentos',
+                'ordering': ['fecha_vencimiento'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AsignacionLote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.PositiveIntegerField(verbose_name='Cantidad')),
+                ('receta_medicamento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='asignaciones_lote', to='gestor_app.recetamedicamento')),
+                ('lote', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='asignaciones', to='gestor_app.lotemedicamento')),
+            ],
+            options={
+                'verbose_name': 'Asignación de Lote',
+                'verbose_name_plural': 'Asignaciones de Lotes',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='lotemedicamento',
+            index=models.Index(fields=['medicamento', 'vencido', 'fecha_vencimiento'], name='lote_fefo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lotemedicamento',
+            index=models.Index(fields=['vencido', 'fecha_vencimiento'], name='lote_vencimiento_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='lotemedicamento',
+            constraint=models.UniqueConstraint(fields=('medicamento', 'codigo'), name='unique_lote_medicamento'),
+        ),
+    ]
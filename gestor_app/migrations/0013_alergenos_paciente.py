@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestor_app', '0012_lotes_medicamento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlergenoPaciente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=100, verbose_name='Alérgeno')),
+                ('paciente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alergenos', to='gestor_app.paciente')),
+            ],
+            options={
+                'verbose_name': 'Alérgeno del Paciente',
+                'verbose_name_plural': 'Alérgenos de Pacientes',
+                'constraints': [models.UniqueConstraint(fields=('paciente', 'token'), name='unique_alergeno_paciente')],
+            },
+        ),
+    ]
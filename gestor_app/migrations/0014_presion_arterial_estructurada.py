@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:05
+
+import re
+
+from django.db import migrations, models
+
+TAMANO_LOTE = 2000
+# Copia de gestor_app.models.parsear_presion: la migración no debe cambiar si cambia el modelo
+PATRON_PRESION = re.compile(r'^\s*(\d{2,3})\s*/\s*(\d{2,3})\s*$')
+
+
+def parsear_presion(texto):
+    coincidencia = PATRON_PRESION.match(texto or '')
+    if not coincidencia:
+        return None
+    sistolica, diastolica = (int(valor) for valor in coincidencia.groups())
+    if not (50 <= sistolica <= 300 and 20 <= diastolica <= 200 and sistolica > diastolica):
+        return None
+    return sistolica, diastolica
+
+
+def separar_presion(apps, schema_editor):
+    """Llena las columnas desde el texto por lotes de ids e informa los textos no reconocidos"""
+    SignosVitales = apps.get_model('gestor_app', 'SignosVitales')
+    no_reconocidos = []
+    ultimo_id = 0
+    while True:
+        lote = list(
+            SignosVitales.objects.filter(id__gt=ultimo_id).order_by('id')
+            .values_list('id', 'presion_arterial')[:TAMANO_LOTE]
+        )
+        if not lote:
+            break
+        cambios = []
+        for registro_id, texto in lote:
+            presion = parsear_presion(texto)
+            if presion is None:
+                no_reconocidos.append((registro_id, texto))
+            else:
+                cambios.append(SignosVitales(id=registro_id, presion_sistolica=presion[0], presion_diastolica=presion[1]))
+        SignosVitales.objects.bulk_update(cambios, ['presion_sistolica', 'presion_diastolica'])
+        ultimo_id = lote[-1][0]
+
+    if no_reconocidos:
+        print(f'\n  {len(no_reconocidos)} registros de signos vitales con presión arterial no reconocida (quedan sin columnas):')
+        for registro_id, texto in no_reconocidos[:50]:
+            print(f'    id={registro_id}: {texto!r}')
+        if len(no_reconocidos) > 50:
+            print(f'    ... y {len(no_reconocidos) - 50} más (presion_sistolica IS NULL)')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestor_app', '0013_alergenos_paciente'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='signosvitales',
+            name='presion_diastolica',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True, verbose_name='Presión Diastólica (mmHg)'),
+        ),
+        migrations.AddField(
+            model_name='signosvitales',
+            name='presion_sistolica',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True, verbose_name='Presión Sistólica (mmHg)'),
+        ),
+        migrations.RunPython(separar_presion, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='signosvitales',
+            index=models.Index(fields=['fecha_hora', 'presion_sistolica', 'presion_diastolica'], name='signos_fecha_presion_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestor_app', '0014_presion_arterial_estructurada'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='signosvitales',
+            name='puntaje_news',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True, verbose_name='Puntaje NEWS2'),
+        ),
+        migrations.AddIndex(
+            model_name='signosvitales',
+            index=models.Index(fields=['puntaje_news', 'fecha_hora'], name='signos_news_fecha_idx'),
+        ),
+    ]
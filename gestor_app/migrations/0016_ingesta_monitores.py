@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:11
+
+import django.core.validators
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestor_app', '0015_puntaje_news'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DispositivoMonitor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, unique=True, verbose_name='Nombre')),
+                ('token_hash', models.CharField(editable=False, max_length=64, unique=True)),
+                ('activo', models.BooleanField(default=True, verbose_name='Activo')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('ultimo_envio', models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Último Envío')),
+            ],
+            options={
+                'verbose_name': 'Dispositivo Monitor',
+                'verbose_name_plural': 'Dispositivos Monitores',
+                'ordering': ['nombre'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='signosvitales',
+            name='altura',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True, validators=[django.core.validators.MinValueValidator(20), django.core.validators.MaxValueValidator(260)], verbose_name='Altura (cm)'),
+        ),
+        migrations.AlterField(
+            model_name='signosvitales',
+            name='fecha_hora',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Fecha y Hora'),
+        ),
+        migrations.AlterField(
+            model_name='signosvitales',
+            name='frecuencia_cardiaca',
+            field=models.IntegerField(validators=[django.core.validators.MinValueValidator(20), django.core.validators.MaxValueValidator(300)], verbose_name='Frecuencia Cardíaca (lpm)'),
+        ),
+        migrations.AlterField(
+            model_name='signosvitales',
+            name='frecuencia_respiratoria',
+            field=models.IntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(80)], verbose_name='Frecuencia Respiratoria (rpm)'),
+        ),
+        migrations.AlterField(
+            model_name='signosvitales',
+            name='peso',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True, validators=[django.core.validators.MinValueValidator(0.3), django.core.validators.MaxValueValidator(500)], verbose_name='Peso (kg)'),
+        ),
+        migrations.AlterField(
+            model_name='signosvitales',
+            name='saturacion_oxigeno',
+            field=models.IntegerField(validators=[django.core.validators.MinValueValidator(40), django.core.validators.MaxValueValidator(100)], verbose_name='Saturación de Oxígeno (%)'),
+        ),
+        migrations.AlterField(
+            model_name='signosvitales',
+            name='temperatura',
+            field=models.DecimalField(decimal_places=1, max_digits=4, validators=[django.core.validators.MinValueValidator(25), django.core.validators.MaxValueValidator(45)], verbose_name='Temperatura (°C)'),
+        ),
+        migrations.AddField(
+            model_name='signosvitales',
+            name='dispositivo',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lecturas', to='gestor_app.dispositivomonitor'),
+        ),
+    ]
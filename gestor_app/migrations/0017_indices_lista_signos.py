@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestor_app', '0016_ingesta_monitores'),
+    ]
+
+    # El índice nuevo se crea antes de quitar el anterior: las consultas por fecha
+    # siempre tienen uno disponible
+    operations = [
+        migrations.AddIndex(
+            model_name='signosvitales',
+            index=models.Index(fields=['fecha_hora', 'presion_sistolica', 'presion_diastolica', 'puntaje_news'], name='signos_fecha_alertas_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='signosvitales',
+            index=models.Index(fields=['enfermera', 'fecha_hora'], name='signos_enfermera_fecha_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='signosvitales',
+            name='signos_fecha_presion_idx',
+        ),
+    ]
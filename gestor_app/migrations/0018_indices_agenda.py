@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestor_app', '0017_indices_lista_signos'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['medico', 'fecha_hora'], name='cita_medico_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['estado', 'fecha_hora'], name='cita_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['fecha_hora'], name='cita_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recetamedica',
+            index=models.Index(fields=['medico', 'fecha_emision'], name='receta_medico_fecha_idx'),
+        ),
+    ]
@@ -1,6 +1,14 @@
-from django.db import models
+import hashlib
+import re
+import secrets
+
+from django.db import models, transaction
+from django.db.models import F, Q
+from django.utils import timezone
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
-from django.core.validators import RegexValidator
+from django.core.validators import MaxValueValidator, MinValueValidator, RegexValidator
+
+from .news import CAMPOS as CAMPOS_NEWS, nivel_riesgo, puntaje_news
 
 # Manager personalizado para el usuario
 class CustomUserManager(BaseUserManager):
@@ -133,22 +141,19 @@ class Medico(models.Model):
     
     def obtener_horarios_disponibles(self, fecha):
         """Obtiene horarios disponibles (no ocupados) para una fecha"""
-        from datetime import datetime, time
+        from .fechas import filtro_dias
         
         bloques = self.genera_bloques_horarios(fecha)
         
-        # Obtener citas ya agendadas para ese día
-        inicio_dia = datetime.combine(fecha, time.min)
-        fin_dia = datetime.combine(fecha, time.max)
-        
+        # Obtener citas ya agendadas para ese día (día local)
         citas_ocupadas = Cita.objects.filter(
             medico=self,
-            fecha_hora__range=(inicio_dia, fin_dia),
-            estado__in=['pendiente', 'confirmada', 'en_curso']
+            estado__in=['pendiente', 'confirmada', 'en_curso'],
+            **filtro_dias('fecha_hora', fecha, fecha)
         ).values_list('fecha_hora', flat=True)
         
-        # Convertir a time para comparar
-        horas_ocupadas = [c.time() for c in citas_ocupadas]
+        # Convertir a hora local para comparar con los bloques
+        horas_ocupadas = [timezone.localtime(c).time() for c in citas_ocupadas]
         
         # Filtrar bloques ocupados
         horarios_disponibles = [b for b in bloques if b not in horas_ocupadas]
@@ -243,6 +248,23 @@ class HistoriaClinica(models.Model):
     def __str__(self):
         return f"Historia Clínica de {self.paciente.nombre}"
 
+# Alérgenos normalizados de HistoriaClinica.alergias (ver alergias.py), para revisarlos al recetar
+class AlergenoPaciente(models.Model):
+    paciente = models.ForeignKey(Paciente, on_delete=models.CASCADE, related_name='alergenos')
+    token = models.CharField(max_length=100, verbose_name='Alérgeno')
+    
+    class Meta:
+        verbose_name = 'Alérgeno del Paciente'
+        verbose_name_plural = 'Alérgenos de Pacientes'
+        constraints = [
+            # También es el índice de la consulta por (paciente, token) al recetar
+            models.UniqueConstraint(fields=['paciente', 'token'], name='unique_alergeno_paciente'),
+        ]
+    
+    def __str__(self):
+        return f"{self.paciente.nombre}: {self.token}"
+
+
 # Modelo de Cita Médica
 class Cita(models.Model):
     ESTADO_CHOICES = (
@@ -269,6 +291,17 @@ class Cita(models.Model):
         verbose_name = 'Cita Médica'
         verbose_name_plural = 'Citas Médicas'
         ordering = ['-fecha_hora']
+        indexes = [
+            # Historial del paciente y línea de tiempo (más recientes primero)
+            models.Index(fields=['paciente', 'fecha_hora'], name='cita_paciente_fecha_idx'),
+            # Agenda y listado de citas de un médico (la restricción única de abajo solo
+            # cubre las citas activas, así que no sirve para estas consultas)
+            models.Index(fields=['medico', 'fecha_hora'], name='cita_medico_fecha_idx'),
+            # Citas por estado en un período (pendientes, confirmadas del día)
+            models.Index(fields=['estado', 'fecha_hora'], name='cita_estado_fecha_idx'),
+            # Citas del día de todos los médicos (dashboards)
+            models.Index(fields=['fecha_hora'], name='cita_fecha_idx'),
+        ]
         # Restricción: un médico no puede tener dos citas al mismo tiempo
         constraints = [
             models.UniqueConstraint(
@@ -295,33 +328,158 @@ class RecetaMedica(models.Model):
         verbose_name = 'Receta Médica'
         verbose_name_plural = 'Recetas Médicas'
         ordering = ['-fecha_emision']
+        indexes = [
+            models.Index(fields=['paciente', 'fecha_emision'], name='receta_paciente_fecha_idx'),
+            # Recetas emitidas por un médico (listado y exportación por período)
+            models.Index(fields=['medico', 'fecha_emision'], name='receta_medico_fecha_idx'),
+        ]
     
     def __str__(self):
         return f"Receta para {self.paciente.nombre} - {self.medico} ({self.fecha_emision.strftime('%d/%m/%Y')})"
 
 
 # Modelo de Registro de Signos Vitales (para enfermeras)
+# Presión arterial: "120/80" (se aceptan espacios alrededor de la barra)
+PATRON_PRESION = re.compile(r'^\s*(\d{2,3})\s*/\s*(\d{2,3})\s*$')
+# Umbrales de presión alta (mmHg)
+SISTOLICA_ALTA = 140
+DIASTOLICA_ALTA = 90
+
+
+def parsear_presion(texto):
+    """(sistólica, diastólica) de un texto como "120/80", o None si no es una lectura válida"""
+    coincidencia = PATRON_PRESION.match(texto or '')
+    if not coincidencia:
+        return None
+    sistolica, diastolica = (int(valor) for valor in coincidencia.groups())
+    if not (50 <= sistolica <= 300 and 20 <= diastolica <= 200 and sistolica > diastolica):
+        return None
+    return sistolica, diastolica
+
+
+class SignosVitalesQuerySet(models.QuerySet):
+    def con_presion_alta(self, desde=None):
+        """Lecturas con sistólica o diastólica sobre el umbral (desde una fecha, si se indica)"""
+        lecturas = self.filter(Q(presion_sistolica__gte=SISTOLICA_ALTA) | Q(presion_diastolica__gte=DIASTOLICA_ALTA))
+        if desde is not None:
+            lecturas = lecturas.filter(fecha_hora__gte=desde)
+        return lecturas
+    
+    def anormales(self):
+        """Lecturas con algún parámetro fuera de rango: NEWS2 sobre 0 o presión alta"""
+        return self.filter(
+            Q(puntaje_news__gt=0) | Q(presion_sistolica__gte=SISTOLICA_ALTA) | Q(presion_diastolica__gte=DIASTOLICA_ALTA)
+        )
+
+
+class DispositivoMonitor(models.Model):
+    """Monitor de cabecera que envía lecturas a la API de ingesta (ver ingesta.py)"""
+    nombre = models.CharField(max_length=100, unique=True, verbose_name='Nombre')
+    # Solo se guarda el hash: el token se muestra una vez al generarlo
+    token_hash = models.CharField(max_length=64, unique=True, editable=False)
+    activo = models.BooleanField(default=True, verbose_name='Activo')
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    ultimo_envio = models.DateTimeField(null=True, blank=True, editable=False, verbose_name='Último Envío')
+    
+    class Meta:
+        verbose_name = 'Dispositivo Monitor'
+        verbose_name_plural = 'Dispositivos Monitores'
+        ordering = ['nombre']
+    
+    def __str__(self):
+        return self.nombre
+    
+    @staticmethod
+    def hash_token(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+    
+    def generar_token(self):
+        """Asigna un token nuevo (sin guardar) y lo retorna"""
+        token = secrets.token_urlsafe(32)
+        self.token_hash = self.hash_token(token)
+        return token
+    
+    @classmethod
+    def autenticar(cls, token):
+        """Dispositivo activo con ese token, o None"""
+        return cls.objects.filter(token_hash=cls.hash_token(token), activo=True).first()
+
+
 class SignosVitales(models.Model):
     paciente = models.ForeignKey(Paciente, on_delete=models.CASCADE, related_name='signos_vitales')
     cita = models.ForeignKey(Cita, on_delete=models.CASCADE, related_name='signos_vitales', null=True, blank=True)
     enfermera = models.ForeignKey(Enfermera, on_delete=models.SET_NULL, null=True, related_name='signos_registrados')
-    fecha_hora = models.DateTimeField(auto_now_add=True)
+    dispositivo = models.ForeignKey(DispositivoMonitor, on_delete=models.SET_NULL, null=True, blank=True, related_name='lecturas')
+    # Las lecturas de monitores traen la hora en que se midieron
+    fecha_hora = models.DateTimeField(default=timezone.now, verbose_name='Fecha y Hora')
     presion_arterial = models.CharField(max_length=10, verbose_name='Presión Arterial (ej: 120/80)')
-    frecuencia_cardiaca = models.IntegerField(verbose_name='Frecuencia Cardíaca (lpm)')
-    temperatura = models.DecimalField(max_digits=4, decimal_places=1, verbose_name='Temperatura (°C)')
-    frecuencia_respiratoria = models.IntegerField(verbose_name='Frecuencia Respiratoria (rpm)')
-    saturacion_oxigeno = models.IntegerField(verbose_name='Saturación de Oxígeno (%)')
-    peso = models.DecimalField(max_digits=5, decimal_places=2, verbose_name='Peso (kg)', blank=True, null=True)
-    altura = models.DecimalField(max_digits=5, decimal_places=2, verbose_name='Altura (cm)', blank=True, null=True)
+    # Se calculan desde presion_arterial al guardar; nulas si el texto no se reconoce
+    presion_sistolica = models.PositiveSmallIntegerField(null=True, blank=True, editable=False, verbose_name='Presión Sistólica (mmHg)')
+    presion_diastolica = models.PositiveSmallIntegerField(null=True, blank=True, editable=False, verbose_name='Presión Diastólica (mmHg)')
+    # Puntaje NEWS2 (ver news.py), calculado al guardar
+    puntaje_news = models.PositiveSmallIntegerField(null=True, blank=True, editable=False, verbose_name='Puntaje NEWS2')
+    # Rangos fisiológicamente posibles: los aplican el formulario y la API de ingesta
+    frecuencia_cardiaca = models.IntegerField(
+        verbose_name='Frecuencia Cardíaca (lpm)', validators=[MinValueValidator(20), MaxValueValidator(300)]
+    )
+    temperatura = models.DecimalField(
+        max_digits=4, decimal_places=1, verbose_name='Temperatura (°C)',
+        validators=[MinValueValidator(25), MaxValueValidator(45)]
+    )
+    frecuencia_respiratoria = models.IntegerField(
+        verbose_name='Frecuencia Respiratoria (rpm)', validators=[MinValueValidator(1), MaxValueValidator(80)]
+    )
+    saturacion_oxigeno = models.IntegerField(
+        verbose_name='Saturación de Oxígeno (%)', validators=[MinValueValidator(40), MaxValueValidator(100)]
+    )
+    peso = models.DecimalField(
+        max_digits=5, decimal_places=2, verbose_name='Peso (kg)', blank=True, null=True,
+        validators=[MinValueValidator(0.3), MaxValueValidator(500)]
+    )
+    altura = models.DecimalField(
+        max_digits=5, decimal_places=2, verbose_name='Altura (cm)', blank=True, null=True,
+        validators=[MinValueValidator(20), MaxValueValidator(260)]
+    )
     observaciones = models.TextField(blank=True, null=True)
     
+    objects = SignosVitalesQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Registro de Signos Vitales'
         verbose_name_plural = 'Registros de Signos Vitales'
         ordering = ['-fecha_hora']
+        indexes = [
+            models.Index(fields=['paciente', 'fecha_hora'], name='signos_paciente_fecha_idx'),
+            # Listados por fecha (rango y orden) y lecturas anormales o con presión alta
+            # en un período: las condiciones se evalúan en el índice, sin leer las filas
+            models.Index(
+                fields=['fecha_hora', 'presion_sistolica', 'presion_diastolica', 'puntaje_news'],
+                name='signos_fecha_alertas_idx'
+            ),
+            # Lecturas registradas por una enfermera, más recientes primero
+            models.Index(fields=['enfermera', 'fecha_hora'], name='signos_enfermera_fecha_idx'),
+            # Lecturas de riesgo recientes (pocas filas por sobre el umbral)
+            models.Index(fields=['puntaje_news', 'fecha_hora'], name='signos_news_fecha_idx'),
+        ]
     
     def __str__(self):
         return f"Signos Vitales - {self.paciente.nombre} ({self.fecha_hora.strftime('%d/%m/%Y %H:%M')})"
+    
+    def calcular_derivados(self):
+        """Presión separada y puntaje NEWS2 (también para las lecturas que entran con bulk_create)"""
+        self.presion_sistolica, self.presion_diastolica = parsear_presion(self.presion_arterial) or (None, None)
+        self.puntaje_news = puntaje_news(self)
+    
+    def save(self, *args, **kwargs):
+        self.calcular_derivados()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'presion_arterial', *CAMPOS_NEWS} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'presion_sistolica', 'presion_diastolica', 'puntaje_news'}
+        super().save(*args, **kwargs)
+    
+    @property
+    def riesgo_news(self):
+        return nivel_riesgo(self.puntaje_news)
 
 
 # Modelo de Medicamento para Inventario
@@ -346,12 +504,133 @@ class Medicamento(models.Model):
         return self.cantidad > 0
     
     def descontar_stock(self, cantidad):
-        """Descuenta cantidad del stock"""
-        if self.cantidad >= cantidad:
+        """Descuenta cantidad del stock con un UPDATE condicional (seguro ante recetas concurrentes)"""
+        actualizados = Medicamento.objects.filter(pk=self.pk, cantidad__gte=cantidad).update(
+            cantidad=F('cantidad') - cantidad,
+            fecha_actualizacion=timezone.now()
+        )
+        if actualizados:
+            from .busqueda import marcar_cambio
+            
             self.cantidad -= cantidad
-            self.save()
+            # El UPDATE no emite señales: se avisa al índice de búsqueda al confirmar
+            transaction.on_commit(marcar_cambio)
             return True
         return False
+    
+    def ajustar_stock(self, cantidad, tipo, usuario=None, motivo=''):
+        """
+        Suma `cantidad` (negativa para restar) al stock y deja el movimiento en el registro.
+        Retorna False si el stock quedaría negativo.
+        """
+        from .busqueda import marcar_cambio
+        
+        with transaction.atomic():
+            filtro = Medicamento.objects.filter(pk=self.pk)
+            if cantidad < 0:
+                filtro = filtro.filter(cantidad__gte=-cantidad)
+            if not filtro.update(cantidad=F('cantidad') + cantidad, fecha_actualizacion=timezone.now()):
+                return False
+            MovimientoStock.objects.create(
+                medicamento=self, tipo=tipo, cantidad=cantidad, usuario=usuario, motivo=motivo
+            )
+            if cantidad < 0:
+                self.conciliar_lotes()
+        self.cantidad += cantidad
+        transaction.on_commit(marcar_cambio)
+        return True
+    
+    def stock_en_fecha(self, fecha):
+        """Stock a una fecha: último cierre anterior más los movimientos posteriores a él"""
+        cierre = self.cierres_stock.filter(fecha__lte=fecha).order_by('-fecha', '-id').first()
+        saldo = cierre.saldo if cierre else 0
+        desde_id = cierre.ultimo_movimiento_id if cierre else 0
+        
+        movimientos = self.movimientos.filter(id__gt=desde_id, fecha__lte=fecha)
+        return saldo + (movimientos.aggregate(total=models.Sum('cantidad'))['total'] or 0)
+    
+    def ingresar_lote(self, codigo, fecha_vencimiento, cantidad, usuario=None):
+        """Registra un lote recibido y suma su cantidad al stock"""
+        with transaction.atomic():
+            lote = LoteMedicamento.objects.create(
+                medicamento=self, codigo=codigo, fecha_vencimiento=fecha_vencimiento,
+                cantidad_inicial=cantidad, cantidad_disponible=cantidad,
+            )
+            self.ajustar_stock(cantidad, 'ingreso', usuario=usuario, motivo=f'Lote {codigo}')
+        return lote
+    
+    def _lotes_vigentes(self):
+        """Lotes no vencidos con unidades, bloqueados y en orden FEFO"""
+        # Bloquea los lotes del medicamento: dos recetas no pueden tomar la misma unidad
+        return list(
+            LoteMedicamento.objects.select_for_update()
+            .filter(medicamento=self, vencido=False, cantidad_disponible__gt=0)
+            .order_by('fecha_vencimiento', 'id')
+        )
+    
+    def _stock_actual(self):
+        return Medicamento.objects.filter(pk=self.pk).values_list('cantidad', flat=True).get()
+    
+    @staticmethod
+    def _descontar_lote(lote, cantidad):
+        LoteMedicamento.objects.filter(pk=lote.pk).update(cantidad_disponible=F('cantidad_disponible') - cantidad)
+        lote.cantidad_disponible -= cantidad
+    
+    def conciliar_lotes(self):
+        """
+        Después de bajar el stock sin receta (ajuste manual, importación), descuenta de los
+        lotes lo que suman por sobre el stock, primero los que vencen antes. Lo que baja
+        el stock sin lote no toca los lotes. Debe llamarse dentro de la transacción del ajuste.
+        """
+        lotes = self._lotes_vigentes()
+        exceso = sum(lote.cantidad_disponible for lote in lotes) - self._stock_actual()
+        for lote in lotes:
+            if exceso <= 0:
+                break
+            tomado = min(exceso, lote.cantidad_disponible)
+            self._descontar_lote(lote, tomado)
+            exceso -= tomado
+    
+    def asignar_lotes(self, cantidad):
+        """
+        Reparte `cantidad` entre los lotes vigentes, primero los que vencen antes (FEFO),
+        y descuenta cada lote. Debe llamarse dentro de la transacción, después de descontar_stock.
+        Retorna una lista de (lote, cantidad). Lo que no cubren los lotes sale del stock
+        sin lote (el cargado antes del control por lotes); si tampoco alcanza, el resto
+        está en lotes vencidos y se lanza StockInsuficiente.
+        """
+        hoy = timezone.localdate()
+        lotes = self._lotes_vigentes()
+        if not lotes:
+            return []
+        
+        # Stock antes de descontar esta receta (la fila sigue bloqueada por el UPDATE). Si
+        # algún cambio de stock no pasó por conciliar_lotes, los lotes pueden sumar más
+        sin_lote = max(0, self._stock_actual() + cantidad - sum(lote.cantidad_disponible for lote in lotes))
+        asignaciones = []
+        pendiente = cantidad
+        for lote in lotes:
+            if pendiente == 0:
+                break
+            if lote.fecha_vencimiento <= hoy:
+                # Vencido pero aún no marcado por el barrido nocturno
+                continue
+            tomado = min(pendiente, lote.cantidad_disponible)
+            self._descontar_lote(lote, tomado)
+            asignaciones.append((lote, tomado))
+            pendiente -= tomado
+        
+        if pendiente > sin_lote:
+            raise StockInsuficiente(self, cantidad)
+        return asignaciones
+
+
+class StockInsuficiente(Exception):
+    """No hay stock suficiente de un medicamento para la cantidad recetada"""
+    def __init__(self, medicamento, cantidad):
+        self.medicamento = medicamento
+        self.cantidad = cantidad
+        super().__init__(f'Stock insuficiente para {medicamento.nombre}')
 
 
 # Modelo de Relación entre Receta y Medicamentos
@@ -365,12 +644,129 @@ class RecetaMedicamento(models.Model):
     class Meta:
         verbose_name = 'Medicamento en Receta'
         verbose_name_plural = 'Medicamentos en Recetas'
+        indexes = [
+            # Índice cubriente para agregar el consumo diario (pronostico.py) sin leer la tabla
+            models.Index(fields=['fecha_agregado', 'medicamento', 'cantidad_recetada'], name='recetamed_consumo_idx'),
+        ]
     
     def __str__(self):
         return f"{self.medicamento.nombre} - Cantidad: {self.cantidad_recetada}"
     
     def save(self, *args, **kwargs):
-        """Al guardar, descuenta el stock automáticamente"""
-        if not self.pk:  # Solo si es nuevo
-            self.medicamento.descontar_stock(self.cantidad_recetada)
-        super().save(*args, **kwargs)
\ No newline at end of file
+        """Al guardar, descuenta el stock automáticamente (lanza StockInsuficiente si no alcanza)"""
+        if self.pk:
+            return super().save(*args, **kwargs)
+        
+        with transaction.atomic():
+            if not self.medicamento.descontar_stock(self.cantidad_recetada):
+                raise StockInsuficiente(self.medicamento, self.cantidad_recetada)
+            # El UPDATE condicional mantiene bloqueada la fila del medicamento hasta el commit
+            asignaciones = self.medicamento.asignar_lotes(self.cantidad_recetada)
+            super().save(*args, **kwargs)
+            if asignaciones:
+                AsignacionLote.objects.bulk_create([
+                    AsignacionLote(receta_medicamento=self, lote=lote, cantidad=cantidad)
+                    for lote, cantidad in asignaciones
+                ])
+            MovimientoStock.objects.create(
+                medicamento=self.medicamento,
+                tipo='dispensacion',
+                cantidad=-self.cantidad_recetada,
+                receta_medicamento=self,
+                usuario_id=self.receta.medico.usuario_id,
+            )
+
+
+# Registro de movimientos de stock (solo inserciones, nunca se edita ni se borra)
+# El saldo histórico se calcula desde el último CierreStock más los movimientos siguientes.
+class MovimientoStock(models.Model):
+    TIPO_CHOICES = (
+        ('dispensacion', 'Dispensación'),
+        ('ajuste', 'Ajuste Manual'),
+        ('ingreso', 'Ingreso'),
+        ('devolucion', 'Devolución'),
+        ('vencimiento', 'Baja por Vencimiento'),
+    )
+    
+    medicamento = models.ForeignKey(Medicamento, on_delete=models.CASCADE, related_name='movimientos')
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    cantidad = models.IntegerField(verbose_name='Cantidad', help_text='Positiva si entra stock, negativa si sale')
+    fecha = models.DateTimeField(default=timezone.now, verbose_name='Fecha')
+    receta_medicamento = models.ForeignKey(
+        RecetaMedicamento, on_delete=models.SET_NULL, null=True, blank=True, related_name='movimientos'
+    )
+    usuario = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='movimientos_stock')
+    motivo = models.CharField(max_length=200, blank=True, default='')
+    
+    class Meta:
+        verbose_name = 'Movimiento de Stock'
+        verbose_name_plural = 'Movimientos de Stock'
+        ordering = ['-fecha', '-id']
+        indexes = [
+            models.Index(fields=['medicamento', 'fecha'], name='movimiento_med_fecha_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.cantidad:+d} - {self.medicamento.nombre}"
+
+
+# Cierre periódico del saldo de cada medicamento (comando cerrar_stock)
+class CierreStock(models.Model):
+    medicamento = models.ForeignKey(Medicamento, on_delete=models.CASCADE, related_name='cierres_stock')
+    fecha = models.DateTimeField(verbose_name='Fecha de Cierre')
+    saldo = models.IntegerField(verbose_name='Saldo')
+    # Incluye todos los movimientos con id menor o igual a este
+    ultimo_movimiento_id = models.BigIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = 'Cierre de Stock'
+        verbose_name_plural = 'Cierres de Stock'
+        ordering = ['-fecha']
+        indexes = [
+            models.Index(fields=['medicamento', 'fecha'], name='cierre_med_fecha_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Cierre {self.medicamento.nombre} ({self.fecha.strftime('%d/%m/%Y %H:%M')}): {self.saldo}"
+
+
+# Lote de un medicamento con su fecha de vencimiento
+# La suma de los lotes no vencidos es parte de Medicamento.cantidad; el resto es stock sin lote.
+class LoteMedicamento(models.Model):
+    medicamento = models.ForeignKey(Medicamento, on_delete=models.CASCADE, related_name='lotes')
+    codigo = models.CharField(max_length=50, verbose_name='Código de Lote')
+    fecha_vencimiento = models.DateField(verbose_name='Fecha de Vencimiento')
+    cantidad_inicial = models.PositiveIntegerField(verbose_name='Cantidad Inicial')
+    cantidad_disponible = models.PositiveIntegerField(verbose_name='Cantidad Disponible')
+    vencido = models.BooleanField(default=False, verbose_name='Vencido')
+    fecha_ingreso = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Lote de Medicamento'
+        verbose_name_plural = 'Lotes de Medicamentos'
+        ordering = ['fecha_vencimiento']
+        constraints = [
+            models.UniqueConstraint(fields=['medicamento', 'codigo'], name='unique_lote_medicamento'),
+        ]
+        indexes = [
+            # Asignación FEFO y barrido de vencidos
+            models.Index(fields=['medicamento', 'vencido', 'fecha_vencimiento'], name='lote_fefo_idx'),
+            models.Index(fields=['vencido', 'fecha_vencimiento'], name='lote_vencimiento_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.medicamento.nombre} - Lote {self.codigo} (vence {self.fecha_vencimiento.strftime('%d/%m/%Y')})"
+
+
+# Lotes de los que salió cada medicamento recetado
+class AsignacionLote(models.Model):
+    receta_medicamento = models.ForeignKey(RecetaMedicamento, on_delete=models.CASCADE, related_name='asignaciones_lote')
+    lote = models.ForeignKey(LoteMedicamento, on_delete=models.PROTECT, related_name='asignaciones')
+    cantidad = models.PositiveIntegerField(verbose_name='Cantidad')
+    
+    class Meta:
+        verbose_name = 'Asignación de Lote'
+        verbose_name_plural = 'Asignaciones de Lotes'
+    
+    def __str__(self):
+        return f"{self.cantidad} de Lote {self.lote.codigo}"
@@ -0,0 +1,86 @@
+"""
+Puntaje de alerta temprana NEWS2 a partir de los signos vitales.
+
+Cada parámetro se puntúa por tramos (tablas del Royal College of Physicians, 2017)
+y el puntaje es la suma. El cálculo trabaja sobre una matriz lecturas × parámetros:
+los tramos se buscan con np.searchsorted sobre cada columna completa, así el mismo
+código puntúa una lectura al guardarla y millones de lecturas en el recálculo por
+lotes. No se registran oxígeno suplementario ni nivel de conciencia, que en NEWS2
+suman 2 y 3 puntos; un parámetro faltante suma 0.
+"""
+import numpy as np
+from django.db import transaction
+
+# Parámetro -> (límites superiores inclusivos de cada tramo, puntaje de cada tramo)
+TABLAS = {
+    'frecuencia_respiratoria': ((8, 11, 20, 24), (3, 1, 0, 2, 3)),
+    'saturacion_oxigeno': ((91, 93, 95), (3, 2, 1, 0)),
+    'temperatura': ((35.0, 36.0, 38.0, 39.0), (3, 1, 0, 1, 2)),
+    'presion_sistolica': ((90, 100, 110, 219), (3, 2, 1, 0, 3)),
+    'frecuencia_cardiaca': ((40, 50, 90, 110, 130), (3, 1, 0, 1, 2, 3)),
+}
+CAMPOS = tuple(TABLAS)
+
+RIESGO_MEDIO = 5
+RIESGO_ALTO = 7
+TAMANO_LOTE = 5000
+
+_LIMITES = [np.array(limites, dtype=np.float64) for limites, _ in TABLAS.values()]
+_PUNTOS = [np.array(puntos, dtype=np.int16) for _, puntos in TABLAS.values()]
+
+
+def calcular_puntajes(valores):
+    """
+    Puntaje de cada fila de `valores`, una matriz n × len(CAMPOS) de floats en el
+    orden de CAMPOS (NaN donde falta el dato). Retorna un arreglo int16 de largo n.
+    """
+    valores = np.asarray(valores, dtype=np.float64).reshape(-1, len(CAMPOS))
+    total = np.zeros(len(valores), dtype=np.int16)
+    for columna, (limites, puntos) in enumerate(zip(_LIMITES, _PUNTOS)):
+        datos = valores[:, columna]
+        # side='left': un valor igual al límite queda en ese tramo; NaN cae en el último
+        tramos = np.searchsorted(limites, datos, side='left')
+        total += np.where(np.isnan(datos), 0, puntos[tramos]).astype(np.int16)
+    return total
+
+
+def puntaje_news(registro):
+    """Puntaje de una lectura (objeto con los atributos de CAMPOS)"""
+    valores = [getattr(registro, campo) for campo in CAMPOS]
+    return int(calcular_puntajes([[np.nan if valor is None else float(valor) for valor in valores]])[0])
+
+
+def nivel_riesgo(puntaje):
+    if puntaje is None:
+        return None
+    if puntaje >= RIESGO_ALTO:
+        return 'alto'
+    if puntaje >= RIESGO_MEDIO:
+        return 'medio'
+    return 'bajo'
+
+
+def recalcular_puntajes(todos=False, tamano_lote=TAMANO_LOTE):
+    """
+    Calcula el puntaje de las lecturas que no lo tienen (o de todas) por lotes de ids.
+    Cada lote es una consulta de lectura y un UPDATE por puntaje distinto. Retorna
+    la cantidad de lecturas procesadas.
+    """
+    from .models import SignosVitales
+
+    lecturas = SignosVitales.objects.all() if todos else SignosVitales.objects.filter(puntaje_news__isnull=True)
+    total = 0
+    ultimo_id = 0
+    while True:
+        lote = list(lecturas.filter(id__gt=ultimo_id).order_by('id').values_list('id', *CAMPOS)[:tamano_lote])
+        if not lote:
+            return total
+        # None -> NaN y Decimal -> float al construir la matriz
+        matriz = np.array([fila[1:] for fila in lote], dtype=np.float64)
+        ids = np.fromiter((fila[0] for fila in lote), dtype=np.int64, count=len(lote))
+        puntajes = calcular_puntajes(matriz)
+        with transaction.atomic():
+            for puntaje in np.unique(puntajes):
+                SignosVitales.objects.filter(id__in=ids[puntajes == puntaje].tolist()).update(puntaje_news=int(puntaje))
+        total += len(lote)
+        ultimo_id = lote[-1][0]
@@ -0,0 +1,311 @@
+"""
+PDF de recetas médicas con caché en disco.
+
+Una receta no cambia después de emitida, así que su PDF se genera una sola vez. El
+archivo se guarda como receta_<id>_<hash>.pdf, donde el hash se calcula sobre los
+datos que se imprimen (y la versión de la plantilla): si cambia algo que aparece
+en el documento, cambia el nombre y el archivo anterior se descarta. El mismo hash
+sirve de ETag para responder 304 a los navegadores que ya lo tienen. Al emitir una
+receta el PDF se puede dibujar en segundo plano (en el mismo pool de procesos de las
+exportaciones), así la primera descarga ya lo encuentra en la caché.
+
+Para exportar muchas recetas, los PDF que faltan se dibujan en un pool de procesos
+(ReportLab usa la CPU y retiene el GIL) y se escriben en un ZIP que se envía a medida
+que se arma, sin guardarlo completo en memoria ni en disco.
+"""
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from functools import partial
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import RecetaMedica
+from .renderizado import VERSION_PLANTILLA, renderizar_receta, renderizar_receta_bytes
+
+LOTE_EXPORTACION = 100
+
+
+CAMPOS_RECETA = (
+    'id', 'medico__usuario__nombre', 'medico__especialidad', 'medico__numero_registro',
+    'paciente__nombre', 'paciente__rut', 'paciente__fecha_nacimiento', 'paciente__telefono',
+    'indicaciones', 'fecha_emision', 'vigencia',
+    'medicamentos_recetados__medicamento__nombre', 'medicamentos_recetados__medicamento__gramos',
+    'medicamentos_recetados__cantidad_recetada', 'medicamentos_recetados__dosis',
+)
+
+
+def _filas_recetas(ids):
+    """
+    Una consulta para las recetas de `ids`: cada receta unida a médico, paciente y a
+    cada medicamento recetado (LEFT JOIN, así una receta sin medicamentos también trae
+    su fila). Las filas de una misma receta quedan juntas.
+    """
+    return (
+        RecetaMedica.objects.filter(id__in=ids)
+        .order_by('id', 'medicamentos_recetados__id')
+        .values_list(*CAMPOS_RECETA)
+    )
+
+
+def _datos(filas):
+    """
+    Todo lo que se imprime en una receta, como datos simples, a partir de sus filas.
+    Es el único lugar que arma estos datos: de ellos sale la huella de la caché.
+    """
+    (id_, medico_nombre, especialidad, numero_registro, paciente_nombre, rut, fecha_nacimiento,
+     telefono, indicaciones, fecha_emision, vigencia) = filas[0][:11]
+    return {
+        'id': id_,
+        'medico': {
+            'nombre': medico_nombre,
+            'especialidad': especialidad,
+            'numero_registro': numero_registro,
+        },
+        'paciente': {
+            'nombre': paciente_nombre,
+            'rut': rut,
+            'fecha_nacimiento': fecha_nacimiento.strftime('%d/%m/%Y'),
+            'telefono': telefono,
+        },
+        'medicamentos': [
+            [nombre, f"{gramos}g", str(cantidad), dosis]
+            for nombre, gramos, cantidad, dosis in (fila[11:] for fila in filas)
+            if nombre is not None
+        ],
+        'indicaciones': indicaciones,
+        'fecha_emision': fecha_emision.strftime('%d/%m/%Y %H:%M'),
+        'fecha_archivo': fecha_emision.strftime('%Y%m%d'),
+        'vigencia': vigencia.strftime('%d/%m/%Y'),
+    }
+
+
+def datos_receta(receta_id):
+    """Datos impresos de la receta, en una sola consulta (None si no existe)"""
+    filas = list(_filas_recetas([receta_id]))
+    return _datos(filas) if filas else None
+
+
+def iterar_datos_recetas(recetas, tamano_lote=LOTE_EXPORTACION):
+    """Datos de cada receta del queryset, cargados por lotes de ids (dos consultas por lote)"""
+    recetas = recetas.order_by('id').values_list('id', flat=True)
+    ultimo_id = 0
+    while True:
+        ids = list(recetas.filter(id__gt=ultimo_id)[:tamano_lote])
+        for _, filas in groupby(_filas_recetas(ids), key=itemgetter(0)):
+            yield _datos(list(filas))
+        if len(ids) < tamano_lote:
+            return
+        ultimo_id = ids[-1]
+
+
+def huella(datos):
+    """Hash de los datos impresos y de la versión de la plantilla"""
+    contenido = json.dumps([VERSION_PLANTILLA, datos], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(contenido.encode()).hexdigest()[:32]
+
+
+def nombre_descarga(datos):
+    return f"receta_{datos['paciente']['rut']}_{datos['fecha_archivo']}.pdf"
+
+
+# ============= CACHÉ EN DISCO =============
+
+def ruta_cache(receta_id, hash_datos):
+    return settings.PDF_CACHE_DIR / f'receta_{receta_id}_{hash_datos}.pdf'
+
+
+def abrir_pdf(datos):
+    """
+    PDF de la receta abierto para lectura desde la caché, generándolo si no existe o si
+    cambiaron sus datos. Retorna (archivo, hash).
+    """
+    hash_datos = huella(datos)
+    ruta = ruta_cache(datos['id'], hash_datos)
+    # Se abre sin comprobar antes con exists(): entre comprobar y abrir, otra petición que
+    # guarda una versión nueva de la receta puede borrar esta (ver _guardar). Una vez
+    # abierto, borrarlo ya no afecta la lectura.
+    try:
+        return open(ruta, 'rb'), hash_datos
+    except FileNotFoundError:
+        pass
+    _guardar(datos['id'], ruta, lambda archivo: renderizar_receta(datos, archivo))
+    try:
+        return open(ruta, 'rb'), hash_datos
+    except FileNotFoundError:
+        # Otra versión se guardó justo después y borró esta: se entrega desde memoria
+        return io.BytesIO(renderizar_receta_bytes(datos)), hash_datos
+
+
+def _guardar(receta_id, ruta, escribir):
+    settings.PDF_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    # Se escribe en un temporal y se renombra: otra petición nunca ve un PDF a medias
+    descriptor, temporal = tempfile.mkstemp(dir=settings.PDF_CACHE_DIR, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as archivo:
+            escribir(archivo)
+        os.replace(temporal, ruta)
+    except BaseException:
+        os.unlink(temporal)
+        raise
+
+    # Versiones anteriores de la misma receta
+    for anterior in settings.PDF_CACHE_DIR.glob(f'receta_{receta_id}_*.pdf'):
+        if anterior != ruta:
+            anterior.unlink(missing_ok=True)
+
+
+def prerenderizar_receta(receta_id):
+    """
+    Dibuja el PDF de la receta en el pool de procesos y lo deja en la caché. Retorna un
+    Future que termina cuando el archivo está guardado, o None si no hay nada que dibujar.
+    """
+    datos = datos_receta(receta_id)
+    if datos is None:
+        return None
+    ruta = ruta_cache(receta_id, huella(datos))
+    if ruta.exists():
+        return None
+
+    guardado = Future()
+
+    def guardar(futuro):
+        # Corre en un hilo del pool al terminar el dibujo
+        try:
+            contenido = futuro.result()
+            _guardar(receta_id, ruta, lambda archivo: archivo.write(contenido))
+        except Exception as e:
+            guardado.set_exception(e)
+        else:
+            guardado.set_result(ruta)
+
+    obtener_pool().submit(renderizar_receta_bytes, datos).add_done_callback(guardar)
+    return guardado
+
+
+def programar_prerenderizado(receta_id):
+    """
+    Dibuja el PDF en el pool de procesos después del commit (si PDF_PRERENDERIZAR está
+    activo), sin abrir un hilo por receta. Si falla, no pasa nada: la descarga lo genera
+    igual que antes.
+    """
+    if settings.PDF_PRERENDERIZAR:
+        transaction.on_commit(partial(prerenderizar_receta, receta_id), robust=True)
+
+
+# ============= EXPORTACIÓN MASIVA =============
+
+_lock_pool = threading.Lock()
+_pool = None
+
+
+def obtener_pool():
+    """Pool de procesos compartido por las exportaciones del proceso web"""
+    global _pool
+    with _lock_pool:
+        if _pool is None:
+            # spawn: los procesos no heredan conexiones ni hilos del servidor; solo
+            # importan renderizado.py, que no depende de Django
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.PDF_WORKERS, mp_context=multiprocessing.get_context('spawn')
+            )
+        return _pool
+
+
+def renderizar_en_paralelo(lista_datos, funcion=renderizar_receta_bytes, pool=None):
+    """
+    Genera (datos, pdf en bytes) a medida que los procesos terminan, en cualquier orden.
+    Como máximo hay dos documentos por proceso en curso, así que la memoria no crece
+    con la cantidad de documentos.
+    """
+    pool = pool or obtener_pool()
+    ventana = 2 * settings.PDF_WORKERS
+    pendientes = {}
+    for datos in lista_datos:
+        pendientes[pool.submit(funcion, datos)] = datos
+        if len(pendientes) >= ventana:
+            listos, _ = wait(pendientes, return_when=FIRST_COMPLETED)
+            for futuro in listos:
+                yield pendientes.pop(futuro), futuro.result()
+    while pendientes:
+        listos, _ = wait(pendientes, return_when=FIRST_COMPLETED)
+        for futuro in listos:
+            yield pendientes.pop(futuro), futuro.result()
+
+
+def _pdfs_recetas(lista_datos):
+    """(datos, pdf) de cada receta: desde la caché si existe, si no desde el pool (y se guarda)"""
+    faltantes = []
+    for datos in lista_datos:
+        try:
+            contenido = ruta_cache(datos['id'], huella(datos)).read_bytes()
+        except FileNotFoundError:
+            faltantes.append(datos)
+            if len(faltantes) >= LOTE_EXPORTACION:
+                yield from _renderizar_y_guardar(faltantes)
+                faltantes = []
+        else:
+            yield datos, contenido
+    yield from _renderizar_y_guardar(faltantes)
+
+
+def _renderizar_y_guardar(lista_datos):
+    for datos, contenido in renderizar_en_paralelo(lista_datos):
+        _guardar(datos['id'], ruta_cache(datos['id'], huella(datos)), lambda archivo: archivo.write(contenido))
+        yield datos, contenido
+
+
+class _SalidaZip:
+    """Destino de ZipFile sin seek: guarda lo escrito hasta que el generador lo entrega"""
+
+    def __init__(self):
+        self._partes = []
+        self._posicion = 0
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._posicion
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        contenido = b''.join(self._partes)
+        self._partes = []
+        return contenido
+
+
+def generar_zip(documentos):
+    """
+    Arma un ZIP con los (nombre, bytes) de `documentos` y lo entrega por partes.
+    ZipFile detecta que el destino no permite seek y escribe los tamaños después de
+    cada archivo, así que nada queda retenido más allá del documento actual.
+    """
+    salida = _SalidaZip()
+    with zipfile.ZipFile(salida, 'w', zipfile.ZIP_DEFLATED) as archivo:
+        for nombre, contenido in documentos:
+            archivo.writestr(nombre, contenido)
+            yield salida.vaciar()
+    yield salida.vaciar()
+
+
+def zip_recetas(recetas):
+    """ZIP en partes con el PDF de cada receta del queryset"""
+    documentos = (
+        (f"receta_{datos['id']}_{datos['paciente']['rut']}_{datos['fecha_archivo']}.pdf", contenido)
+        for datos, contenido in _pdfs_recetas(iterar_datos_recetas(recetas))
+    )
+    return generar_zip(documentos)
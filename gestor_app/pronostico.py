@@ -0,0 +1,152 @@
+"""
+Pronóstico de consumo de medicamentos y alertas de reposición.
+
+El consumo se agrega en la base de datos (una fila por medicamento y día local) y el
+resto del cálculo se hace con arreglos de NumPy: una matriz medicamentos × días sobre
+la que se calculan medias móviles con sumas acumuladas y los días de stock restantes
+por medicamento. El día en curso no se considera: contarlo como un día completo bajaría
+el consumo diario estimado.
+"""
+import datetime as dt
+from datetime import timedelta
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Case, DateField, DateTimeField, ExpressionWrapper, F, IntegerField, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .fechas import filtro_dias, rango_dias
+from .models import Medicamento, RecetaMedicamento
+
+DIAS_HISTORIA = 90
+VENTANA_LARGA = 28
+VENTANA_CORTA = 7
+# Días que demora un pedido en llegar y días de consumo que debe cubrir
+DIAS_REPOSICION = 14
+DIAS_COBERTURA = 30
+
+CLAVE_CACHE = 'medicamentos:reposicion'
+DURACION_CACHE = 60 * 30
+
+
+def _media_movil(consumo, ventana):
+    """Media móvil por fila sobre el eje de días (la última columna es la más reciente)"""
+    acumulado = np.cumsum(consumo, axis=1)
+    acumulado = np.concatenate([np.zeros((consumo.shape[0], 1)), acumulado], axis=1)
+    return (acumulado[:, ventana:] - acumulado[:, :-ventana]) / ventana
+
+
+def _tramos_dias(desde, hasta):
+    """
+    Divide los días locales de `desde` a `hasta` en tramos (inicio, fin, desfase, dia).
+    Los días de 24 horas seguidos con el mismo desfase UTC forman un tramo con `dia` None;
+    cada día con cambio de hora (que no empieza a medianoche o cambia de desfase) es un
+    tramo propio con su fecha en `dia`.
+    """
+    tramos = []
+    fecha = desde
+    while fecha <= hasta:
+        inicio, fin = rango_dias(fecha)
+        if inicio.time() != dt.time.min or inicio.utcoffset() != fin.utcoffset():
+            tramos.append((inicio, fin, None, fecha))
+        elif tramos and tramos[-1][3] is None and tramos[-1][2] == inicio.utcoffset():
+            tramos[-1] = (tramos[-1][0], fin, inicio.utcoffset(), None)
+        else:
+            tramos.append((inicio, fin, inicio.utcoffset(), None))
+        fecha += timedelta(days=1)
+    return tramos
+
+
+def _consumo_por_dia(desde, hasta):
+    """
+    (medicamento_id, índice del día desde `desde`, total) por medicamento y día local,
+    agrupado en la base de datos.
+
+    Sin convertir zonas horarias en SQL (en MySQL CONVERT_TZ requiere las tablas de zonas
+    horarias): en los tramos de días normales se suma el desfase a la fecha UTC y se toma
+    la fecha; los días con cambio de hora duran 23 o 25 horas y no caben en una fecha UTC
+    corrida, así que se identifican por su rango.
+    """
+    campo = 'fecha_agregado'
+    fechas = []
+    indices = []
+    for inicio, fin, desfase, dia in _tramos_dias(desde, hasta):
+        rango = {f'{campo}__gte': inicio, f'{campo}__lt': fin}
+        if dia is None:
+            local = ExpressionWrapper(F(campo) + Value(desfase), output_field=DateTimeField())
+            fechas.append(When(**rango, then=TruncDate(local, tzinfo=dt.timezone.utc)))
+        else:
+            indices.append(When(**rango, then=Value((dia - desde).days)))
+    filas = (
+        RecetaMedicamento.objects
+        .filter(**filtro_dias(campo, desde, hasta))
+        .annotate(
+            fecha=Case(*fechas, output_field=DateField()),
+            indice=Case(*indices, output_field=IntegerField()),
+        )
+        .values('medicamento_id', 'fecha', 'indice')
+        .annotate(total=Sum('cantidad_recetada'))
+        .order_by()
+        .values_list('medicamento_id', 'fecha', 'indice', 'total')
+    )
+    return [
+        (medicamento_id, (fecha - desde).days if indice is None else indice, total)
+        for medicamento_id, fecha, indice, total in filas
+    ]
+
+
+def calcular_reposicion(dias_reposicion=DIAS_REPOSICION, dias_historia=DIAS_HISTORIA, hoy=None):
+    """
+    Retorna una lista de dicts por medicamento, ordenada por días de stock restantes,
+    con el consumo diario estimado y si se agota antes del plazo de reposición.
+    """
+    hoy = hoy or timezone.localdate()
+    # Los días completos anteriores a hoy
+    desde = hoy - timedelta(days=dias_historia)
+
+    medicamentos = list(Medicamento.objects.order_by('id').values_list('id', 'nombre', 'gramos', 'cantidad'))
+    if not medicamentos:
+        return []
+    ids = np.array([m[0] for m in medicamentos])
+    stock = np.array([m[3] for m in medicamentos], dtype=np.float64)
+
+    filas = _consumo_por_dia(desde, hoy - timedelta(days=1))
+    consumo = np.zeros((len(medicamentos), dias_historia), dtype=np.float64)
+    if filas:
+        med_ids, dias, totales = (np.array(columna) for columna in zip(*filas))
+        np.add.at(consumo, (np.searchsorted(ids, med_ids), dias), totales)
+
+    # Se usa la mayor de las dos medias para reaccionar a alzas recientes
+    media_larga = _media_movil(consumo, min(VENTANA_LARGA, dias_historia))[:, -1]
+    media_corta = _media_movil(consumo, min(VENTANA_CORTA, dias_historia))[:, -1]
+    consumo_diario = np.maximum(media_larga, media_corta)
+
+    with np.errstate(divide='ignore'):
+        dias_restantes = np.where(consumo_diario > 0, stock / consumo_diario, np.inf)
+    en_riesgo = dias_restantes < dias_reposicion
+    sugerido = np.ceil(np.maximum(consumo_diario * (dias_reposicion + DIAS_COBERTURA) - stock, 0))
+
+    orden = np.argsort(dias_restantes, kind='stable')
+    return [
+        {
+            'id': medicamentos[i][0],
+            'nombre': medicamentos[i][1],
+            'gramos': medicamentos[i][2],
+            'stock': medicamentos[i][3],
+            'consumo_diario': round(float(consumo_diario[i]), 2),
+            'dias_restantes': None if np.isinf(dias_restantes[i]) else round(float(dias_restantes[i]), 1),
+            'en_riesgo': bool(en_riesgo[i]),
+            'cantidad_sugerida': int(sugerido[i]),
+        }
+        for i in orden
+    ]
+
+
+def obtener_alertas_stock(limite=10):
+    """Medicamentos que se agotan antes del plazo de reposición (resultado cacheado)"""
+    alertas = cache.get(CLAVE_CACHE)
+    if alertas is None:
+        alertas = [m for m in calcular_reposicion() if m['en_riesgo']]
+        cache.set(CLAVE_CACHE, alertas, DURACION_CACHE)
+    return alertas[:limite]
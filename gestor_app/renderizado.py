@@ -0,0 +1,197 @@
+"""
+Dibujo de documentos PDF con ReportLab a partir de datos simples (dicts y listas).
+
+Este módulo no importa Django: sus funciones se ejecutan también en los procesos
+del pool de pdf.py, que no cargan el proyecto.
+"""
+import io
+from functools import lru_cache
+from xml.sax.saxutils import escape
+
+from reportlab.lib.pagesizes import letter
+from reportlab.lib import colors
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+from reportlab.lib.enums import TA_CENTER
+
+# Cambiar al modificar el diseño del documento: invalida todos los PDF guardados
+VERSION_PLANTILLA = 1
+
+
+@lru_cache(maxsize=None)
+def estilos_receta():
+    """
+    Estilos de párrafo y de tabla de la receta. Se crean una vez por proceso: los
+    documentos solo los leen, así que se comparten entre peticiones e hilos.
+    """
+    styles = getSampleStyleSheet()
+    return {
+        'titulo': ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=18,
+            textColor=colors.HexColor('#0066cc'),
+            spaceAfter=30,
+            alignment=TA_CENTER
+        ),
+        'seccion': ParagraphStyle(
+            'CustomHeading',
+            parent=styles['Heading2'],
+            fontSize=12,
+            textColor=colors.HexColor('#333333'),
+            spaceAfter=12,
+            spaceBefore=12
+        ),
+        'normal': styles['Normal'],
+        'firma': ParagraphStyle('firma', parent=styles['Normal'], alignment=TA_CENTER, fontSize=10),
+        # Tablas de dos columnas (etiqueta, valor)
+        'tabla_datos': TableStyle([
+            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#e8f4f8')),
+            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ]),
+        # Tablas con fila de encabezado y filas alternadas
+        'tabla_listado': TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0066cc')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f0f0f0')]),
+        ]),
+    }
+
+
+def renderizar_receta(datos, destino):
+    """Escribe el PDF de la receta en `destino` (ruta o archivo binario)"""
+    doc = SimpleDocTemplate(destino, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch)
+    elements = []
+
+    estilos = estilos_receta()
+    title_style = estilos['titulo']
+    heading_style = estilos['seccion']
+    normal_style = estilos['normal']
+    tabla_datos_style = estilos['tabla_datos']
+
+    medico = datos['medico']
+    paciente = datos['paciente']
+
+    # Encabezado
+    elements.append(Paragraph("RECETA MÉDICA", title_style))
+    elements.append(Spacer(1, 0.2*inch))
+
+    # Información del médico
+    elements.append(Paragraph("<b>DATOS DEL MÉDICO</b>", heading_style))
+    medico_data = [
+        ['Nombre:', medico['nombre']],
+        ['Especialidad:', medico['especialidad']],
+        ['Registro Profesional:', medico['numero_registro']],
+    ]
+    medico_table = Table(medico_data, colWidths=[2*inch, 4.5*inch])
+    medico_table.setStyle(tabla_datos_style)
+    elements.append(medico_table)
+    elements.append(Spacer(1, 0.3*inch))
+
+    # Información del paciente
+    elements.append(Paragraph("<b>DATOS DEL PACIENTE</b>", heading_style))
+    paciente_data = [
+        ['Nombre:', paciente['nombre']],
+        ['RUT:', paciente['rut']],
+        ['Fecha de Nacimiento:', paciente['fecha_nacimiento']],
+        ['Teléfono:', paciente['telefono']],
+    ]
+    paciente_table = Table(paciente_data, colWidths=[2*inch, 4.5*inch])
+    paciente_table.setStyle(tabla_datos_style)
+    elements.append(paciente_table)
+    elements.append(Spacer(1, 0.3*inch))
+
+    # Medicamentos
+    elements.append(Paragraph("<b>MEDICAMENTOS PRESCRITOS</b>", heading_style))
+    if datos['medicamentos']:
+        medicamentos_data = [['Medicamento', 'Concentración', 'Cantidad', 'Dosis e Indicaciones']] + datos['medicamentos']
+        medicamentos_table = Table(medicamentos_data, colWidths=[2*inch, 1*inch, 0.8*inch, 2.7*inch])
+        medicamentos_table.setStyle(estilos['tabla_listado'])
+        elements.append(medicamentos_table)
+    else:
+        elements.append(Paragraph("<i>No hay medicamentos prescritos</i>", normal_style))
+
+    elements.append(Spacer(1, 0.2*inch))
+
+    # Indicaciones
+    elements.append(Paragraph("<b>INDICACIONES</b>", heading_style))
+    elements.append(Paragraph(datos['indicaciones'].replace('\n', '<br/>'), normal_style))
+    elements.append(Spacer(1, 0.3*inch))
+
+    # Información de la receta
+    elements.append(Paragraph("<b>INFORMACIÓN DE LA RECETA</b>", heading_style))
+    info_data = [
+        ['Fecha de Emisión:', datos['fecha_emision']],
+        ['Vigencia hasta:', datos['vigencia']],
+    ]
+    info_table = Table(info_data, colWidths=[2*inch, 4.5*inch])
+    info_table.setStyle(tabla_datos_style)
+    elements.append(info_table)
+    elements.append(Spacer(1, 0.5*inch))
+
+    # Firma
+    elements.append(Spacer(1, 0.5*inch))
+    firma_style = estilos['firma']
+    elements.append(Paragraph("_" * 40, firma_style))
+    elements.append(Paragraph(f"<b>{medico['nombre']}</b>", firma_style))
+    elements.append(Paragraph(f"{medico['especialidad']}", firma_style))
+    elements.append(Paragraph(f"Reg. Prof. {medico['numero_registro']}", firma_style))
+
+    doc.build(elements)
+
+
+def renderizar_receta_bytes(datos):
+    """PDF de la receta como bytes (punto de entrada de los procesos del pool)"""
+    salida = io.BytesIO()
+    renderizar_receta(datos, salida)
+    return salida.getvalue()
+
+
+def renderizar_agenda(datos, destino):
+    """Escribe en `destino` la agenda del día de un médico (lista de citas por hora)"""
+    doc = SimpleDocTemplate(destino, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch)
+    estilos = estilos_receta()
+    medico = datos['medico']
+    elements = [
+        Paragraph("AGENDA DEL DÍA", estilos['titulo']),
+        Paragraph(
+            f"<b>{escape(medico['nombre'])}</b> - {escape(medico['especialidad'])} "
+            f"(Reg. Prof. {escape(medico['numero_registro'])})", estilos['normal']
+        ),
+        Paragraph(f"Fecha: {datos['fecha']}", estilos['normal']),
+        Spacer(1, 0.2*inch),
+    ]
+
+    if datos['citas']:
+        celda = estilos['normal']
+        filas = [['Hora', 'Paciente', 'RUT', 'Teléfono', 'Motivo', 'Estado']] + [
+            [hora, Paragraph(escape(paciente), celda), rut, telefono, Paragraph(escape(motivo), celda), estado]
+            for hora, paciente, rut, telefono, motivo, estado in datos['citas']
+        ]
+        tabla = Table(filas, colWidths=[0.6*inch, 1.7*inch, 1*inch, 1*inch, 1.8*inch, 0.9*inch], repeatRows=1)
+        tabla.setStyle(estilos['tabla_listado'])
+        elements.append(tabla)
+    else:
+        elements.append(Paragraph("<i>Sin citas agendadas</i>", estilos['normal']))
+
+    doc.build(elements)
+
+
+def renderizar_agenda_bytes(datos):
+    """PDF de la agenda como bytes (punto de entrada de los procesos del pool)"""
+    salida = io.BytesIO()
+    renderizar_agenda(datos, salida)
+    return salida.getvalue()
@@ -0,0 +1,129 @@
+"""
+Lecturas en una réplica de la base de datos para las vistas que toleran datos con
+algunos segundos de atraso (listados, dashboards, exportaciones y análisis).
+
+Todo va al primario salvo las lecturas hechas dentro de usar_replica (decorador de
+vistas) o de lecturas_en_replica (bloque with). Aun así, se fija el primario:
+- dentro de una transacción abierta en el bloque, o después de una escritura en el
+  mismo contexto;
+- para los modelos de sesión y autenticación, porque una sesión recién creada puede
+  no haber llegado a la réplica;
+- durante DB_REPLICA_RETRASO segundos después de un POST del mismo navegador (cookie
+  que pone PrimarioTrasEscrituraMiddleware). Así, el listado al que se redirige
+  después de crear un paciente ya lo muestra.
+
+El estado va en ContextVar: cada hilo (y cada tarea asíncrona) tiene el suyo. Si
+DB_REPLICA no es un alias de DATABASES, todo va al primario.
+"""
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+COOKIE_PRIMARIO = 'primario_tras_escritura'
+METODOS_SEGUROS = ('GET', 'HEAD', 'OPTIONS')
+# Apps cuyos modelos se leen siempre del primario (además del modelo de usuario)
+APPS_PRIMARIO = {'admin', 'auth', 'contenttypes', 'sessions'}
+
+# Transacciones del primario abiertas al entrar a lecturas_en_replica (None: fuera de él)
+_transacciones_base = contextvars.ContextVar('transacciones_base', default=None)
+_primario_fijado = contextvars.ContextVar('primario_fijado', default=False)
+
+
+def alias_replica():
+    """
+    Alias de la réplica, o None si no está configurada. Una réplica que apunta a la
+    misma base que el primario (TEST MIRROR en las pruebas) se trata como el primario.
+    """
+    alias = getattr(settings, 'DB_REPLICA', None)
+    if alias not in settings.DATABASES:
+        return None
+    replica, primario = connections[alias].settings_dict, connections[DEFAULT_DB_ALIAS].settings_dict
+    if all(replica[clave] == primario[clave] for clave in ('ENGINE', 'NAME', 'HOST', 'PORT')):
+        return None
+    return alias
+
+
+def fijar_primario():
+    """Las lecturas que siguen en este contexto van al primario"""
+    _primario_fijado.set(True)
+
+
+@contextmanager
+def lecturas_en_replica():
+    base = _transacciones_base.set(len(connections[DEFAULT_DB_ALIAS].atomic_blocks))
+    fijado = _primario_fijado.set(False)
+    try:
+        yield
+    finally:
+        _primario_fijado.reset(fijado)
+        _transacciones_base.reset(base)
+
+
+def _iterar_en_contexto(contexto, contenido):
+    """Recorre el contenido de una respuesta por partes dentro de `contexto`"""
+    iterador = iter(contenido)
+    while True:
+        try:
+            parte = contexto.run(next, iterador)
+        except StopIteration:
+            return
+        yield parte
+
+
+def usar_replica(vista):
+    """
+    Las lecturas de la vista van a la réplica (solo en métodos seguros y si el navegador
+    no escribió recién). Las respuestas por partes, como las exportaciones en ZIP, se
+    generan después de que la vista retorna: se recorren en el mismo contexto.
+    """
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        if request.method not in METODOS_SEGUROS or COOKIE_PRIMARIO in request.COOKIES:
+            return vista(request, *args, **kwargs)
+        with lecturas_en_replica():
+            respuesta = vista(request, *args, **kwargs)
+            if respuesta.streaming:
+                respuesta.streaming_content = _iterar_en_contexto(contextvars.copy_context(), respuesta.streaming_content)
+        return respuesta
+    return envoltura
+
+
+class RouterReplica:
+    def db_for_read(self, model, **hints):
+        alias = alias_replica()
+        base = _transacciones_base.get()
+        if (
+            alias is None
+            or base is None
+            or _primario_fijado.get()
+            or model._meta.app_label in APPS_PRIMARIO
+            or model._meta.label == settings.AUTH_USER_MODEL
+            # Transacción abierta dentro del bloque (por ejemplo, select_for_update)
+            or len(connections[DEFAULT_DB_ALIAS].atomic_blocks) > base
+        ):
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        fijar_primario()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # La réplica tiene los mismos datos que el primario
+        return True
+
+
+class PrimarioTrasEscrituraMiddleware:
+    """Después de un POST (o PUT, DELETE...), el navegador lee del primario por DB_REPLICA_RETRASO segundos"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        respuesta = self.get_response(request)
+        if request.method not in METODOS_SEGUROS and alias_replica() is not None:
+            respuesta.set_cookie(COOKIE_PRIMARIO, '1', max_age=settings.DB_REPLICA_RETRASO, httponly=True, samesite='Lax')
+        return respuesta
@@ -0,0 +1,96 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from .alergias import sincronizar_alergenos
+from .busqueda import marcar_cambio
+from .cache_pacientes import invalidar_resumen, pacientes_de_medico
+from .models import CustomUser, Medico, Paciente, HistoriaClinica, Cita, RecetaMedica, SignosVitales, Medicamento, AlergenoPaciente
+
+# Modelos cuyo cambio afecta el resumen cacheado del paciente
+MODELOS_CON_PACIENTE = (HistoriaClinica, Cita, RecetaMedica, SignosVitales)
+
+
+# ============= CACHÉ DEL RESUMEN DE PACIENTE =============
+# Se invalida después del commit: si se borrara antes, una ficha abierta en ese momento
+# volvería a guardar en la caché los datos anteriores al cambio.
+
+@receiver(post_save, sender=Paciente)
+@receiver(post_delete, sender=Paciente)
+def invalidar_resumen_paciente(sender, instance, **kwargs):
+    transaction.on_commit(partial(invalidar_resumen, instance.pk))
+
+
+def recordar_paciente_original(sender, instance, **kwargs):
+    """Guarda el paciente con que se cargó la fila, para invalidar también al anterior si cambia"""
+    # Sin acceder al atributo para no forzar la carga de un campo diferido
+    instance._paciente_id_original = instance.__dict__.get('paciente_id')
+
+
+def invalidar_resumen_relacionado(sender, instance, **kwargs):
+    transaction.on_commit(partial(invalidar_resumen, instance.paciente_id, getattr(instance, '_paciente_id_original', None)))
+    instance._paciente_id_original = instance.paciente_id
+
+
+for modelo in MODELOS_CON_PACIENTE:
+    post_init.connect(recordar_paciente_original, sender=modelo)
+    post_save.connect(invalidar_resumen_relacionado, sender=modelo)
+    post_delete.connect(invalidar_resumen_relacionado, sender=modelo)
+
+
+def invalidar_resumen_medico(medico_id):
+    invalidar_resumen(*pacientes_de_medico(medico_id))
+
+
+@receiver(post_save, sender=Medico)
+def invalidar_resumen_por_medico(sender, instance, created, **kwargs):
+    # Las citas y recetas del resumen muestran su especialidad
+    if not created:
+        transaction.on_commit(partial(invalidar_resumen_medico, instance.pk))
+
+
+@receiver(post_init, sender=CustomUser)
+def recordar_nombre_original(sender, instance, **kwargs):
+    instance._nombre_original = instance.__dict__.get('nombre')
+
+
+@receiver(post_save, sender=CustomUser)
+def invalidar_resumen_por_usuario(sender, instance, created, update_fields=None, **kwargs):
+    # Cada login guarda el usuario (last_login): solo interesa un cambio de nombre de un médico
+    if created or (update_fields is not None and 'nombre' not in update_fields):
+        return
+    if instance.nombre != instance._nombre_original:
+        for medico_id in Medico.objects.filter(usuario_id=instance.pk).values_list('id', flat=True):
+            transaction.on_commit(partial(invalidar_resumen_medico, medico_id))
+    instance._nombre_original = instance.nombre
+
+
+# ============= ÍNDICE DE ALERGIAS =============
+
+@receiver(post_init, sender=HistoriaClinica)
+def recordar_alergias_originales(sender, instance, **kwargs):
+    instance._alergias_original = instance.__dict__.get('alergias')
+
+
+@receiver(post_save, sender=HistoriaClinica)
+def sincronizar_alergias(sender, instance, created, **kwargs):
+    # Solo si cambió el texto (o se guarda sin haberlo cargado)
+    if created or 'alergias' not in instance.__dict__ or instance.alergias != instance._alergias_original:
+        sincronizar_alergenos(instance.paciente_id, instance.alergias)
+        instance._alergias_original = instance.alergias
+
+
+@receiver(post_delete, sender=HistoriaClinica)
+def borrar_alergias(sender, instance, **kwargs):
+    AlergenoPaciente.objects.filter(paciente_id=instance.paciente_id).delete()
+
+
+# ============= ÍNDICE DE BÚSQUEDA DE MEDICAMENTOS =============
+
+@receiver(post_save, sender=Medicamento)
+@receiver(post_delete, sender=Medicamento)
+def invalidar_indice_medicamentos(sender, instance, **kwargs):
+    # Después del commit, para que la reconstrucción vea los datos nuevos
+    transaction.on_commit(marcar_cambio)
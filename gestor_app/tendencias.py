@@ -0,0 +1,103 @@
+"""
+Series de tiempo de signos vitales por paciente, reducidas para graficar.
+
+Las lecturas se leen en orden por el índice (paciente, fecha_hora) y solo con las dos
+columnas necesarias. Si hay más lecturas que puntos pedidos, la serie se reduce en
+el servidor, así la respuesta tiene un tamaño acotado sin importar cuánto dure la
+hospitalización:
+
+- 'lttb' (Largest-Triangle-Three-Buckets): elige en cada tramo la lectura que forma
+  el triángulo de mayor área con la anterior elegida y el promedio del tramo
+  siguiente. Conserva la forma de la curva y los picos.
+- 'rango': promedio, mínimo y máximo de cada tramo (para graficar una banda).
+"""
+import numpy as np
+
+from .models import SignosVitales
+
+# Métrica -> (campo de SignosVitales, unidad)
+METRICAS = {
+    'frecuencia_cardiaca': ('frecuencia_cardiaca', 'lpm'),
+    'frecuencia_respiratoria': ('frecuencia_respiratoria', 'rpm'),
+    'saturacion_oxigeno': ('saturacion_oxigeno', '%'),
+    'temperatura': ('temperatura', '°C'),
+    'presion_sistolica': ('presion_sistolica', 'mmHg'),
+    'presion_diastolica': ('presion_diastolica', 'mmHg'),
+    'peso': ('peso', 'kg'),
+    'puntaje_news': ('puntaje_news', 'NEWS2'),
+}
+MODOS = ('lttb', 'rango')
+PUNTOS_POR_DEFECTO = 300
+MAX_PUNTOS = 2000
+
+
+def leer_serie(paciente_id, campo, desde=None, hasta=None):
+    """(tiempos en ms desde epoch, valores) de las lecturas del paciente con el campo informado"""
+    lecturas = SignosVitales.objects.filter(paciente_id=paciente_id, **{f'{campo}__isnull': False})
+    if desde is not None:
+        lecturas = lecturas.filter(fecha_hora__gte=desde)
+    if hasta is not None:
+        lecturas = lecturas.filter(fecha_hora__lt=hasta)
+    filas = list(lecturas.order_by('fecha_hora', 'id').values_list('fecha_hora', campo))
+    tiempos = np.fromiter((fecha.timestamp() * 1000 for fecha, _ in filas), dtype=np.float64, count=len(filas))
+    valores = np.fromiter((valor for _, valor in filas), dtype=np.float64, count=len(filas))
+    return tiempos, valores
+
+
+def lttb(x, y, puntos):
+    """Índices de las `puntos` (3 o más) lecturas elegidas por LTTB, incluidas la primera y la última"""
+    n = len(x)
+    if puntos >= n:
+        return np.arange(n)
+
+    # Tramos intermedios: la primera y la última lectura forman tramos propios
+    bordes = np.linspace(1, n - 1, puntos - 1).astype(np.intp)
+    elegidos = np.empty(puntos, dtype=np.intp)
+    elegidos[0], elegidos[-1] = 0, n - 1
+    anterior = 0
+    for tramo in range(puntos - 2):
+        inicio, fin = bordes[tramo], bordes[tramo + 1]
+        # Promedio del tramo siguiente (o la última lectura en el penúltimo tramo)
+        siguiente_fin = bordes[tramo + 2] if tramo + 2 < len(bordes) else n
+        cx = x[fin:siguiente_fin].mean()
+        cy = y[fin:siguiente_fin].mean()
+        ax, ay = x[anterior], y[anterior]
+        areas = np.abs((ax - cx) * (y[inicio:fin] - ay) - (ax - x[inicio:fin]) * (cy - ay))
+        anterior = inicio + int(np.argmax(areas))
+        elegidos[tramo + 1] = anterior
+    return elegidos
+
+
+def rango(x, y, puntos):
+    """(tiempo medio, promedio, mínimo, máximo) de `puntos` tramos de igual cantidad de lecturas"""
+    inicios = np.unique(np.linspace(0, len(x), puntos, endpoint=False).astype(np.intp))
+    largos = np.diff(np.append(inicios, len(x)))
+    return (
+        np.add.reduceat(x, inicios) / largos,
+        np.add.reduceat(y, inicios) / largos,
+        np.minimum.reduceat(y, inicios),
+        np.maximum.reduceat(y, inicios),
+    )
+
+
+def serie_reducida(paciente_id, metrica, puntos=PUNTOS_POR_DEFECTO, modo='lttb', desde=None, hasta=None):
+    """Serie lista para JSON: {'metrica', 'unidad', 'total', 'modo', 'puntos': [[t, valor, ...], ...]}"""
+    campo, unidad = METRICAS[metrica]
+    puntos = max(3, min(puntos, MAX_PUNTOS))
+    x, y = leer_serie(paciente_id, campo, desde, hasta)
+
+    if len(x) <= puntos:
+        columnas = (x, y) if modo == 'lttb' else (x, y, y, y)
+    elif modo == 'lttb':
+        indices = lttb(x, y, puntos)
+        columnas = (x[indices], y[indices])
+    else:
+        columnas = rango(x, y, puntos)
+
+    return {
+        'metrica': metrica,
+        'unidad': unidad,
+        'total': len(x),
+        'modo': modo,
+        'puntos': np.round(np.column_stack(columnas), 2).tolist(),
+    }
@@ -1,3 +1,1122 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import shutil
+import tempfile
+import threading
+import zipfile
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import pdf
+from .agendas import datos_agendas
+from .alergias import tokenizar
+from .busqueda import indice_medicamentos
+from .cache_pacientes import clave_resumen, obtener_resumen
+from .fechas import filtro_dias, inicio_dia, rango_dias
+from .forms import FiltroSignosForm, SignosVitalesForm
+from .importacion import importar_medicamentos, importar_pacientes
+from .ingesta import a_json_lines, generar_lecturas
+from .interacciones import revisar_interacciones
+from .linea_tiempo import decodificar_cursor, obtener_pagina
+from .inventario import cerrar_stock, conciliar_stock, vencer_lotes
+from .models import CustomUser, Medico, Enfermera, Paciente, Cita, HistoriaClinica, Medicamento, RecetaMedica, RecetaMedicamento, StockInsuficiente, SignosVitales, DispositivoMonitor
+from .news import calcular_puntajes, recalcular_puntajes
+from .pronostico import _consumo_por_dia, calcular_reposicion
+from .pdf import datos_receta, iterar_datos_recetas, prerenderizar_receta, programar_prerenderizado
+from .replicas import COOKIE_PRIMARIO, lecturas_en_replica
+from .tendencias import lttb, rango
+
+
+def crear_medico(rut='12345678-9'):
+    usuario = CustomUser.objects.create_user(rut=rut, nombre='Dra. Prueba', password='clave123', rol='medico')
+    return Medico.objects.create(usuario=usuario, especialidad='Medicina General', numero_registro=f'REG-{rut}')
+
+
+def crear_paciente(rut='11222333-4', nombre='Paciente Prueba'):
+    return Paciente.objects.create(
+        rut=rut, nombre=nombre, fecha_nacimiento=date(1980, 1, 1), genero='F',
+        direccion='Calle 123', telefono='+56911111111',
+        contacto_emergencia='Contacto', telefono_emergencia='+56922222222'
+    )
+
+
+class ImportarPacientesTests(TestCase):
+    COLUMNAS = 'rut,nombre,fecha_nacimiento,genero,direccion,telefono,contacto_emergencia,telefono_emergencia,alergias'
+
+    def _fila(self, rut, nombre='Paciente', fecha='1980-01-01', alergias=''):
+        return f'{rut},{nombre},{fecha},F,Calle 1,+56911111111,Contacto,+56922222222,{alergias}'
+
+    def test_procesa_el_archivo_por_lotes_sin_leerlo_completo(self):
+        insertados_al_leer = []
+
+        def lineas():
+            yield self.COLUMNAS
+            for i in range(5):
+                # Pacientes ya insertados cuando se lee cada fila
+                insertados_al_leer.append(Paciente.objects.count())
+                yield self._fila(f'1000000{i}-{i}', alergias='Penicilina' if i == 0 else '')
+
+        resultado = importar_pacientes(lineas(), tamano_lote=2)
+
+        self.assertEqual((resultado.filas, resultado.pacientes_creados, resultado.historias_creadas), (5, 5, 1))
+        self.assertEqual(insertados_al_leer, [0, 0, 2, 2, 4])
+        paciente = Paciente.objects.get(rut='10000000-0')
+        self.assertEqual(set(paciente.alergenos.values_list('token', flat=True)), {'penicilina'})
+
+    def test_rut_existente_o_repetido_se_rechaza_sin_modificar_el_paciente(self):
+        # La importación solo agrega pacientes: un RUT que ya existe no se actualiza
+        existente = crear_paciente(rut='11222333-4', nombre='Original')
+        contenido = '\n'.join([
+            self.COLUMNAS,
+            self._fila('11222333-4', nombre='Cambiado'),
+            self._fila('22333444-5', nombre='Nuevo'),
+            self._fila('22333444-5', nombre='Repetido'),
+        ])
+        rechazos = io.StringIO()
+
+        resultado = importar_pacientes(io.StringIO(contenido), rechazos=rechazos)
+
+        self.assertEqual((resultado.pacientes_creados, resultado.rechazadas), (1, 2))
+        existente.refresh_from_db()
+        self.assertEqual(existente.nombre, 'Original')
+        self.assertEqual(Paciente.objects.get(rut='22333444-5').nombre, 'Nuevo')
+        filas = [(fila['fila'], fila['nombre'], fila['errores']) for fila in csv.DictReader(io.StringIO(rechazos.getvalue()))]
+        self.assertEqual(filas, [
+            ('2', 'Cambiado', 'rut: Ya existe un paciente con este RUT.'),
+            ('4', 'Repetido', 'rut: RUT repetido dentro del archivo.'),
+        ])
+
+    def test_comando_escribe_las_filas_rechazadas(self):
+        directorio = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, directorio)
+        archivo, rechazos = directorio / 'pacientes.csv', directorio / 'rechazos.csv'
+        archivo.write_text('\n'.join([
+            self.COLUMNAS, self._fila('10000000-0'), self._fila('10000001-1', fecha='ayer'), self._fila('10000002-2'),
+        ]), encoding='utf-8')
+        salida = io.StringIO()
+
+        call_command('importar_pacientes', str(archivo), rechazos=str(rechazos), lote=2, stdout=salida)
+
+        self.assertIn('2 pacientes creados', salida.getvalue())
+        self.assertEqual(Paciente.objects.count(), 2)
+        filas = list(csv.DictReader(rechazos.open(encoding='utf-8')))
+        self.assertEqual([(fila['fila'], fila['rut']) for fila in filas], [('3', '10000001-1')])
+        self.assertTrue(filas[0]['errores'].startswith('fecha_nacimiento:'))
+
+
+class ResumenPacienteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.medico = crear_medico()
+        self.paciente = crear_paciente()
+        self.clave = clave_resumen(self.paciente.id)
+        Cita.objects.create(paciente=self.paciente, medico=self.medico, fecha_hora=timezone.now(), motivo='Control')
+
+    def test_segunda_lectura_sale_de_la_cache(self):
+        self.assertIsNone(cache.get(self.clave))
+        resumen = obtener_resumen(self.paciente.id)
+        self.assertEqual(len(resumen['citas']), 1)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(obtener_resumen(self.paciente.id)['citas'][0].medico.usuario.nombre, 'Dra. Prueba')
+        self.assertIsNone(obtener_resumen(self.paciente.id + 100))
+
+    def test_se_invalida_despues_del_commit(self):
+        obtener_resumen(self.paciente.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            SignosVitales.objects.create(
+                paciente=self.paciente, presion_arterial='120/80', frecuencia_cardiaca=70, temperatura=36.5,
+                frecuencia_respiratoria=16, saturacion_oxigeno=98
+            )
+            # Hasta el commit, otra ficha podría volver a guardar los datos anteriores
+            self.assertIsNotNone(cache.get(self.clave))
+        self.assertIsNone(cache.get(self.clave))
+        self.assertEqual(len(obtener_resumen(self.paciente.id)['signos']), 1)
+
+    def test_cambio_de_nombre_del_medico_invalida_el_resumen(self):
+        obtener_resumen(self.paciente.id)
+        # El login solo guarda last_login
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.login(rut=self.medico.usuario.rut, password='clave123')
+        self.assertIsNotNone(cache.get(self.clave))
+
+        usuario = CustomUser.objects.get(pk=self.medico.usuario.pk)
+        usuario.nombre = 'Dra. Renombrada'
+        with self.captureOnCommitCallbacks(execute=True):
+            usuario.save()
+        self.assertEqual(obtener_resumen(self.paciente.id)['citas'][0].medico.usuario.nombre, 'Dra. Renombrada')
+
+        self.medico.especialidad = 'Pediatría'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.medico.save()
+        self.assertIsNone(cache.get(self.clave))
+
+
+class LineaTiempoTests(TestCase):
+    def setUp(self):
+        self.medico = crear_medico()
+        self.paciente = crear_paciente()
+        self.base = timezone.now() - timedelta(days=10)
+
+    def _cita(self, horas, medico=None):
+        return Cita.objects.create(paciente=self.paciente, medico=medico or self.medico, fecha_hora=self.base + timedelta(hours=horas), motivo='Control')
+
+    def _receta(self, horas):
+        receta = RecetaMedica.objects.create(paciente=self.paciente, medico=self.medico, indicaciones='Reposo', vigencia=date.today())
+        RecetaMedica.objects.filter(id=receta.id).update(fecha_emision=self.base + timedelta(hours=horas))
+        return receta
+
+    def _signos(self, horas):
+        return SignosVitales.objects.create(
+            paciente=self.paciente, presion_arterial='120/80', frecuencia_cardiaca=70, temperatura=36.5,
+            frecuencia_respiratoria=16, saturacion_oxigeno=98, fecha_hora=self.base + timedelta(hours=horas)
+        )
+
+    def _recorrer(self, limite):
+        """Todas las páginas, siguiendo el cursor de cada una"""
+        eventos, cursor = obtener_pagina(self.paciente.id, limite=limite)
+        while cursor:
+            pagina, cursor = obtener_pagina(self.paciente.id, decodificar_cursor(cursor), limite=limite)
+            self.assertLessEqual(len(pagina), limite)
+            eventos += pagina
+        return [(evento.tipo, evento.id) for evento in eventos]
+
+    def test_combina_las_fuentes_del_mas_reciente_al_mas_antiguo(self):
+        HistoriaClinica.objects.create(paciente=self.paciente, alergias='Ninguna')
+        antigua, reciente = self._cita(1), self._cita(5)
+        receta = self._receta(3)
+        signos = [self._signos(horas) for horas in (2, 4, 6)]
+        esperado = [
+            ('historia', 0), ('signos', signos[2].id), ('cita', reciente.id), ('signos', signos[1].id),
+            ('receta', receta.id), ('signos', signos[0].id), ('cita', antigua.id),
+        ]
+
+        for limite in (1, 2, 3, 20):
+            with self.subTest(limite=limite):
+                self.assertEqual(self._recorrer(limite), esperado)
+
+    def test_empates_en_la_misma_fecha(self):
+        # Misma fecha: cita, receta y signos, y entre filas del mismo tipo el id mayor primero
+        primera, segunda = self._cita(1), self._cita(1, medico=crear_medico('13456789-0'))
+        receta = self._receta(1)
+        signos = self._signos(1)
+        esperado = [('cita', segunda.id), ('cita', primera.id), ('receta', receta.id), ('signos', signos.id)]
+
+        for limite in (1, 2, 3):
+            with self.subTest(limite=limite):
+                self.assertEqual(self._recorrer(limite), esperado)
+
+    def test_cursor_invalido_o_alterado(self):
+        for horas in range(3):
+            self._cita(horas)
+        _, cursor = obtener_pagina(self.paciente.id, limite=1)
+        self.client.force_login(self.medico.usuario)
+        url = reverse('linea_tiempo_paciente', args=[self.paciente.id])
+
+        self.assertEqual(len(self.client.get(url, {'cursor': cursor}).context['eventos']), 2)
+        alterado = cursor[:-1] + ('A' if cursor[-1] != 'A' else 'B')
+        for valor in ('no-es-un-cursor', alterado):
+            with self.subTest(cursor=valor):
+                self.assertIsNone(decodificar_cursor(valor))
+                self.assertEqual(self.client.get(url, {'cursor': valor}).status_code, 400)
+
+
+class CrearRecetaTests(TestCase):
+    def setUp(self):
+        self.medico = crear_medico()
+        self.paciente = crear_paciente()
+        self.paracetamol = Medicamento.objects.create(nombre='Paracetamol', gramos=500, cantidad=10)
+        self.ibuprofeno = Medicamento.objects.create(nombre='Ibuprofeno', gramos=400, cantidad=2)
+        self.client.force_login(self.medico.usuario)
+
+    def _datos_receta(self, lineas):
+        return {
+            'paciente': self.paciente.id,
+            'indicaciones': 'Reposo',
+            'vigencia': (date.today() + timedelta(days=30)).isoformat(),
+            'medicamento_id[]': [m.id for m, _ in lineas],
+            'cantidad[]': [c for _, c in lineas],
+            'dosis[]': ['1 cada 8 horas' for _ in lineas],
+        }
+
+    def test_crea_receta_y_descuenta_stock(self):
+        respuesta = self.client.post(reverse('crear_receta'), self._datos_receta([(self.paracetamol, 3), (self.ibuprofeno, 2)]))
+
+        self.assertRedirects(respuesta, reverse('lista_recetas'))
+        self.assertEqual(RecetaMedicamento.objects.count(), 2)
+        self.paracetamol.refresh_from_db()
+        self.ibuprofeno.refresh_from_db()
+        self.assertEqual(self.paracetamol.cantidad, 7)
+        self.assertEqual(self.ibuprofeno.cantidad, 0)
+
+    def test_sin_stock_no_guarda_receta_ni_descuenta(self):
+        respuesta = self.client.post(reverse('crear_receta'), self._datos_receta([(self.paracetamol, 3), (self.ibuprofeno, 5)]))
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertFalse(RecetaMedica.objects.exists())
+        self.paracetamol.refresh_from_db()
+        self.assertEqual(self.paracetamol.cantidad, 10)
+
+    def test_descontar_stock_con_instancias_desactualizadas(self):
+        # Dos lecturas del mismo medicamento, como dos recetas simultáneas
+        primera = Medicamento.objects.get(pk=self.paracetamol.pk)
+        segunda = Medicamento.objects.get(pk=self.paracetamol.pk)
+
+        self.assertTrue(primera.descontar_stock(7))
+        self.assertFalse(segunda.descontar_stock(7))
+        self.paracetamol.refresh_from_db()
+        self.assertEqual(self.paracetamol.cantidad, 3)
+
+
+class BusquedaMedicamentosTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        for nombre, cantidad in [
+            ('Paracetamol', 10), ('Paracetamol Forte', 5), ('Ibuprofeno', 3), ('Ácido Fólico', 8),
+            ('Acetaminofén con Codeína', 2), ('Amoxicilina', 0), ('Clorfenamina', 4),
+        ]:
+            Medicamento.objects.create(nombre=nombre, gramos=500, cantidad=cantidad)
+
+    def _nombres(self, texto):
+        return [m['nombre'] for m in indice_medicamentos.buscar(texto)]
+
+    def test_mismos_resultados_que_la_consulta_anterior(self):
+        # Textos sin tildes de por medio: ahí icontains y el índice deben coincidir
+        for texto in ('para', 'PARACETAMOL', 'prof', 'amina', 'co', 'xyz'):
+            with self.subTest(texto=texto):
+                esperados = Medicamento.objects.filter(nombre__icontains=texto, cantidad__gt=0)
+                self.assertEqual(
+                    sorted(m['id'] for m in indice_medicamentos.buscar(texto)),
+                    sorted(esperados.values_list('id', flat=True))
+                )
+
+    def test_prefijos_primero_y_sin_tildes(self):
+        # Nombre que empieza con el texto, luego una palabra que empieza con él y al final subcadenas
+        self.assertEqual(self._nombres('co'), ['Acetaminofén con Codeína', 'Ácido Fólico'])
+        self.assertEqual(self._nombres('acido folico'), ['Ácido Fólico'])
+        # icontains no encontraba "Acetaminofén" al escribir "fen"
+        self.assertEqual(self._nombres('fen'), ['Acetaminofén con Codeína', 'Clorfenamina', 'Ibuprofeno'])
+
+    def test_se_reconstruye_cuando_cambia_la_version(self):
+        self.assertEqual(self._nombres('amox'), [])
+        # Entre cambios no se consulta la base de datos
+        with self.assertNumQueries(0):
+            self.assertEqual(self._nombres('ibu'), ['Ibuprofeno'])
+
+        amoxicilina = Medicamento.objects.get(nombre='Amoxicilina')
+        with self.captureOnCommitCallbacks(execute=True):
+            amoxicilina.ajustar_stock(20, 'ingreso')
+            self.assertEqual(self._nombres('amox'), [])
+        self.assertEqual(self._nombres('amox'), ['Amoxicilina'])
+
+        ibuprofeno = Medicamento.objects.get(nombre='Ibuprofeno')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(ibuprofeno.descontar_stock(3))
+        self.assertEqual(self._nombres('ibu'), [])
+
+
+class RegistroStockTests(TestCase):
+    def setUp(self):
+        self.medicamento = Medicamento.objects.create(nombre='Losartán', gramos=50, cantidad=0)
+        self.ahora = timezone.now()
+        # +10 hace tres días, -4 hace dos y +5 ayer
+        for dias, cantidad in ((3, 10), (2, -4), (1, 5)):
+            self._mover(cantidad, self.ahora - timedelta(days=dias))
+
+    def _mover(self, cantidad, fecha):
+        self.assertTrue(self.medicamento.ajustar_stock(cantidad, 'ajuste'))
+        self.medicamento.movimientos.filter(id=self.medicamento.movimientos.latest('id').id).update(fecha=fecha)
+
+    def _stock_hace(self, dias):
+        return self.medicamento.stock_en_fecha(self.ahora - timedelta(days=dias))
+
+    def test_stock_en_fecha_desde_el_ultimo_cierre(self):
+        self.assertEqual([self._stock_hace(dias) for dias in (4, 2.5, 1.5, 0)], [0, 10, 6, 11])
+
+        self.assertEqual(cerrar_stock(), 1)
+        cierre = self.medicamento.cierres_stock.get()
+        self.assertEqual((cierre.saldo, cierre.ultimo_movimiento_id), (11, self.medicamento.movimientos.latest('id').id))
+        # Sin movimientos nuevos no hay otro cierre
+        self.assertEqual(cerrar_stock(), 0)
+
+        self.medicamento.ajustar_stock(-1, 'ajuste')
+        # Último cierre más los movimientos posteriores
+        with self.assertNumQueries(2):
+            self.assertEqual(self.medicamento.stock_en_fecha(timezone.now()), 10)
+        # Antes del cierre se suma desde el comienzo del registro
+        self.assertEqual(self._stock_hace(1.5), 6)
+
+        self.assertEqual(cerrar_stock(), 1)
+        self.assertEqual(list(self.medicamento.cierres_stock.order_by('id').values_list('saldo', flat=True)), [11, 10])
+
+    def test_conciliacion(self):
+        otro = Medicamento.objects.create(nombre='Metformina', gramos=850, cantidad=0)
+        otro.ajustar_stock(7, 'ingreso')
+        cerrar_stock()
+        otro.ajustar_stock(-2, 'ajuste')
+        self.assertEqual(conciliar_stock(), [])
+
+        # Un cambio que no pasa por el registro
+        Medicamento.objects.filter(pk=self.medicamento.pk).update(cantidad=12)
+        self.assertEqual([(m.pk, saldo) for m, saldo in conciliar_stock()], [(self.medicamento.pk, 11)])
+
+    def test_edicion_sobre_stock_que_cambio(self):
+        administrador = CustomUser.objects.create_user(rut='99888777-6', nombre='Admin', password='clave123', rol='administrador')
+        self.client.force_login(administrador)
+        url = reverse('editar_medicamento', args=[self.medicamento.id])
+        self.assertEqual(self.client.get(url).context['form']['cantidad_original'].value(), 11)
+        datos = {'nombre': 'Losartán Potásico', 'gramos': 50, 'cantidad': 15, 'descripcion': '', 'cantidad_original': 11}
+
+        # Una dispensación entre abrir el formulario y guardarlo
+        self.medicamento.ajustar_stock(-3, 'dispensacion')
+        respuesta = self.client.post(url, datos)
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.context['form']['cantidad'].value(), 8)
+        self.assertIn('cambió mientras se editaba', [str(m) for m in respuesta.context['messages']][0])
+        self.medicamento.refresh_from_db()
+        self.assertEqual((self.medicamento.nombre, self.medicamento.cantidad), ('Losartán', 8))
+
+        # Sobre el stock actual el cambio se registra como ajuste
+        respuesta = self.client.post(url, {**datos, 'cantidad_original': 8})
+        self.assertRedirects(respuesta, reverse('lista_medicamentos'))
+        self.medicamento.refresh_from_db()
+        self.assertEqual((self.medicamento.nombre, self.medicamento.cantidad), ('Losartán Potásico', 15))
+        self.assertEqual(self.medicamento.movimientos.latest('id').cantidad, 7)
+
+
+class PronosticoTests(TestCase):
+    def setUp(self):
+        self.medico = crear_medico()
+        self.paciente = crear_paciente()
+        self.losartan = Medicamento.objects.create(nombre='Losartán', gramos=50, cantidad=1000)
+        self.metformina = Medicamento.objects.create(nombre='Metformina', gramos=850, cantidad=1000)
+
+    def _dispensar(self, medicamento, cantidad, instante):
+        receta = RecetaMedica.objects.create(paciente=self.paciente, medico=self.medico, indicaciones='-', vigencia=date.today())
+        linea = RecetaMedicamento.objects.create(receta=receta, medicamento=medicamento, cantidad_recetada=cantidad, dosis='-')
+        RecetaMedicamento.objects.filter(pk=linea.pk).update(fecha_agregado=instante)
+
+    def test_consumo_por_dia_local_sin_el_dia_en_curso(self):
+        utc = dt_timezone.utc
+        hoy = date(2024, 4, 7)
+        # 23:30 del 6 de abril en la hora repetida (-04): en UTC ya es el 7, pero es ayer
+        self._dispensar(self.losartan, 14, datetime(2024, 4, 7, 3, 30, tzinfo=utc))
+        # Hoy (no cuenta) y hace más de 90 días (fuera de la historia)
+        self._dispensar(self.losartan, 500, datetime(2024, 4, 7, 12, tzinfo=utc))
+        self._dispensar(self.metformina, 300, datetime(2024, 1, 7, 12, tzinfo=utc))
+        Medicamento.objects.filter(pk=self.losartan.pk).update(cantidad=20)
+
+        reporte = {m['id']: m for m in calcular_reposicion(hoy=hoy)}
+
+        # La mayor de las medias: 14 unidades en los últimos 7 días
+        losartan = reporte[self.losartan.id]
+        self.assertEqual((losartan['consumo_diario'], losartan['dias_restantes'], losartan['en_riesgo']), (2.0, 10.0, True))
+        self.assertEqual(losartan['cantidad_sugerida'], 2 * (14 + 30) - 20)
+        metformina = reporte[self.metformina.id]
+        self.assertEqual((metformina['consumo_diario'], metformina['dias_restantes'], metformina['en_riesgo']), (0.0, None, False))
+        self.assertEqual(list(reporte), [self.losartan.id, self.metformina.id])
+
+    def test_dia_local_que_empieza_a_la_una(self):
+        # 8 de septiembre de 2024: el día empieza a la 01:00 (-03), es decir 04:00 UTC
+        utc = dt_timezone.utc
+        self._dispensar(self.losartan, 7, datetime(2024, 9, 8, 3, 59, tzinfo=utc))
+        self._dispensar(self.metformina, 7, datetime(2024, 9, 8, 4, tzinfo=utc))
+
+        reporte = {m['id']: m for m in calcular_reposicion(hoy=date(2024, 9, 8))}
+
+        self.assertEqual(reporte[self.losartan.id]['consumo_diario'], 1.0)
+        self.assertEqual(reporte[self.metformina.id]['consumo_diario'], 0.0)
+
+    def test_consumo_agrupado_por_dia_en_la_base(self):
+        utc = dt_timezone.utc
+        # 5 de marzo (-03): 00:10 y 23:50 locales son el mismo día; las 03:00 UTC del 6 ya son el 6
+        for cantidad, instante in ((1, datetime(2024, 3, 5, 3, 10)), (2, datetime(2024, 3, 6, 2, 50)), (4, datetime(2024, 3, 6, 3))):
+            self._dispensar(self.losartan, cantidad, instante.replace(tzinfo=utc))
+        # 6 de abril, de 25 horas: su primera hora y la hora repetida
+        for cantidad, instante in ((8, datetime(2024, 4, 6, 3)), (16, datetime(2024, 4, 7, 3, 30))):
+            self._dispensar(self.losartan, cantidad, instante.replace(tzinfo=utc))
+
+        with self.assertNumQueries(1):
+            filas = sorted(_consumo_por_dia(date(2024, 3, 1), date(2024, 4, 10)))
+
+        self.assertEqual(filas, [(self.losartan.id, 4, 3), (self.losartan.id, 5, 4), (self.losartan.id, 36, 24)])
+
+
+class LotesTests(TestCase):
+    def setUp(self):
+        self.medico = crear_medico()
+        self.paciente = crear_paciente()
+        self.medicamento = Medicamento.objects.create(nombre='Amoxicilina', gramos=500, cantidad=0)
+        hoy = date.today()
+        self.vence_pronto = self.medicamento.ingresar_lote('A1', hoy + timedelta(days=10), 5)
+        self.vence_tarde = self.medicamento.ingresar_lote('B2', hoy + timedelta(days=90), 10)
+        self.vencido = self.medicamento.ingresar_lote('C3', hoy, 4)
+
+    def _recetar(self, cantidad):
+        receta = RecetaMedica.objects.create(
+            paciente=self.paciente, medico=self.medico, indicaciones='Reposo',
+            vigencia=date.today() + timedelta(days=30)
+        )
+        return RecetaMedicamento.objects.create(
+            receta=receta, medicamento=Medicamento.objects.get(pk=self.medicamento.pk),
+            cantidad_recetada=cantidad, dosis='1 cada 8 horas'
+        )
+
+    def test_asigna_primero_el_lote_que_vence_antes(self):
+        linea = self._recetar(7)
+
+        asignaciones = {a.lote.codigo: a.cantidad for a in linea.asignaciones_lote.all()}
+        self.assertEqual(asignaciones, {'A1': 5, 'B2': 2})
+        self.vence_tarde.refresh_from_db()
+        self.assertEqual(self.vence_tarde.cantidad_disponible, 8)
+
+    def test_no_dispensa_lotes_vencidos(self):
+        # Quedan 15 unidades vigentes; las 4 del lote vencido no se pueden recetar
+        with self.assertRaises(StockInsuficiente):
+            self._recetar(16)
+        self.medicamento.refresh_from_db()
+        self.assertEqual(self.medicamento.cantidad, 19)
+
+    def test_ajuste_a_la_baja_descuenta_los_lotes(self):
+        medicamento = Medicamento.objects.create(nombre='Cefalexina', gramos=500, cantidad=0)
+        lote = medicamento.ingresar_lote('D4', date.today() + timedelta(days=30), 10)
+        self.medicamento = medicamento
+
+        self.assertTrue(medicamento.ajustar_stock(-2, 'ajuste'))
+        lote.refresh_from_db()
+        self.assertEqual(lote.cantidad_disponible, 8)
+
+        linea = self._recetar(5)
+        self.assertEqual([(a.lote.codigo, a.cantidad) for a in linea.asignaciones_lote.all()], [('D4', 5)])
+        medicamento.refresh_from_db()
+        self.assertEqual(medicamento.cantidad, 3)
+
+    def test_stock_sin_lote_no_queda_negativo(self):
+        # Una baja que no pasó por conciliar_lotes: los lotes suman más que el stock
+        Medicamento.objects.filter(pk=self.medicamento.pk).update(cantidad=F('cantidad') - 6)
+
+        linea = self._recetar(5)
+
+        self.assertEqual({a.lote.codigo: a.cantidad for a in linea.asignaciones_lote.all()}, {'A1': 5})
+
+    def test_barrido_da_de_baja_lotes_vencidos(self):
+        self.assertEqual(vencer_lotes(), (1, 4))
+
+        self.vencido.refresh_from_db()
+        self.medicamento.refresh_from_db()
+        self.assertTrue(self.vencido.vencido)
+        self.assertEqual(self.medicamento.cantidad, 15)
+        self.assertEqual(self.medicamento.movimientos.filter(tipo='vencimiento').get().cantidad, -4)
+
+
+class InventarioCsvTests(TestCase):
+    CSV = 'nombre,gramos,cantidad,descripcion\nParacetamol,500,25,Analgésico\nIbuprofeno,400,7,\nIbuprofeno,400,3,\n'
+
+    def setUp(self):
+        self.paracetamol = Medicamento.objects.create(nombre='Paracetamol', gramos=500, cantidad=10)
+
+    def test_simulacion_no_modifica_el_inventario(self):
+        resultado = importar_medicamentos(io.StringIO(self.CSV), simular=True)
+
+        self.assertEqual((resultado.creados, resultado.actualizados, resultado.rechazadas), (1, 1, 1))
+        self.assertEqual(Medicamento.objects.count(), 1)
+        self.paracetamol.refresh_from_db()
+        self.assertEqual(self.paracetamol.cantidad, 10)
+
+    def test_importacion_actualiza_por_nombre_y_concentracion(self):
+        importar_medicamentos(io.StringIO(self.CSV), tamano_lote=1)
+
+        self.paracetamol.refresh_from_db()
+        self.assertEqual(self.paracetamol.cantidad, 25)
+        self.assertEqual(Medicamento.objects.get(nombre='Ibuprofeno').cantidad, 7)
+        # Los cambios de stock quedan en el registro de movimientos
+        self.assertEqual(self.paracetamol.movimientos.get().cantidad, 15)
+
+    def test_exportacion_completa(self):
+        Medicamento.objects.create(nombre='Ibuprofeno', gramos=400, cantidad=3)
+        usuario = CustomUser.objects.create_user(rut='99888777-6', nombre='Admin', password='clave123', rol='administrador')
+        self.client.force_login(usuario)
+
+        respuesta = self.client.get(reverse('exportar_inventario'))
+
+        lineas = b''.join(respuesta.streaming_content).decode().splitlines()
+        self.assertEqual(lineas, ['nombre,gramos,cantidad,descripcion', 'Paracetamol,500.00,10,', 'Ibuprofeno,400.00,3,'])
+
+
+class InteraccionesTests(TestCase):
+    def test_detecta_interacciones_en_la_receta_y_con_el_tratamiento_actual(self):
+        interacciones = revisar_interacciones(['Warfarina 5 mg', 'Paracetamol'], 'Aspirina 100mg al día')
+
+        pares = [(i['farmaco_a'], i['farmaco_b'], i['severidad']) for i in interacciones]
+        # Ordenadas de mayor a menor severidad
+        self.assertEqual(pares, [
+            ('warfarina', 'ácido acetilsalicílico', 'grave'),
+            ('warfarina', 'paracetamol', 'leve'),
+        ])
+        self.assertTrue(interacciones[0]['con_tratamiento_actual'])
+
+    def test_sin_interacciones(self):
+        self.assertEqual(revisar_interacciones(['Paracetamol', 'Amoxicilina'], 'Sin medicamentos'), [])
+
+    def test_api_usa_la_historia_del_paciente(self):
+        medico = crear_medico()
+        paciente = crear_paciente()
+        HistoriaClinica.objects.create(paciente=paciente, medicamentos_actuales='Espironolactona 25 mg')
+        losartan = Medicamento.objects.create(nombre='Losartán', gramos=50, cantidad=10)
+        self.client.force_login(medico.usuario)
+
+        respuesta = self.client.get(reverse('api_interacciones'), {'medicamento': losartan.id, 'paciente': paciente.id})
+
+        self.assertEqual(respuesta.json()['interacciones'][0]['farmaco_b'], 'espironolactona')
+
+
+class AlergiasTests(TestCase):
+    def setUp(self):
+        self.medico = crear_medico()
+        self.paciente = crear_paciente()
+        self.historia = HistoriaClinica.objects.create(paciente=self.paciente, alergias='Alérgica a las Penicilinas y AINEs')
+        self.amoxicilina = Medicamento.objects.create(nombre='Amoxicilina 500mg', gramos=500, cantidad=10)
+        self.client.force_login(self.medico.usuario)
+
+    def _datos_receta(self, **extra):
+        return {
+            'paciente': self.paciente.id,
+            'indicaciones': 'Reposo',
+            'vigencia': (date.today() + timedelta(days=30)).isoformat(),
+            'medicamento_id[]': [self.amoxicilina.id],
+            'cantidad[]': [1],
+            'dosis[]': ['1 cada 8 horas'],
+            **extra,
+        }
+
+    def test_tokeniza_grupos_y_nombres_comerciales(self):
+        self.assertEqual(tokenizar('Alérgica a las Penicilinas y AINEs'), {'penicilina', 'aine'})
+        self.assertTrue({'acido acetilsalicilico', 'aine'} <= tokenizar('Aspirina 100 mg'))
+        self.assertIn('penicilina', tokenizar('Amoxicilina 500mg'))
+
+    def test_indice_se_actualiza_al_guardar_la_historia(self):
+        self.historia.alergias = 'Sulfas'
+        self.historia.save()
+
+        tokens = set(self.paciente.alergenos.values_list('token', flat=True))
+        self.assertIn('sulfonamida', tokens)
+        self.assertNotIn('penicilina', tokens)
+
+    def test_receta_con_alergia_requiere_confirmacion(self):
+        respuesta = self.client.post(reverse('crear_receta'), self._datos_receta())
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertFalse(RecetaMedica.objects.exists())
+
+        respuesta = self.client.post(reverse('crear_receta'), self._datos_receta(confirmar_alergias='1'))
+        self.assertRedirects(respuesta, reverse('lista_recetas'))
+
+
+class RecetaPdfTests(TestCase):
+    def setUp(self):
+        self.directorio = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directorio)
+        ajustes = override_settings(PDF_CACHE_DIR=self.directorio)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        self.medico = crear_medico()
+        self.medicamento = Medicamento.objects.create(nombre='Paracetamol', gramos=500, cantidad=10)
+        self.receta = RecetaMedica.objects.create(
+            paciente=crear_paciente(), medico=self.medico, indicaciones='Reposo',
+            vigencia=date.today() + timedelta(days=30)
+        )
+        RecetaMedicamento.objects.create(receta=self.receta, medicamento=self.medicamento, cantidad_recetada=1, dosis='1 cada 8 horas')
+        self.client.force_login(self.medico.usuario)
+        self.url = reverse('descargar_receta_pdf', args=[self.receta.id])
+
+    def test_pdf_se_guarda_y_responde_304_con_el_mismo_etag(self):
+        respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(b''.join(respuesta.streaming_content).startswith(b'%PDF'))
+        self.assertEqual(len(list(self.directorio.glob('*.pdf'))), 1)
+
+        respuesta = self.client.get(self.url, HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual(respuesta.status_code, 304)
+
+    def test_pdf_borrado_antes_de_abrirlo(self):
+        # Otra petición guarda una versión nueva de la receta y borra esta antes de abrirla
+        guardar = pdf._guardar
+
+        def guardar_y_borrar(receta_id, ruta, escribir):
+            guardar(receta_id, ruta, escribir)
+            ruta.unlink()
+
+        with mock.patch.object(pdf, '_guardar', guardar_y_borrar):
+            respuesta = self.client.get(self.url)
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(b''.join(respuesta.streaming_content).startswith(b'%PDF'))
+
+    def test_cambio_en_los_datos_invalida_el_pdf(self):
+        etag = self.client.get(self.url)['ETag']
+        self.medicamento.nombre = 'Paracetamol Forte'
+        self.medicamento.save()
+
+        respuesta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+        b''.join(respuesta.streaming_content)
+        self.assertEqual(len(list(self.directorio.glob('*.pdf'))), 1)
+
+    def test_datos_en_una_consulta(self):
+        with self.assertNumQueries(1):
+            datos = datos_receta(self.receta.id)
+        self.assertEqual(datos['medicamentos'], [['Paracetamol', '500.00g', '1', '1 cada 8 horas']])
+        # Mismos datos (y mismo hash en la caché) que la carga por lotes de la exportación
+        self.assertEqual([datos], list(iterar_datos_recetas(RecetaMedica.objects.all())))
+        self.assertEqual(datos_receta(self.receta.id + 100), None)
+
+    @override_settings(PDF_WORKERS=2)
+    def test_prerenderizado_al_emitir(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            programar_prerenderizado(self.receta.id)
+        self.assertEqual(len(callbacks), 1)
+
+        # Se dibuja en el pool de procesos; ya guardado, no se vuelve a programar
+        ruta = prerenderizar_receta(self.receta.id).result(timeout=60)
+        self.assertEqual(list(self.directorio.glob('*.pdf')), [ruta])
+        self.assertIsNone(prerenderizar_receta(self.receta.id))
+
+    @override_settings(PDF_WORKERS=2)
+    def test_exportacion_zip(self):
+        otra = RecetaMedica.objects.create(
+            paciente=crear_paciente(rut='22333444-5'), medico=self.medico, indicaciones='Control',
+            vigencia=date.today() + timedelta(days=30)
+        )
+        # Una receta ya está en la caché y la otra se dibuja en el pool
+        b''.join(self.client.get(self.url).streaming_content)
+        administrador = CustomUser.objects.create_user(rut='99888777-6', nombre='Admin', password='clave123', rol='administrador')
+        self.client.force_login(administrador)
+
+        respuesta = self.client.get(reverse('exportar_recetas'), {'medico': self.medico.id})
+
+        self.assertEqual(respuesta['Content-Type'], 'application/zip')
+        archivo = zipfile.ZipFile(io.BytesIO(b''.join(respuesta.streaming_content)))
+        self.assertEqual(
+            sorted(nombre.split('_')[1] for nombre in archivo.namelist()),
+            sorted([str(self.receta.id), str(otra.id)])
+        )
+        self.assertTrue(all(archivo.read(nombre).startswith(b'%PDF') for nombre in archivo.namelist()))
+
+
+class AgendaTests(TestCase):
+    def setUp(self):
+        self.medico = crear_medico()
+        self.otro = crear_medico(rut='13456789-0')
+        paciente = crear_paciente()
+        self.fecha = date(2026, 3, 2)
+        inicio = timezone.make_aware(datetime.combine(self.fecha, time(9, 0)))
+        Cita.objects.create(paciente=paciente, medico=self.medico, fecha_hora=inicio + timedelta(hours=1), motivo='Control')
+        Cita.objects.create(paciente=paciente, medico=self.medico, fecha_hora=inicio, motivo='Dolor & fiebre')
+        Cita.objects.create(paciente=paciente, medico=self.medico, fecha_hora=inicio, motivo='Anulada', estado='cancelada')
+        Cita.objects.create(paciente=paciente, medico=self.medico, fecha_hora=inicio + timedelta(days=1), motivo='Otro día')
+
+    def test_citas_del_dia_por_medico(self):
+        with self.assertNumQueries(2):
+            agendas = {datos['id']: datos for datos in datos_agendas(self.fecha)}
+        self.assertEqual([cita[0] for cita in agendas[self.medico.id]['citas']], ['09:00', '10:00'])
+        self.assertEqual(agendas[self.medico.id]['citas'][0][4], 'Dolor & fiebre')
+        self.assertEqual(agendas[self.otro.id]['citas'], [])
+
+    @override_settings(PDF_WORKERS=2)
+    def test_comando_escribe_un_pdf_por_medico(self):
+        directorio = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, directorio)
+
+        call_command('generar_agendas', fecha=self.fecha, directorio=str(directorio), stdout=io.StringIO())
+
+        archivos = sorted(directorio.glob('*.pdf'))
+        self.assertEqual(len(archivos), 2)
+        self.assertTrue(all(archivo.read_bytes().startswith(b'%PDF') for archivo in archivos))
+
+
+class FechasTests(TestCase):
+    def setUp(self):
+        self.medico = crear_medico()
+        self.paciente = crear_paciente()
+
+    def _cita(self, instante_utc, **campos):
+        return Cita.objects.create(paciente=self.paciente, medico=self.medico, fecha_hora=instante_utc, motivo='Control', **campos)
+
+    def test_dias_con_cambio_de_hora(self):
+        utc = dt_timezone.utc
+        # 6 de abril de 2024: a medianoche se vuelve a las 23:00, el día dura 25 horas
+        inicio, fin = rango_dias(date(2024, 4, 6))
+        self.assertEqual((inicio, fin), (datetime(2024, 4, 6, 3, tzinfo=utc), datetime(2024, 4, 7, 4, tzinfo=utc)))
+        # 8 de septiembre de 2024: no existe la medianoche, el día empieza a la 01:00 y dura 23 horas
+        inicio, fin = rango_dias(date(2024, 9, 8))
+        self.assertEqual((inicio, fin), (datetime(2024, 9, 8, 4, tzinfo=utc), datetime(2024, 9, 9, 3, tzinfo=utc)))
+        self.assertEqual(inicio.strftime('%H:%M'), '01:00')
+        self.assertEqual(filtro_dias('fecha_hora', hasta=date(2024, 9, 7)), {'fecha_hora__lt': inicio})
+
+    def test_lista_de_citas_por_rango_de_dias(self):
+        utc = dt_timezone.utc
+        # 23:30 de la hora repetida del 6 de abril (-04) y 00:30 del 7 de abril
+        repetida = self._cita(datetime(2024, 4, 7, 3, 30, tzinfo=utc))
+        siguiente = self._cita(datetime(2024, 4, 7, 4, 30, tzinfo=utc), estado='confirmada')
+        # 01:00 del 8 de septiembre, primer instante del día
+        septiembre = self._cita(datetime(2024, 9, 8, 4, tzinfo=utc))
+        admin = CustomUser.objects.create_user(rut='99888777-6', nombre='Admin', password='clave123', rol='administrador')
+        self.client.force_login(admin)
+
+        def listar(**filtros):
+            return list(self.client.get(reverse('lista_citas'), filtros).context['citas'])
+
+        self.assertEqual(listar(desde='2024-04-06', hasta='2024-04-06'), [repetida])
+        self.assertEqual(listar(fecha='2024-04-07'), [siguiente])
+        self.assertEqual(listar(desde='2024-04-06', estado='confirmada'), [siguiente])
+        self.assertEqual(listar(desde='2024-09-08', hasta='2024-09-08'), [septiembre])
+        self.assertEqual(listar(hasta='2024-09-07'), [siguiente, repetida])
+
+    def test_horarios_ocupados_en_hora_local(self):
+        self.medico.refresh_from_db()
+        fecha = timezone.localdate() + timedelta(days=1)
+        while fecha.isoweekday() not in self.medico.get_dias_atencion_list():
+            fecha += timedelta(days=1)
+        bloques = self.medico.genera_bloques_horarios(fecha)
+        self._cita(inicio_dia(fecha) + timedelta(hours=bloques[0].hour, minutes=bloques[0].minute))
+
+        self.assertEqual(self.medico.obtener_horarios_disponibles(fecha), bloques[1:])
+
+
+class SignosVitalesTests(TestCase):
+    def setUp(self):
+        self.paciente = crear_paciente()
+
+    def _registrar(self, presion, **campos):
+        normales = {'frecuencia_cardiaca': 70, 'temperatura': 36.5, 'frecuencia_respiratoria': 16, 'saturacion_oxigeno': 98}
+        return SignosVitales.objects.create(presion_arterial=presion, **{'paciente': self.paciente, **normales, **campos})
+
+    def test_formulario_separa_la_presion(self):
+        datos = {
+            'paciente': self.paciente.id, 'presion_arterial': ' 150 / 95 ', 'frecuencia_cardiaca': 80,
+            'temperatura': '36.8', 'frecuencia_respiratoria': 18, 'saturacion_oxigeno': 97,
+        }
+        form = SignosVitalesForm(datos)
+        self.assertTrue(form.is_valid(), form.errors)
+        registro = form.save()
+        self.assertEqual((registro.presion_arterial, registro.presion_sistolica, registro.presion_diastolica), ('150/95', 150, 95))
+
+        self.assertFalse(SignosVitalesForm({**datos, 'presion_arterial': 'alta'}).is_valid())
+        self.assertFalse(SignosVitalesForm({**datos, 'presion_arterial': '80/120'}).is_valid())
+
+    def test_presion_alta_en_el_ultimo_mes(self):
+        alta = self._registrar('145/85')
+        self._registrar('130/95')
+        self._registrar('120/80')
+        self._registrar('texto libre')
+        SignosVitales.objects.filter(id=alta.id).update(fecha_hora=timezone.now() - timedelta(days=40))
+
+        lecturas = SignosVitales.objects.con_presion_alta(desde=timezone.now() - timedelta(days=30))
+
+        self.assertEqual([s.presion_arterial for s in lecturas], ['130/95'])
+
+    def test_puntaje_news(self):
+        self.assertEqual(self._registrar('120/80').puntaje_news, 0)
+        grave = self._registrar('95/60', frecuencia_respiratoria=25, saturacion_oxigeno=92, temperatura=39.5, frecuencia_cardiaca=115)
+        self.assertEqual((grave.puntaje_news, grave.riesgo_news), (11, 'alto'))
+        # Límites de los tramos (FR, SatO2, Temp, PAS, FC) y datos faltantes
+        puntajes = calcular_puntajes([
+            [20, 96, 38.0, 111, 90],
+            [21, 95, 36.0, 110, 91],
+            [float('nan')] * 5,
+        ])
+        self.assertEqual(puntajes.tolist(), [0, 6, 0])
+
+    def test_recalculo_por_lotes_y_panel_de_enfermeria(self):
+        normal = self._registrar('120/80')
+        grave = self._registrar('85/50', frecuencia_respiratoria=26, frecuencia_cardiaca=135)
+        SignosVitales.objects.update(puntaje_news=None)
+
+        self.assertEqual(recalcular_puntajes(tamano_lote=1), 2)
+        normal.refresh_from_db()
+        grave.refresh_from_db()
+        self.assertEqual((normal.puntaje_news, grave.puntaje_news), (0, 9))
+
+        enfermera = CustomUser.objects.create_user(rut='77666555-4', nombre='Enfermera', password='clave123', rol='enfermera')
+        self.client.force_login(enfermera)
+        respuesta = self.client.get(reverse('dashboard_enfermera'))
+        self.assertEqual([lectura.id for lectura in respuesta.context['pacientes_riesgo']], [grave.id])
+
+        # Si la lectura más reciente del paciente es normal, ya no aparece
+        self._registrar('120/80')
+        respuesta = self.client.get(reverse('dashboard_enfermera'))
+        self.assertEqual(list(respuesta.context['pacientes_riesgo']), [])
+
+    def _filtrar(self, **filtros):
+        form = FiltroSignosForm(filtros)
+        self.assertTrue(form.is_valid(), form.errors)
+        return form.filtrar(SignosVitales.objects.order_by('-fecha_hora'))
+
+    def test_filtros_del_listado(self):
+        usuario = CustomUser.objects.create_user(rut='77666555-4', nombre='Enfermera', password='clave123', rol='enfermera')
+        enfermera = Enfermera.objects.create(usuario=usuario, numero_registro='ENF-1')
+        otro = crear_paciente('33444555-6', 'Otro Paciente')
+        dia = timezone.make_aware(datetime(2024, 3, 10, 23, 30))
+        primera = self._registrar('120/80', enfermera=enfermera, fecha_hora=dia)
+        alta = self._registrar('150/85', fecha_hora=dia + timedelta(hours=1))
+        grave = self._registrar('120/80', paciente=otro, frecuencia_cardiaca=135, fecha_hora=dia + timedelta(days=2))
+
+        self.assertEqual(list(self._filtrar(paciente=otro.id)), [grave])
+        self.assertEqual(list(self._filtrar(enfermera=enfermera.id)), [primera])
+        # Días locales completos: 23:30 del 10 entra, 00:30 del 11 no
+        self.assertEqual(list(self._filtrar(desde='2024-03-10', hasta='2024-03-10')), [primera])
+        self.assertEqual(list(self._filtrar(desde='2024-03-11')), [grave, alta])
+        self.assertEqual(list(self._filtrar(anormales='on')), [grave, alta])
+        self.assertFalse(FiltroSignosForm({'desde': '2024-03-11', 'hasta': '2024-03-10'}).is_valid())
+
+        self.client.force_login(usuario)
+        respuesta = self.client.get(reverse('lista_signos'), {'anormales': 'on', 'desde': '2024-03-11'})
+        self.assertEqual(list(respuesta.context['signos']), [grave, alta])
+
+    def test_filtros_del_listado_usan_indices(self):
+        # Cada combinación recorre un índice en el orden del listado, sin ordenar aparte
+        if connection.vendor != 'sqlite':
+            self.skipTest('El plan se revisa con el formato de EXPLAIN de SQLite')
+        casos = [
+            ({}, 'signos_fecha_alertas_idx'),
+            ({'paciente': self.paciente.id}, 'signos_paciente_fecha_idx'),
+            ({'desde': '2024-03-01', 'hasta': '2024-03-31'}, 'signos_fecha_alertas_idx'),
+            ({'anormales': 'on'}, 'signos_fecha_alertas_idx'),
+            ({'paciente': self.paciente.id, 'desde': '2024-03-01'}, 'signos_paciente_fecha_idx'),
+        ]
+        usuario = CustomUser.objects.create_user(rut='77666555-4', nombre='Enfermera', password='clave123', rol='enfermera')
+        enfermera = Enfermera.objects.create(usuario=usuario, numero_registro='ENF-1')
+        casos.append(({'enfermera': enfermera.id}, 'signos_enfermera_fecha_idx'))
+        for filtros, indice in casos:
+            with self.subTest(filtros=filtros):
+                plan = self._filtrar(**filtros).explain()
+                self.assertIn(indice, plan)
+                self.assertNotIn('TEMP B-TREE', plan.upper())
+
+
+class TendenciaSignosTests(TestCase):
+    def test_lttb_acota_los_puntos_y_conserva_picos(self):
+        x = np.arange(10000, dtype=np.float64)
+        y = np.sin(x / 500)
+        y[4321] = 50
+        indices = lttb(x, y, 200)
+        self.assertEqual(len(indices), 200)
+        self.assertEqual((indices[0], indices[-1]), (0, 9999))
+        self.assertIn(4321, indices)
+        self.assertTrue(np.all(np.diff(indices) > 0))
+
+        t, promedio, minimo, maximo = rango(x, y, 100)
+        self.assertEqual(len(t), 100)
+        self.assertEqual(maximo.max(), 50)
+        self.assertTrue(np.all(minimo <= promedio) and np.all(promedio <= maximo))
+
+    def test_endpoint(self):
+        paciente = crear_paciente()
+        for frecuencia in (70, 75, 140, 72, 71):
+            SignosVitales.objects.create(
+                paciente=paciente, presion_arterial='120/80', frecuencia_cardiaca=frecuencia, temperatura=36.5,
+                frecuencia_respiratoria=16, saturacion_oxigeno=98
+            )
+        self.client.force_login(crear_medico().usuario)
+        url = reverse('api_tendencia_signos', args=[paciente.id, 'frecuencia_cardiaca'])
+
+        datos = self.client.get(url, {'puntos': 3}).json()
+        self.assertEqual((datos['total'], datos['unidad']), (5, 'lpm'))
+        self.assertEqual([valor for _, valor in datos['puntos']], [70, 140, 71])
+
+        self.assertEqual(len(self.client.get(url, {'modo': 'rango', 'puntos': 3}).json()['puntos'][0]), 4)
+        self.assertEqual(self.client.get(url, {'puntos': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_tendencia_signos', args=[paciente.id, 'clave'])).status_code, 404)
+
+
+class IngestaSignosTests(TestCase):
+    def setUp(self):
+        self.paciente = crear_paciente()
+        self.dispositivo = DispositivoMonitor(nombre='Monitor UCI 1')
+        self.token = self.dispositivo.generar_token()
+        self.dispositivo.save()
+        self.url = reverse('api_ingesta_signos')
+
+    def _enviar(self, lineas, token=None):
+        return self.client.post(
+            self.url, data='\n'.join(lineas), content_type='application/x-ndjson',
+            HTTP_AUTHORIZATION=f'Token {token or self.token}'
+        )
+
+    def test_valida_e_inserta_por_lote(self):
+        base = {'rut': self.paciente.rut, 'presion_arterial': '120/80', 'frecuencia_cardiaca': 70, 'temperatura': 36.5,
+                'frecuencia_respiratoria': 16, 'saturacion_oxigeno': 98, 'fecha_hora': '2026-01-10T08:00:00'}
+        lineas = [
+            json.dumps(base),
+            json.dumps({**base, 'presion_arterial': None, 'presion_sistolica': 88, 'presion_diastolica': 50, 'frecuencia_respiratoria': 26}),
+            json.dumps({**base, 'rut': '1-9'}),
+            json.dumps({**base, 'temperatura': 52}),
+            json.dumps({**base, 'fecha_hora': (timezone.now() + timedelta(days=1)).isoformat()}),
+            '{no es json',
+            json.dumps({**base, 'rut': [self.paciente.rut]}),
+            json.dumps({**base, 'rut': {'rut': self.paciente.rut}}),
+        ]
+        # Dispositivo, pacientes del lote, INSERT (con su savepoint) y último envío
+        with self.assertNumQueries(6):
+            datos = self._enviar(lineas).json()
+
+        self.assertEqual((datos['recibidas'], datos['insertadas']), (8, 2))
+        self.assertEqual(
+            [(r['linea'], sorted(r['errores'])) for r in datos['rechazadas']],
+            [(3, ['rut']), (4, ['temperatura']), (5, ['fecha_hora']), (6, ['__all__']), (7, ['rut']), (8, ['rut'])]
+        )
+        lecturas = SignosVitales.objects.filter(dispositivo=self.dispositivo).order_by('id')
+        self.assertEqual(
+            [(l.presion_arterial, l.presion_sistolica, l.puntaje_news) for l in lecturas],
+            [('120/80', 120, 0), ('88/50', 88, 6)]
+        )
+        self.assertEqual(timezone.localtime(lecturas[0].fecha_hora).hour, 8)
+
+    def test_token_invalido(self):
+        self.assertEqual(self._enviar(['{}'], token='otro').status_code, 401)
+        self.dispositivo.activo = False
+        self.dispositivo.save()
+        self.assertEqual(self._enviar(['{}']).status_code, 401)
+
+    def test_lecturas_del_simulador(self):
+        otro = crear_paciente(rut='22333444-5')
+        lecturas = generar_lecturas([self.paciente.rut, otro.rut], 2000, semilla=1)
+        datos = self._enviar(a_json_lines(lecturas).splitlines()).json()
+        self.assertEqual((datos['insertadas'], datos['rechazadas']), (2000, []))
+        self.assertEqual(SignosVitales.objects.filter(puntaje_news__isnull=True).count(), 0)
+
+
+class MedicionIndicesTests(TransactionTestCase):
+    # TransactionTestCase: el comando quita y recrea índices, lo que SQLite no permite dentro de una transacción
+    def test_mide_y_restaura_los_indices(self):
+        salida = io.StringIO()
+        call_command('medir_indices_agenda', citas=400, medicos=4, pacientes=20, repeticiones=1, confirmar=True, stdout=salida)
+
+        self.assertIn('Agenda del día de un médico', salida.getvalue())
+        self.assertEqual(Cita.objects.count(), 400)
+        self.assertEqual(RecetaMedica.objects.count(), 100)
+        self.assertFalse(RecetaMedica.objects.exclude(fecha_emision=F('cita__fecha_hora')).exists())
+        with connection.cursor() as cursor:
+            indices = set(connection.introspection.get_constraints(cursor, Cita._meta.db_table))
+            indices |= set(connection.introspection.get_constraints(cursor, RecetaMedica._meta.db_table))
+        self.assertTrue({'cita_medico_fecha_idx', 'cita_estado_fecha_idx', 'cita_fecha_idx', 'receta_medico_fecha_idx'} <= indices)
+
+    def test_siembra_sin_ids_de_bulk_create(self):
+        # Como en MySQL: bulk_create no llena las claves primarias
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            call_command('medir_indices_agenda', citas=40, medicos=4, pacientes=5, repeticiones=1, confirmar=True, stdout=io.StringIO())
+
+        self.assertEqual(Medico.objects.count(), 4)
+        self.assertEqual(set(Cita.objects.values_list('medico_id', flat=True)), set(Medico.objects.values_list('id', flat=True)))
+        self.assertEqual(RecetaMedica.objects.count(), 10)
+
+
+REPLICA_PRUEBAS = 'replica'
+REPLICA_SEPARADA = (
+    REPLICA_PRUEBAS in settings.DATABASES
+    and not settings.DATABASES[REPLICA_PRUEBAS].get('TEST', {}).get('MIRROR')
+)
+
+
+# Con dos bases distintas (por ejemplo dos archivos SQLite, sin TEST MIRROR) se ve desde
+# cuál se leyó cada dato. El router solo se activa en estas pruebas.
+@skipUnless(REPLICA_SEPARADA, 'Sin una base "replica" separada del primario')
+@override_settings(DB_REPLICA=REPLICA_PRUEBAS)
+class ReplicaTests(TestCase):
+    databases = {'default', REPLICA_PRUEBAS} if REPLICA_SEPARADA else {'default'}
+
+    def setUp(self):
+        Paciente.objects.using(REPLICA_PRUEBAS).create(
+            rut='44555666-7', nombre='Solo en Réplica', fecha_nacimiento=date(1980, 1, 1), genero='F',
+            direccion='Calle 123', telefono='+56911111111',
+            contacto_emergencia='Contacto', telefono_emergencia='+56922222222'
+        )
+
+    def _en_replica(self):
+        return Paciente.objects.filter(rut='44555666-7').exists()
+
+    def test_lecturas_en_replica_y_primario_fijado(self):
+        self.assertFalse(self._en_replica())
+        with lecturas_en_replica():
+            self.assertTrue(self._en_replica())
+            # Usuarios y sesiones siempre del primario
+            self.assertEqual(CustomUser.objects.all().db, 'default')
+            with transaction.atomic():
+                self.assertFalse(self._en_replica())
+            # Después de escribir, el resto del contexto lee del primario
+            crear_paciente()
+            self.assertFalse(self._en_replica())
+        with lecturas_en_replica():
+            self.assertTrue(self._en_replica())
+
+    def test_listado_lee_de_la_replica_salvo_despues_de_escribir(self):
+        admin = CustomUser.objects.create_user(rut='99888777-6', nombre='Admin', password='clave123', rol='administrador')
+        self.client.force_login(admin)
+
+        nombres = [p.nombre for p in self.client.get(reverse('lista_pacientes')).context['pacientes']]
+        self.assertEqual(nombres, ['Solo en Réplica'])
+
+        respuesta = self.client.post(reverse('crear_paciente'), {
+            'rut': '11222333-4', 'nombre': 'Paciente Nuevo', 'fecha_nacimiento': '1990-05-01', 'genero': 'M',
+            'direccion': 'Calle 1', 'telefono': '+56911111111',
+            'contacto_emergencia': 'Contacto', 'telefono_emergencia': '+56922222222',
+        })
+        self.assertRedirects(respuesta, reverse('ver_paciente', args=[Paciente.objects.get(rut='11222333-4').id]))
+        self.assertIn(COOKIE_PRIMARIO, respuesta.cookies)
+
+        # El navegador que acaba de escribir lee del primario, que ya tiene el paciente
+        nombres = [p.nombre for p in self.client.get(reverse('lista_pacientes')).context['pacientes']]
+        self.assertEqual(nombres, ['Paciente Nuevo'])
+
+
+class StockConcurrenteTests(TransactionTestCase):
+    def test_stock_nunca_queda_negativo(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('SQLite en memoria no admite conexiones concurrentes')
+        medico = crear_medico()
+        paciente = crear_paciente()
+        medicamento = Medicamento.objects.create(nombre='Amoxicilina', gramos=500, cantidad=10)
+        barrera = threading.Barrier(20)
+        exitos = []
+
+        def recetar():
+            try:
+                barrera.wait()
+                receta = RecetaMedica.objects.create(
+                    paciente=paciente, medico=medico, indicaciones='-', vigencia=date.today()
+                )
+                try:
+                    RecetaMedicamento.objects.create(
+                        receta=receta, medicamento=Medicamento.objects.get(pk=medicamento.pk),
+                        cantidad_recetada=1, dosis='-'
+                    )
+                    exitos.append(receta.pk)
+                except StockInsuficiente:
+                    pass
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=recetar) for _ in range(20)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        medicamento.refresh_from_db()
+        self.assertEqual(len(exitos), 10)
+        self.assertEqual(medicamento.cantidad, 0)
@@ -23,6 +23,7 @@ urlpatterns = [
     path('pacientes/', views.lista_pacientes, name='lista_pacientes'),
     path('pacientes/crear/', views.crear_paciente, name='crear_paciente'),
     path('pacientes/<int:paciente_id>/', views.ver_paciente, name='ver_paciente'),
+    path('pacientes/<int:paciente_id>/linea-tiempo/', views.linea_tiempo_paciente, name='linea_tiempo_paciente'),
     path('pacientes/<int:paciente_id>/editar/', views.editar_paciente, name='editar_paciente'),
     path('pacientes/<int:paciente_id>/eliminar/', views.eliminar_paciente, name='eliminar_paciente'),
     
@@ -43,15 +44,22 @@ urlpatterns = [
     path('recetas/crear/', views.crear_receta, name='crear_receta'),
     path('recetas/<int:receta_id>/', views.ver_receta, name='ver_receta'),
     path('recetas/<int:receta_id>/pdf/', views.descargar_receta_pdf, name='descargar_receta_pdf'),
+    path('recetas/exportar/', views.exportar_recetas, name='exportar_recetas'),
     
     # Signos Vitales (Enfermeras)
     path('signos/', views.lista_signos, name='lista_signos'),
     path('signos/registrar/', views.registrar_signos, name='registrar_signos'),
+    path('api/signos/ingesta/', views.api_ingesta_signos, name='api_ingesta_signos'),
+    path('api/pacientes/<int:paciente_id>/signos/<str:metrica>/', views.api_tendencia_signos, name='api_tendencia_signos'),
     
     # Gestión de Medicamentos (Administrador)
     path('medicamentos/', views.lista_medicamentos, name='lista_medicamentos'),
     path('medicamentos/crear/', views.crear_medicamento, name='crear_medicamento'),
+    path('medicamentos/importar/', views.importar_inventario, name='importar_inventario'),
+    path('medicamentos/exportar/', views.exportar_inventario, name='exportar_inventario'),
     path('medicamentos/<int:medicamento_id>/editar/', views.editar_medicamento, name='editar_medicamento'),
+    path('medicamentos/<int:medicamento_id>/movimientos/', views.movimientos_medicamento, name='movimientos_medicamento'),
     path('medicamentos/<int:medicamento_id>/eliminar/', views.eliminar_medicamento, name='eliminar_medicamento'),
     path('api/medicamentos/buscar/', views.buscar_medicamentos, name='buscar_medicamentos'),
+    path('api/interacciones/', views.api_interacciones, name='api_interacciones'),
 ]
\ No newline at end of file
@@ -1,22 +1,37 @@
+import io
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login as auth_login, logout as auth_logout, authenticate
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
 from django.utils import timezone
-from django.http import HttpResponse
+from django.http import Http404, StreamingHttpResponse, FileResponse, HttpResponseBadRequest, HttpResponseNotModified
 from django.core.paginator import Paginator
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
-from .models import CustomUser, Medico, Enfermera, Recepcionista, Paciente, Cita, RecetaMedica, HistoriaClinica, SignosVitales, Medicamento, RecetaMedicamento
+from django.utils.http import parse_etags
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from .models import CustomUser, Medico, Enfermera, Recepcionista, Paciente, Cita, RecetaMedica, HistoriaClinica, SignosVitales, Medicamento, RecetaMedicamento, StockInsuficiente, DispositivoMonitor
 from .forms import (
     LoginForm, CustomUserCreationForm, CustomUserEditForm, MedicoForm, EnfermeraForm, RecepcionistaForm,
-    PacienteForm, HistoriaClinicaForm, CitaForm, RecetaMedicaForm, SignosVitalesForm, CitaMedicoForm, MedicamentoForm
+    PacienteForm, HistoriaClinicaForm, CitaForm, RecetaMedicaForm, SignosVitalesForm, CitaMedicoForm, MedicamentoForm,
+    EditarMedicamentoForm, MovimientoStockForm, ImportarMedicamentosForm, ExportarRecetasForm, FiltroSignosForm,
+    FiltroCitasForm
 )
+from .busqueda import indice_medicamentos
+from .fechas import filtro_dias, inicio_dia
+from .cache_pacientes import obtener_resumen
+from .importacion import importar_medicamentos, exportar_medicamentos
+from .interacciones import revisar_interacciones
+from .alergias import revisar_alergias
+from .pdf import abrir_pdf, datos_receta, huella, nombre_descarga, programar_prerenderizado, zip_recetas
+from .linea_tiempo import obtener_pagina, decodificar_cursor
+from .replicas import usar_replica
+from .pronostico import obtener_alertas_stock, DIAS_REPOSICION
+from .news import RIESGO_MEDIO
+from .ingesta import MAX_LECTURAS, ingerir_lecturas
+from .tendencias import METRICAS, MODOS, PUNTOS_POR_DEFECTO, serie_reducida
 
 # Decoradores de permisos
 def es_administrador(user):
@@ -101,19 +116,18 @@ def dashboard(request):
 # Dashboard Administrador
 @login_required
 @user_passes_test(es_administrador)
+@usar_replica
 def dashboard_administrador(request):
-    from datetime import datetime, time
-    import zoneinfo
-    tz_local = zoneinfo.ZoneInfo('America/Santiago')
-    hoy = timezone.now().astimezone(tz_local).date()
-    inicio_dia = timezone.make_aware(datetime.combine(hoy, time.min))
-    fin_dia = timezone.make_aware(datetime.combine(hoy, time.max))
+    hoy = timezone.localdate()
     total_usuarios = CustomUser.objects.count()
     total_pacientes = Paciente.objects.count()
-    citas_hoy = Cita.objects.filter(fecha_hora__range=(inicio_dia, fin_dia)).order_by('fecha_hora')
+    citas_hoy = Cita.objects.filter(**filtro_dias('fecha_hora', hoy, hoy)).order_by('fecha_hora')
     
     usuarios_recientes = CustomUser.objects.order_by('-fecha_creacion')[:5]
     
+    # Medicamentos que se agotan antes del plazo de reposición (pronóstico cacheado)
+    alertas_stock = obtener_alertas_stock()
+    
     context = {
         'usuario': request.user,
         'total_usuarios': total_usuarios,
@@ -121,6 +135,8 @@ def dashboard_administrador(request):
         'total_citas_hoy': citas_hoy.count(),
         'citas_hoy': citas_hoy,
         'usuarios_recientes': usuarios_recientes,
+        'alertas_stock': alertas_stock,
+        'dias_reposicion': DIAS_REPOSICION,
     }
     
     return render(request, 'dashboard_administrador.html', context)
@@ -129,6 +145,7 @@ def dashboard_administrador(request):
 # Dashboard Médico
 @login_required
 @user_passes_test(es_medico)
+@usar_replica
 def dashboard_medico(request):
     try:
         medico = request.user.medico
@@ -136,25 +153,18 @@ def dashboard_medico(request):
         messages.error(request, 'No se encontró el perfil de médico asociado.')
         return redirect('login')
     
-    from datetime import datetime, time
-    import zoneinfo
-    tz_local = zoneinfo.ZoneInfo('America/Santiago')
-    hoy = timezone.now().astimezone(tz_local).date()
-    fecha_limite = hoy + timezone.timedelta(days=5)
-    inicio_dia = timezone.make_aware(datetime.combine(hoy, time.min))
-    fin_dia = timezone.make_aware(datetime.combine(hoy, time.max))
-    inicio_limite = timezone.make_aware(datetime.combine(hoy + timezone.timedelta(days=1), time.min))
-    fin_limite = timezone.make_aware(datetime.combine(fecha_limite, time.max))
+    hoy = timezone.localdate()
     
     citas_hoy = Cita.objects.filter(
         medico=medico,
-        fecha_hora__range=(inicio_dia, fin_dia)
+        **filtro_dias('fecha_hora', hoy, hoy)
     ).order_by('fecha_hora')
     
+    # Próximas citas (próximos 5 días)
     citas_proximas = Cita.objects.filter(
         medico=medico,
-        fecha_hora__range=(inicio_limite, fin_limite),
-        estado__in=['pendiente', 'confirmada']
+        estado__in=['pendiente', 'confirmada'],
+        **filtro_dias('fecha_hora', hoy + timezone.timedelta(days=1), hoy + timezone.timedelta(days=5))
     ).order_by('fecha_hora')
     
     # Total de pacientes atendidos por este médico
@@ -177,38 +187,37 @@ def dashboard_medico(request):
 # Dashboard Enfermera
 @login_required
 @user_passes_test(es_enfermera)
+@usar_replica
 def dashboard_enfermera(request):
-    from datetime import datetime, time
-    import zoneinfo
-    tz_local = zoneinfo.ZoneInfo('America/Santiago')
-    hoy = timezone.now().astimezone(tz_local).date()
-    inicio_dia = timezone.make_aware(datetime.combine(hoy, time.min))
-    fin_dia = timezone.make_aware(datetime.combine(hoy, time.max))
+    hoy = timezone.localdate()
     
     citas_hoy = Cita.objects.filter(
-        fecha_hora__range=(inicio_dia, fin_dia),
-        estado__in=['confirmada', 'en_curso']
+        estado__in=['confirmada', 'en_curso'],
+        **filtro_dias('fecha_hora', hoy, hoy)
     ).order_by('fecha_hora')
     
-    signos_hoy = SignosVitales.objects.filter(
-        fecha_hora__range=(inicio_dia, fin_dia)
-    ).count()
+    signos_hoy = SignosVitales.objects.filter(**filtro_dias('fecha_hora', hoy, hoy)).count()
     
     # Próximas citas (próximos 5 días)
-    fecha_limite = hoy + timezone.timedelta(days=5)
-    inicio_limite = timezone.make_aware(datetime.combine(hoy + timezone.timedelta(days=1), time.min))
-    fin_limite = timezone.make_aware(datetime.combine(fecha_limite, time.max))
-    
     citas_proximas = Cita.objects.filter(
-        fecha_hora__range=(inicio_limite, fin_limite),
-        estado__in=['pendiente', 'confirmada']
+        estado__in=['pendiente', 'confirmada'],
+        **filtro_dias('fecha_hora', hoy + timezone.timedelta(days=1), hoy + timezone.timedelta(days=5))
     ).order_by('fecha_hora')
     
+    # Pacientes cuya última lectura de las últimas 24 horas tiene NEWS2 de riesgo medio o alto
+    ultima_lectura = SignosVitales.objects.filter(paciente=OuterRef('paciente')).order_by('-fecha_hora', '-id').values('id')[:1]
+    pacientes_riesgo = SignosVitales.objects.filter(
+        puntaje_news__gte=RIESGO_MEDIO,
+        fecha_hora__gte=timezone.now() - timezone.timedelta(hours=24),
+        id=Subquery(ultima_lectura),
+    ).select_related('paciente').order_by('-puntaje_news', '-fecha_hora')[:10]
+    
     context = {
         'usuario': request.user,
         'citas_hoy': citas_hoy,
         'citas_proximas': citas_proximas,
         'signos_hoy': signos_hoy,
+        'pacientes_riesgo': pacientes_riesgo,
     }
     
     return render(request, 'vista_enfermera.html', context)
@@ -217,15 +226,11 @@ def dashboard_enfermera(request):
 # Dashboard Recepcionista
 @login_required
 @user_passes_test(es_recepcionista)
+@usar_replica
 def dashboard_recepcionista(request):
-    from datetime import datetime, time
-    import zoneinfo
-    tz_local = zoneinfo.ZoneInfo('America/Santiago')
-    hoy = timezone.now().astimezone(tz_local).date()
-    inicio_dia = timezone.make_aware(datetime.combine(hoy, time.min))
-    fin_dia = timezone.make_aware(datetime.combine(hoy, time.max))
-    
-    citas_hoy = Cita.objects.filter(fecha_hora__range=(inicio_dia, fin_dia)).order_by('fecha_hora')
+    hoy = timezone.localdate()
+    
+    citas_hoy = Cita.objects.filter(**filtro_dias('fecha_hora', hoy, hoy)).order_by('fecha_hora')
     citas_pendientes = Cita.objects.filter(estado='pendiente', fecha_hora__gte=timezone.now()).count()
     total_pacientes = Paciente.objects.count()
     
@@ -382,6 +387,7 @@ def eliminar_usuario(request, user_id):
 
 @login_required
 @user_passes_test(puede_gestionar_pacientes)
+@usar_replica
 def lista_pacientes(request):
     pacientes = Paciente.objects.all().order_by('nombre')
     
@@ -410,25 +416,36 @@ def lista_pacientes(request):
 @login_required
 @user_passes_test(puede_ver_pacientes)
 def ver_paciente(request, paciente_id):
+    # Resumen cacheado por paciente; se invalida al cambiar sus citas, recetas, signos o historia
+    resumen = obtener_resumen(paciente_id)
+    if resumen is None:
+        raise Http404('Paciente no encontrado')
+    
+    return render(request, 'pacientes/ver.html', resumen)
+
+
+@login_required
+@user_passes_test(puede_ver_pacientes)
+def linea_tiempo_paciente(request, paciente_id):
     paciente = get_object_or_404(Paciente, id=paciente_id)
-    citas = Cita.objects.filter(paciente=paciente).order_by('-fecha_hora')[:10]
-    recetas = RecetaMedica.objects.filter(paciente=paciente).order_by('-fecha_emision')[:5]
-    signos = SignosVitales.objects.filter(paciente=paciente).order_by('-fecha_hora')[:5]
     
-    try:
-        historia = paciente.historia
-    except HistoriaClinica.DoesNotExist:
-        historia = None
+    # Paginación por cursor: cada página cuesta lo mismo sin importar la antigüedad
+    cursor = request.GET.get('cursor')
+    posicion = None
+    if cursor:
+        posicion = decodificar_cursor(cursor)
+        if posicion is None:
+            return HttpResponseBadRequest('Cursor inválido')
+    eventos, siguiente_cursor = obtener_pagina(paciente.id, posicion)
     
     context = {
         'paciente': paciente,
-        'historia': historia,
-        'citas': citas,
-        'recetas': recetas,
-        'signos': signos,
+        'eventos': eventos,
+        'siguiente_cursor': siguiente_cursor,
+        'es_primera_pagina': not cursor,
     }
     
-    return render(request, 'pacientes/ver.html', context)
+    return render(request, 'pacientes/linea_tiempo.html', context)
 
 
 @login_required
@@ -480,6 +497,7 @@ def eliminar_paciente(request, paciente_id):
 # ============= GESTIÓN DE CITAS =============
 
 @login_required
+@usar_replica
 def lista_citas(request):
     user = request.user
     
@@ -498,14 +516,10 @@ def lista_citas(request):
     
     citas = citas.order_by('-fecha_hora')
     
-    # Filtros
-    estado_filter = request.GET.get('estado')
-    if estado_filter:
-        citas = citas.filter(estado=estado_filter)
-    
-    fecha_filter = request.GET.get('fecha')
-    if fecha_filter:
-        citas = citas.filter(fecha_hora__date=fecha_filter)
+    # Filtros por estado y rango de días locales
+    filtro_form = FiltroCitasForm(request.GET)
+    if filtro_form.is_valid():
+        citas = filtro_form.filtrar(citas)
     
     # Paginación
     paginator = Paginator(citas, 24)
@@ -515,8 +529,7 @@ def lista_citas(request):
     context = {
         'citas': page_obj,
         'page_obj': page_obj,
-        'estado_filter': estado_filter,
-        'fecha_filter': fecha_filter,
+        'filtro_form': filtro_form,
     }
     
     return render(request, 'citas/lista.html', context)
@@ -544,7 +557,7 @@ def crear_cita(request):
 def obtener_horarios_disponibles(request):
     """Vista AJAX para obtener horarios disponibles de un médico en una fecha"""
     from django.http import JsonResponse
-    from datetime import datetime, date
+    from datetime import datetime
     
     medico_id = request.GET.get('medico_id')
     fecha_str = request.GET.get('fecha')
@@ -557,7 +570,7 @@ def obtener_horarios_disponibles(request):
         fecha = datetime.strptime(fecha_str, '%Y-%m-%d').date()
         
         # Verificar que la fecha no sea en el pasado
-        if fecha < date.today():
+        if fecha < timezone.localdate():
             return JsonResponse({'horarios': [], 'error': 'No se pueden agendar citas en fechas pasadas'})
         
         horarios = medico.obtener_horarios_disponibles(fecha)
@@ -607,9 +620,6 @@ def ver_cita(request, cita_id):
 
 @login_required
 def editar_cita(request, cita_id):
-    from datetime import datetime, time
-    import zoneinfo
-    
     cita = get_object_or_404(Cita, id=cita_id)
     user = request.user
     
@@ -622,11 +632,7 @@ def editar_cita(request, cita_id):
                 return redirect('lista_citas')
             
             # Verificar que la cita es del día actual
-            tz_local = zoneinfo.ZoneInfo('America/Santiago')
-            hoy = timezone.now().astimezone(tz_local).date()
-            fecha_cita = cita.fecha_hora.astimezone(tz_local).date()
-            
-            if fecha_cita != hoy:
+            if timezone.localtime(cita.fecha_hora).date() != timezone.localdate():
                 messages.error(request, 'Solo puede agregar observaciones a citas del día actual')
                 return redirect('ver_cita', cita_id=cita.id)
             
@@ -676,6 +682,35 @@ def eliminar_cita(request, cita_id):
 
 # ============= GESTIÓN DE RECETAS (Solo Médicos) =============
 
+def _leer_medicamentos_receta(request):
+    """
+    Lee las líneas de medicamentos del formulario de receta.
+    Retorna ([(medicamento, cantidad, dosis), ...], mensaje_de_error).
+    """
+    medicamentos_ids = request.POST.getlist('medicamento_id[]')
+    cantidades = request.POST.getlist('cantidad[]')
+    dosis_list = request.POST.getlist('dosis[]')
+    
+    try:
+        lineas = [
+            (int(med_id), int(cantidad), dosis)
+            for med_id, cantidad, dosis in zip(medicamentos_ids, cantidades, dosis_list)
+        ]
+    except ValueError as e:
+        return [], f'Error al procesar medicamento: {str(e)}'
+    
+    if any(cantidad < 1 for _, cantidad, _ in lineas):
+        return [], 'La cantidad recetada debe ser al menos 1.'
+    
+    # Todos los medicamentos en una sola consulta
+    medicamentos = Medicamento.objects.in_bulk({med_id for med_id, _, _ in lineas})
+    for med_id, _, _ in lineas:
+        if med_id not in medicamentos:
+            return [], f'Error al procesar medicamento: no existe el medicamento {med_id}'
+    
+    return [(medicamentos[med_id], cantidad, dosis) for med_id, cantidad, dosis in lineas], None
+
+
 @login_required
 @user_passes_test(es_medico)
 def crear_receta(request):
@@ -688,47 +723,52 @@ def crear_receta(request):
     if request.method == 'POST':
         form = RecetaMedicaForm(request.POST, medico=medico)
         if form.is_valid():
-            # Guardar la receta base
-            receta = form.save(commit=False)
-            receta.medico = medico
-            receta.save()
-            
             # Procesar medicamentos del formulario
-            medicamentos_ids = request.POST.getlist('medicamento_id[]')
-            cantidades = request.POST.getlist('cantidad[]')
-            dosis_list = request.POST.getlist('dosis[]')
+            items, error = _leer_medicamentos_receta(request)
+            alergias = []
+            if items and not request.POST.get('confirmar_alergias'):
+                # Una sola consulta contra los alérgenos indexados de la historia del paciente
+                alergias = revisar_alergias(form.cleaned_data['paciente'].id, [m.nombre for m, _, _ in items])
             
-            if not medicamentos_ids:
+            if error:
+                messages.error(request, error)
+            elif not items:
                 messages.warning(request, 'Debe agregar al menos un medicamento a la receta.')
-                receta.delete()
-                return render(request, 'recetas/crear.html', {'form': form})
-            
-            # Crear los registros de RecetaMedicamento
-            for med_id, cantidad, dosis in zip(medicamentos_ids, cantidades, dosis_list):
+            elif alergias:
+                detalle = '; '.join(f"{nombre} ({', '.join(tokens)})" for nombre, tokens in alergias)
+                messages.error(request, f'El paciente tiene alergias registradas a: {detalle}. Confirme la alerta para emitir la receta de todos modos.')
+            else:
+                # Receta y descuentos de stock en una sola transacción: si un medicamento
+                # no tiene stock suficiente no queda nada guardado ni descontado
                 try:
-                    medicamento = Medicamento.objects.get(id=med_id)
-                    cantidad_int = int(cantidad)
-                    
-                    # Validar stock disponible
-                    if medicamento.cantidad < cantidad_int:
-                        messages.error(request, f'Stock insuficiente para {medicamento.nombre}. Disponible: {medicamento.cantidad}')
-                        receta.delete()
-                        return render(request, 'recetas/crear.html', {'form': form})
-                    
-                    # Crear el registro (el stock se descuenta automáticamente en save())
-                    RecetaMedicamento.objects.create(
-                        receta=receta,
-                        medicamento=medicamento,
-                        cantidad_recetada=cantidad_int,
-                        dosis=dosis
-                    )
-                except (Medicamento.DoesNotExist, ValueError) as e:
-                    messages.error(request, f'Error al procesar medicamento: {str(e)}')
-                    receta.delete()
-                    return render(request, 'recetas/crear.html', {'form': form})
-            
-            messages.success(request, f'Receta emitida exitosamente para {receta.paciente.nombre}')
-            return redirect('lista_recetas')
+                    with transaction.atomic():
+                        receta = form.save(commit=False)
+                        receta.medico = medico
+                        receta.save()
+                        
+                        # Bloquea los medicamentos en orden de id antes de descontar: dos recetas
+                        # con los mismos medicamentos en distinto orden esperan en vez de
+                        # bloquearse mutuamente (deadlock)
+                        list(
+                            Medicamento.objects.select_for_update()
+                            .filter(pk__in=[m.pk for m, _, _ in items]).order_by('pk').values_list('pk', flat=True)
+                        )
+                        
+                        # El stock se descuenta en save() con un UPDATE condicional
+                        for medicamento, cantidad, dosis in items:
+                            RecetaMedicamento.objects.create(
+                                receta=receta,
+                                medicamento=medicamento,
+                                cantidad_recetada=cantidad,
+                                dosis=dosis
+                            )
+                except StockInsuficiente as e:
+                    disponible = Medicamento.objects.filter(pk=e.medicamento.pk).values_list('cantidad', flat=True).first()
+                    messages.error(request, f'Stock insuficiente para {e.medicamento.nombre}. Disponible: {disponible}')
+                else:
+                    programar_prerenderizado(receta.id)
+                    messages.success(request, f'Receta emitida exitosamente para {receta.paciente.nombre}')
+                    return redirect('lista_recetas')
     else:
         form = RecetaMedicaForm(medico=medico)
     
@@ -742,6 +782,7 @@ def crear_receta(request):
 
 
 @login_required
+@usar_replica
 def lista_recetas(request):
     user = request.user
     
@@ -778,156 +819,45 @@ def ver_receta(request, receta_id):
 
 @login_required
 def descargar_receta_pdf(request, receta_id):
-    receta = get_object_or_404(RecetaMedica, id=receta_id)
-    
-    # Crear la respuesta HTTP con tipo PDF
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'inline; filename="receta_{receta.paciente.rut}_{receta.fecha_emision.strftime("%Y%m%d")}.pdf"'
-    
-    # Crear el PDF
-    doc = SimpleDocTemplate(response, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch)
-    elements = []
-    
-    # Estilos
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        textColor=colors.HexColor('#0066cc'),
-        spaceAfter=30,
-        alignment=TA_CENTER
-    )
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=12,
-        textColor=colors.HexColor('#333333'),
-        spaceAfter=12,
-        spaceBefore=12
-    )
-    normal_style = styles['Normal']
-    
-    # Encabezado
-    elements.append(Paragraph("RECETA MÉDICA", title_style))
-    elements.append(Spacer(1, 0.2*inch))
-    
-    # Información del médico
-    elements.append(Paragraph("<b>DATOS DEL MÉDICO</b>", heading_style))
-    medico_data = [
-        ['Nombre:', receta.medico.usuario.nombre],
-        ['Especialidad:', receta.medico.especialidad],
-        ['Registro Profesional:', receta.medico.numero_registro],
-    ]
-    medico_table = Table(medico_data, colWidths=[2*inch, 4.5*inch])
-    medico_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#e8f4f8')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-    ]))
-    elements.append(medico_table)
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # Información del paciente
-    elements.append(Paragraph("<b>DATOS DEL PACIENTE</b>", heading_style))
-    paciente_data = [
-        ['Nombre:', receta.paciente.nombre],
-        ['RUT:', receta.paciente.rut],
-        ['Fecha de Nacimiento:', receta.paciente.fecha_nacimiento.strftime('%d/%m/%Y')],
-        ['Teléfono:', receta.paciente.telefono],
-    ]
-    paciente_table = Table(paciente_data, colWidths=[2*inch, 4.5*inch])
-    paciente_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#e8f4f8')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-    ]))
-    elements.append(paciente_table)
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # Medicamentos
-    elements.append(Paragraph("<b>MEDICAMENTOS PRESCRITOS</b>", heading_style))
-    medicamentos_recetados = receta.medicamentos_recetados.all()
-    
-    if medicamentos_recetados:
-        # Nuevo formato: medicamentos desde inventario
-        medicamentos_data = [['Medicamento', 'Concentración', 'Cantidad', 'Dosis e Indicaciones']]
-        for med_receta in medicamentos_recetados:
-            medicamentos_data.append([
-                med_receta.medicamento.nombre,
-                f"{med_receta.medicamento.gramos}g",
-                str(med_receta.cantidad_recetada),
-                med_receta.dosis
-            ])
-        
-        medicamentos_table = Table(medicamentos_data, colWidths=[2*inch, 1*inch, 0.8*inch, 2.7*inch])
-        medicamentos_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0066cc')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f0f0f0')]),
-        ]))
-        elements.append(medicamentos_table)
+    datos = datos_receta(receta_id)
+    if datos is None:
+        raise Http404('Receta no encontrada')
+    
+    # El ETag es el hash de los datos impresos: si el navegador ya tiene esta versión, 304
+    etag = f'"{huella(datos)}"'
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
     else:
-        elements.append(Paragraph("<i>No hay medicamentos prescritos</i>", normal_style))
-    
-    elements.append(Spacer(1, 0.2*inch))
-    
-    # Indicaciones
-    elements.append(Paragraph("<b>INDICACIONES</b>", heading_style))
-    indicaciones_paragraph = Paragraph(receta.indicaciones.replace('\n', '<br/>'), normal_style)
-    elements.append(indicaciones_paragraph)
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # Información de la receta
-    elements.append(Paragraph("<b>INFORMACIÓN DE LA RECETA</b>", heading_style))
-    info_data = [
-        ['Fecha de Emisión:', receta.fecha_emision.strftime('%d/%m/%Y %H:%M')],
-        ['Vigencia hasta:', receta.vigencia.strftime('%d/%m/%Y')],
-    ]
-    info_table = Table(info_data, colWidths=[2*inch, 4.5*inch])
-    info_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#e8f4f8')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-    ]))
-    elements.append(info_table)
-    elements.append(Spacer(1, 0.5*inch))
-    
-    # Firma
-    elements.append(Spacer(1, 0.5*inch))
-    firma_style = ParagraphStyle('firma', parent=styles['Normal'], alignment=TA_CENTER, fontSize=10)
-    elements.append(Paragraph("_" * 40, firma_style))
-    elements.append(Paragraph(f"<b>{receta.medico.usuario.nombre}</b>", firma_style))
-    elements.append(Paragraph(f"{receta.medico.especialidad}", firma_style))
-    elements.append(Paragraph(f"Reg. Prof. {receta.medico.numero_registro}", firma_style))
-    
-    # Construir el PDF
-    doc.build(elements)
-    
+        archivo, _ = abrir_pdf(datos)
+        response = FileResponse(archivo, content_type='application/pdf', filename=nombre_descarga(datos))
+    response['ETag'] = etag
+    # Revalidar siempre: así cada descarga vuelve a pasar por el control de acceso
+    response['Cache-Control'] = 'private, no-cache'
     return response
 
 
+@login_required
+@user_passes_test(es_administrador)
+@usar_replica
+def exportar_recetas(request):
+    """Descarga en un ZIP los PDF de las recetas que cumplen los filtros"""
+    form = ExportarRecetasForm(request.GET or None)
+    if form.is_valid():
+        recetas = RecetaMedica.objects.all()
+        filtros = form.cleaned_data
+        if filtros['medico']:
+            recetas = recetas.filter(medico=filtros['medico'])
+        recetas = recetas.filter(**filtro_dias('fecha_emision', filtros['desde'], filtros['hasta']))
+        
+        if recetas.exists():
+            response = StreamingHttpResponse(zip_recetas(recetas), content_type='application/zip')
+            response['Content-Disposition'] = f'attachment; filename="recetas_{timezone.localdate().strftime("%Y%m%d")}.zip"'
+            return response
+        messages.warning(request, 'No hay recetas que cumplan los filtros.')
+    
+    return render(request, 'recetas/exportar.html', {'form': form})
+
+
 # ============= GESTIÓN DE SIGNOS VITALES (Enfermeras) =============
 
 @login_required
@@ -954,13 +884,14 @@ def registrar_signos(request):
 
 
 @login_required
+@usar_replica
 def lista_signos(request):
-    signos = SignosVitales.objects.all().order_by('-fecha_hora')
+    signos = SignosVitales.objects.select_related('paciente', 'enfermera__usuario').order_by('-fecha_hora')
     
-    # Filtro por paciente
-    paciente_id = request.GET.get('paciente')
-    if paciente_id:
-        signos = signos.filter(paciente_id=paciente_id)
+    # Filtros por paciente, enfermera, rango de fechas y valores anormales
+    filtro_form = FiltroSignosForm(request.GET)
+    if filtro_form.is_valid():
+        signos = filtro_form.filtrar(signos)
     
     # Paginación
     paginator = Paginator(signos, 24)
@@ -970,11 +901,66 @@ def lista_signos(request):
     context = {
         'signos': page_obj,
         'page_obj': page_obj,
+        'filtro_form': filtro_form,
     }
     
     return render(request, 'signos/lista.html', context)
 
 
+@csrf_exempt
+@require_POST
+def api_ingesta_signos(request):
+    """
+    Lecturas de monitores de cabecera en JSON Lines. Se autentica con el token del
+    dispositivo (Authorization: Token <token>), no con la sesión.
+    """
+    from django.http import JsonResponse
+    
+    tipo, _, token = request.headers.get('Authorization', '').partition(' ')
+    dispositivo = DispositivoMonitor.autenticar(token.strip()) if tipo == 'Token' and token.strip() else None
+    if dispositivo is None:
+        return JsonResponse({'error': 'Token de dispositivo inválido'}, status=401)
+    
+    try:
+        lineas = request.body.decode('utf-8').splitlines()
+    except UnicodeDecodeError:
+        return JsonResponse({'error': 'El cuerpo debe estar en UTF-8'}, status=400)
+    if len(lineas) > MAX_LECTURAS:
+        return JsonResponse({'error': f'Máximo {MAX_LECTURAS} lecturas por petición'}, status=413)
+    
+    resultado = ingerir_lecturas(lineas, dispositivo=dispositivo)
+    DispositivoMonitor.objects.filter(id=dispositivo.id).update(ultimo_envio=timezone.now())
+    return JsonResponse(resultado.como_dict())
+
+
+@login_required
+@user_passes_test(lambda u: u.rol in ['medico', 'enfermera', 'administrador'])
+@usar_replica
+def api_tendencia_signos(request, paciente_id, metrica):
+    """Serie de una métrica de signos vitales del paciente, reducida a ?puntos= para graficar"""
+    from datetime import date
+    from django.http import JsonResponse
+    
+    if metrica not in METRICAS:
+        raise Http404('Métrica no encontrada')
+    paciente = get_object_or_404(Paciente, id=paciente_id)
+    
+    try:
+        puntos = int(request.GET.get('puntos', PUNTOS_POR_DEFECTO))
+        # Días locales como rango semiabierto [desde, hasta + 1 día)
+        desde = request.GET.get('desde')
+        desde = inicio_dia(date.fromisoformat(desde)) if desde else None
+        hasta = request.GET.get('hasta')
+        hasta = inicio_dia(date.fromisoformat(hasta) + timezone.timedelta(days=1)) if hasta else None
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros inválidos'}, status=400)
+    modo = request.GET.get('modo', 'lttb')
+    if modo not in MODOS:
+        return JsonResponse({'error': f'Modo inválido (use {", ".join(MODOS)})'}, status=400)
+    
+    return JsonResponse(serie_reducida(paciente.id, metrica, puntos=puntos, modo=modo, desde=desde, hasta=hasta))
+
+
 # ============= GESTIÓN DE HISTORIA CLÍNICA =============
 
 @login_required
@@ -1027,6 +1013,7 @@ def editar_historia(request, historia_id):
 
 @login_required
 @user_passes_test(es_administrador)
+@usar_replica
 def lista_medicamentos(request):
     medicamentos = Medicamento.objects.all().order_by('nombre')
     
@@ -1049,7 +1036,14 @@ def crear_medicamento(request):
     if request.method == 'POST':
         form = MedicamentoForm(request.POST)
         if form.is_valid():
-            medicamento = form.save()
+            # El stock inicial entra como ingreso en el registro de movimientos
+            with transaction.atomic():
+                medicamento = form.save(commit=False)
+                cantidad_inicial = medicamento.cantidad
+                medicamento.cantidad = 0
+                medicamento.save()
+                if cantidad_inicial:
+                    medicamento.ajustar_stock(cantidad_inicial, 'ingreso', usuario=request.user, motivo='Stock inicial')
             messages.success(request, f'Medicamento {medicamento.nombre} creado exitosamente')
             return redirect('lista_medicamentos')
     else:
@@ -1064,17 +1058,111 @@ def editar_medicamento(request, medicamento_id):
     medicamento = get_object_or_404(Medicamento, id=medicamento_id)
     
     if request.method == 'POST':
-        form = MedicamentoForm(request.POST, instance=medicamento)
+        form = EditarMedicamentoForm(request.POST, instance=medicamento)
         if form.is_valid():
-            form.save()
-            messages.success(request, f'Medicamento {medicamento.nombre} actualizado exitosamente')
-            return redirect('lista_medicamentos')
+            # El stock no se sobrescribe: la diferencia con la cantidad que se mostró se registra
+            # como ajuste manual, y solo si nadie movió el stock mientras se editaba
+            cantidad_original = form.cleaned_data['cantidad_original']
+            with transaction.atomic():
+                cantidad_actual = Medicamento.objects.select_for_update().values_list('cantidad', flat=True).get(pk=medicamento.pk)
+                if cantidad_actual == cantidad_original:
+                    diferencia = form.cleaned_data['cantidad'] - cantidad_original
+                    medicamento = form.save(commit=False)
+                    medicamento.cantidad = cantidad_actual
+                    medicamento.save(update_fields=['nombre', 'gramos', 'descripcion', 'fecha_actualizacion'])
+                    if diferencia:
+                        medicamento.ajustar_stock(diferencia, 'ajuste', usuario=request.user, motivo='Edición del inventario')
+            if cantidad_actual == cantidad_original:
+                messages.success(request, f'Medicamento {medicamento.nombre} actualizado exitosamente')
+                return redirect('lista_medicamentos')
+            messages.error(
+                request,
+                f'El stock de {medicamento.nombre} cambió mientras se editaba (ahora {cantidad_actual}); '
+                'revise la cantidad y vuelva a guardar'
+            )
+            # Se muestra de nuevo con el stock actual; los demás campos quedan como se enviaron
+            datos = request.POST.copy()
+            datos['cantidad'] = datos['cantidad_original'] = cantidad_actual
+            form = EditarMedicamentoForm(datos, instance=medicamento)
     else:
-        form = MedicamentoForm(instance=medicamento)
+        form = EditarMedicamentoForm(instance=medicamento)
     
     return render(request, 'medicamentos/editar.html', {'form': form, 'medicamento': medicamento})
 
 
+@login_required
+@user_passes_test(es_administrador)
+@usar_replica
+def movimientos_medicamento(request, medicamento_id):
+    medicamento = get_object_or_404(Medicamento, id=medicamento_id)
+    
+    if request.method == 'POST':
+        form = MovimientoStockForm(request.POST)
+        if form.is_valid():
+            movimiento = form.cleaned_data
+            if medicamento.ajustar_stock(movimiento['cantidad'], movimiento['tipo'], usuario=request.user, motivo=movimiento['motivo']):
+                messages.success(request, f'Movimiento registrado. Stock actual de {medicamento.nombre}: {medicamento.cantidad}')
+                return redirect('movimientos_medicamento', medicamento_id=medicamento.id)
+            messages.error(request, f'Stock insuficiente para {medicamento.nombre}. Disponible: {medicamento.cantidad}')
+    else:
+        form = MovimientoStockForm()
+    
+    movimientos = medicamento.movimientos.select_related('usuario', 'receta_medicamento__receta__paciente')
+    
+    # Paginación
+    paginator = Paginator(movimientos, 24)
+    page_number = request.GET.get('page')
+    page_obj = paginator.get_page(page_number)
+    
+    context = {
+        'medicamento': medicamento,
+        'form': form,
+        'movimientos': page_obj,
+        'page_obj': page_obj,
+    }
+    
+    return render(request, 'medicamentos/movimientos.html', context)
+
+
+@login_required
+@user_passes_test(es_administrador)
+def importar_inventario(request):
+    """Carga el inventario desde un CSV; en modo simulación solo muestra los cambios"""
+    resultado = None
+    if request.method == 'POST':
+        form = ImportarMedicamentosForm(request.POST, request.FILES)
+        if form.is_valid():
+            archivo = io.TextIOWrapper(form.cleaned_data['archivo'].file, encoding='utf-8-sig', newline='')
+            simular = form.cleaned_data['simular']
+            try:
+                resultado = importar_medicamentos(archivo, usuario=request.user, simular=simular)
+            except (ValueError, UnicodeDecodeError) as e:
+                messages.error(request, f'No se pudo importar el archivo: {e}')
+                return redirect('importar_inventario')
+            
+            if not simular:
+                if resultado.rechazadas:
+                    messages.warning(request, str(resultado))
+                else:
+                    messages.success(request, str(resultado))
+                return redirect('lista_medicamentos')
+    else:
+        form = ImportarMedicamentosForm()
+    
+    return render(request, 'medicamentos/importar.html', {'form': form, 'resultado': resultado})
+
+
+@login_required
+@user_passes_test(es_administrador)
+@usar_replica
+def exportar_inventario(request):
+    """Descarga el inventario completo como CSV, generado a medida que se envía"""
+    respuesta = StreamingHttpResponse(exportar_medicamentos(), content_type='text/csv; charset=utf-8')
+    nombre = f"inventario_{timezone.localdate().strftime('%Y%m%d')}.csv"
+    respuesta['Content-Disposition'] = f'attachment; filename="{nombre}"'
+    return respuesta
+
+
 @login_required
 @user_passes_test(es_administrador)
 def eliminar_medicamento(request, medicamento_id):
@@ -1099,9 +1187,38 @@ def buscar_medicamentos(request):
     if len(query) < 2:
         return JsonResponse({'medicamentos': []})
     
-    medicamentos = Medicamento.objects.filter(
-        nombre__icontains=query,
-        cantidad__gt=0
-    ).values('id', 'nombre', 'gramos', 'cantidad', 'descripcion')[:10]
+    # Índice en memoria: prefijos primero, sin consultar la base de datos entre cambios
+    medicamentos = indice_medicamentos.buscar(query, limite=10)
     
-    return JsonResponse({'medicamentos': list(medicamentos)})
+    return JsonResponse({'medicamentos': medicamentos})
+
+
+@login_required
+@user_passes_test(es_medico)
+def api_interacciones(request):
+    """API para revisar interacciones y alergias de una receta en construcción"""
+    from django.http import JsonResponse
+    
+    ids = [int(i) for i in request.GET.getlist('medicamento') if i.isdigit()]
+    nombres = Medicamento.objects.in_bulk(ids)
+    medicamentos = [nombres[i].nombre for i in ids if i in nombres]
+    
+    # Los medicamentos que el paciente ya toma, desde su historia clínica
+    medicamentos_actuales = ''
+    paciente_id = request.GET.get('paciente', '')
+    if paciente_id.isdigit():
+        medicamentos_actuales = HistoriaClinica.objects.filter(paciente_id=paciente_id).values_list(
+            'medicamentos_actuales', flat=True
+        ).first() or ''
+    
+    alergias = []
+    if paciente_id.isdigit():
+        alergias = [
+            {'medicamento': nombre, 'alergenos': tokens}
+            for nombre, tokens in revisar_alergias(int(paciente_id), medicamentos)
+        ]
+    
+    return JsonResponse({
+        'interacciones': revisar_interacciones(medicamentos, medicamentos_actuales),
+        'alergias': alergias,
+    })